@@ -11,13 +11,28 @@ const authHeaders = {
   "Authorization": `Bearer ${token}`,
 };
 
+// Đọc hết các trang của API phân trang keyset ({ results, next_cursor })
+async function fetchAllPages(url) {
+  let items = [];
+  let cursor = null;
+  do {
+    const pageUrl = cursor ? `${url}${url.includes("?") ? "&" : "?"}cursor=${encodeURIComponent(cursor)}` : url;
+    const res = await fetch(pageUrl, { headers: authHeaders });
+    if (!res.ok) return { ok: false, status: res.status, items };
+    const page = await res.json();
+    items = items.concat(page.results);
+    cursor = page.next_cursor;
+  } while (cursor);
+  return { ok: true, items };
+}
+
 // ======== 1. WORKSPACE ======== //
 
 async function loadWorkspaces() {
-  const res = await fetch(`${API_BASE}/workspaces/`, { headers: authHeaders });
+  const res = await fetchAllPages(`${API_BASE}/workspaces/`);
   if (!res.ok) { if (res.status === 401) logout(); return; }
 
-  allWorkspaces = await res.json();
+  allWorkspaces = res.items;
   const select = document.getElementById("workspace-select");
   select.innerHTML = "";
 
@@ -75,6 +90,38 @@ function updateWorkspaceUI(wsId) {
 
     loadBoards();
     loadMembers(wsId);
+    subscribeWorkspace(wsId);
+}
+
+// Nhận thay đổi của người khác qua Server-Sent Events, gom lại rồi tải lại snapshot
+let eventSource = null;
+let reloadTimer = null;
+let knownVersion = null;
+function subscribeWorkspace(wsId) {
+    if (eventSource) eventSource.close();
+    knownVersion = null;
+    if (!window.EventSource) return;
+    eventSource = new EventSource(`${API_BASE}/events/?workspace=${wsId}&token=${encodeURIComponent(token)}`);
+    const scheduleReload = (e) => {
+        const data = JSON.parse(e.data || "{}");
+        const membersChanged = (data.changes || []).some(c => c.kind === "member");
+        clearTimeout(reloadTimer);
+        reloadTimer = setTimeout(() => {
+            loadBoards();
+            if (membersChanged || data.truncated || e.type === "resync") loadMembers(wsId);
+        }, 300);
+    };
+    eventSource.addEventListener("changes", (e) => {
+        knownVersion = JSON.parse(e.data).version;
+        scheduleReload(e);
+    });
+    eventSource.addEventListener("resync", scheduleReload);
+    // Kết nối lại (mất mạng / server đóng stream định kỳ): lỡ thay đổi nào thì tải lại
+    eventSource.addEventListener("ready", (e) => {
+        const version = JSON.parse(e.data).version;
+        if (knownVersion !== null && version !== knownVersion) scheduleReload(e);
+        knownVersion = version;
+    });
 }
 
 document.getElementById("workspace-select").addEventListener("change", function() {
@@ -166,19 +213,20 @@ async function updateMemberRole(uid, newRole) {
 }
 
 // ======== 3. BOARD & CARD ======== //
+// Tải cả workspace (boards -> lists -> cards) trong 1 request snapshot
 async function loadBoards() {
-  const res = await fetch(`${API_BASE}/boards/`, { headers: authHeaders });
-  const boards = await res.json();
+  const res = await fetch(`${API_BASE}/workspaces/${currentWorkspaceId}/snapshot/`, { headers: authHeaders });
+  if (!res.ok) return;
+  const snapshot = await res.json();
   const container = document.getElementById("boards-container");
   container.innerHTML = "";
-  const filtered = boards.filter(b => b.workspace == currentWorkspaceId);
-  
-  if(filtered.length === 0) {
+
+  if(snapshot.boards.length === 0) {
       container.innerHTML = "<p style='text-align:center;color:#888;width:100%;margin-top:20px;'>Chưa có Board nào. Hãy tạo mới!</p>";
       return;
   }
 
-  filtered.forEach(board => {
+  snapshot.boards.forEach(board => {
     const div = document.createElement("div");
     div.className = "board";
     const canDel = ['system_admin', 'owner', 'admin'].includes(currentUserRole);
@@ -190,7 +238,7 @@ async function loadBoards() {
         <button onclick="addList(${board.id})" class="btn-primary" style="margin-top:auto;"><i class="fas fa-plus"></i> Thêm List</button>
     `;
     container.appendChild(div);
-    loadLists(board.id);
+    renderLists(board);
   });
 }
 
@@ -200,11 +248,9 @@ document.getElementById("add-board-btn").addEventListener("click", async () => {
     if(name) { await fetch(`${API_BASE}/boards/`, { method: "POST", headers: authHeaders, body: JSON.stringify({name, workspace: currentWorkspaceId}) }); document.getElementById("new-board-name").value=""; loadBoards(); }
 });
 
-async function loadLists(boardId) {
-    const res = await fetch(`${API_BASE}/lists/`, { headers: authHeaders });
-    const lists = await res.json();
-    const container = document.getElementById(`lists-${boardId}`);
-    lists.filter(l => l.board === boardId).forEach(list => {
+function renderLists(board) {
+    const container = document.getElementById(`lists-${board.id}`);
+    board.lists.forEach(list => {
         const div = document.createElement("div");
         div.className = "list";
         div.innerHTML = `
@@ -213,23 +259,36 @@ async function loadLists(boardId) {
             <input type="text" id="new-card-${list.id}" class="add-card-input" placeholder="+ Thêm thẻ..." onkeypress="if(event.key==='Enter') addCard(${list.id})">
         `;
         container.appendChild(div);
-        loadCards(list.id);
-        setTimeout(() => { new Sortable(document.getElementById(`cards-${list.id}`), { group: 'shared', animation: 150, onAdd: (evt) => { fetch(`${API_BASE}/cards/${evt.item.dataset.id}/`, { method: "PATCH", headers: authHeaders, body: JSON.stringify({ list: list.id }) }); } }); }, 500);
+        renderCards(list);
+        new Sortable(document.getElementById(`cards-${list.id}`), { group: 'shared', animation: 150, onEnd: moveCard });
     });
 }
-async function addList(boardId) { const t = prompt("Tên List:"); if(t) { await fetch(`${API_BASE}/lists/`, { method: "POST", headers: authHeaders, body: JSON.stringify({board: boardId, title: t}) }); loadLists(boardId); } }
-async function loadCards(listId) {
-    const res = await fetch(`${API_BASE}/cards/`, { headers: authHeaders });
-    const cards = await res.json();
-    const container = document.getElementById(`cards-${listId}`);
+// Kéo thả: gửi List đích + vị trí mới, server tự tính thứ tự (chỉ ghi thẻ được kéo).
+// Server từ chối / lỗi mạng -> tải lại snapshot để giao diện khớp với server
+async function moveCard(evt) {
+    if (evt.from === evt.to && evt.oldIndex === evt.newIndex) return;
+    const move = { id: Number(evt.item.dataset.id), list: Number(evt.to.id.replace("cards-", "")), index: evt.newIndex };
+    try {
+        const res = await fetch(`${API_BASE}/cards/move/`, { method: "POST", headers: authHeaders, body: JSON.stringify({ moves: [move] }) });
+        if (res.ok) return;
+        const e = await res.json().catch(() => ({}));
+        alert(e.error || e.detail || "Không chuyển được thẻ!");
+    } catch (err) {
+        alert("Lỗi kết nối, không chuyển được thẻ!");
+    }
+    loadBoards();
+}
+async function addList(boardId) { const t = prompt("Tên List:"); if(t) { await fetch(`${API_BASE}/lists/`, { method: "POST", headers: authHeaders, body: JSON.stringify({board: boardId, title: t}) }); loadBoards(); } }
+function renderCards(list) {
+    const container = document.getElementById(`cards-${list.id}`);
     container.innerHTML = "";
-    cards.filter(c => c.list === listId).forEach(c => {
+    list.cards.forEach(c => {
         const div = document.createElement("div"); div.className = `card ${c.status==='DONE'?'card-done':''}`; div.setAttribute("data-id", c.id);
         div.innerHTML = `<strong>${c.title}</strong>`; div.onclick = () => openCardDetail(c.id);
         container.appendChild(div);
     });
 }
-async function addCard(listId) { const i = document.getElementById(`new-card-${listId}`); if(i.value) { await fetch(`${API_BASE}/cards/`, { method: "POST", headers: authHeaders, body: JSON.stringify({list: listId, title: i.value}) }); i.value=""; loadCards(listId); } }
+async function addCard(listId) { const i = document.getElementById(`new-card-${listId}`); if(i.value) { await fetch(`${API_BASE}/cards/`, { method: "POST", headers: authHeaders, body: JSON.stringify({list: listId, title: i.value}) }); i.value=""; loadBoards(); } }
 
 // ======== 4. MODALS & TRASH & ARCHIVE (ĐÃ SỬA ĐÚNG) ======== //
 
@@ -262,8 +321,7 @@ async function openCardDetail(id) {
 
 // Thùng rác Workspace
 async function openWorkspaceTrash() { 
-    const res = await fetch(`${API_BASE}/workspaces/trash/`, { headers: authHeaders }); 
-    const d = await res.json(); 
+    const d = (await fetchAllPages(`${API_BASE}/workspaces/trash/`)).items; 
     const l = document.getElementById("ws-trash-list"); 
     l.innerHTML = d.length ? "" : "<p style='text-align:center;color:#888'>Thùng rác trống.</p>"; 
     d.forEach(w => l.innerHTML+=`<div style="display:flex;justify-content:space-between;margin:5px 0;padding:5px;background:#eee"><b>${w.name}</b> <button onclick="restoreWs(${w.id})">♻️</button></div>`); 
@@ -273,8 +331,7 @@ async function restoreWs(id) { await fetch(`${API_BASE}/workspaces/${id}/restore
 
 // --- THÙNG RÁC THẺ (VĨNH VIỄN) ---
 async function openTrashModal() { 
-    const res = await fetch(`${API_BASE}/cards/trash/`, { headers: authHeaders }); 
-    const d = await res.json(); 
+    const d = (await fetchAllPages(`${API_BASE}/cards/trash/`)).items; 
     const l = document.getElementById("trash-list"); 
     
     const title = document.querySelector("#trash-modal h3");
@@ -292,8 +349,7 @@ async function restoreCard(id) { await fetch(`${API_BASE}/cards/${id}/restore/`,
 
 // --- KHO LƯU TRỮ (XÓA SAU 7 NGÀY) ---
 async function openArchiveModal() { 
-    const res = await fetch(`${API_BASE}/cards/archived/`, { headers: authHeaders }); 
-    const d = await res.json(); 
+    const d = (await fetchAllPages(`${API_BASE}/cards/archived/`)).items; 
     const l = document.getElementById("archive-list"); 
     
     const title = document.querySelector("#archive-modal h3");
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tasks.metrics.PerformanceMiddleware',  # Đứng đầu: đo trọn thời gian của các middleware còn lại
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -78,6 +79,7 @@ WSGI_APPLICATION = 'task_api.wsgi.application'
 
 # ================= DATABASE CONFIGURATION (Thông minh) =================
 # Logic: Nếu có biến môi trường RENDER (trên server) -> Dùng PostgreSQL
+#        Nếu có DATABASE_URL -> Dùng DB trong URL
 #        Nếu không (trên máy bạn) -> Dùng SQL Server (SSMS)
 
 if 'RENDER' in os.environ:
@@ -88,6 +90,12 @@ if 'RENDER' in os.environ:
             ssl_require=True
         )
     }
+elif 'DATABASE_URL' in os.environ:
+    # === DB BẤT KỲ QUA URL (vd SQLite cho seed_data / benchmark_api) ===
+    #   DATABASE_URL=sqlite:///bench.sqlite3 python manage.py migrate
+    DATABASES = {
+        'default': dj_database_url.config(conn_max_age=600)
+    }
 else:
     # === CẤU HÌNH CHO MÁY BẠN (SQL Server - SSMS) ===
     DATABASES = {
@@ -140,9 +148,86 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication + cache user / vai trò theo jti (tasks/auth.py)
+        'tasks.auth.CachedJWTAuthentication',
     ),
 }
+# Cache user / vai trò của CachedJWTAuthentication: phải là cache dùng chung giữa các worker.
+# AUTH_CACHE=db (mặc định trên Render) -> CACHES['auth'] là DatabaseCache trên bảng tasks_auth_cache
+# (migration 0022 tạo sẵn): request ấm tốn 1 truy vấn khóa chính thay vì đọc user + vai trò.
+# Cache khác (Redis / Memcached): tự thêm vào CACHES rồi đặt AUTH_CACHE_ALIAS.
+# Cache locmem (như 'default') là riêng từng tiến trình -> tự tắt, mỗi request đọc user từ DB
+AUTH_CACHE = os.environ.get('AUTH_CACHE', 'db' if 'RENDER' in os.environ else '')
+AUTH_CACHE_ALIAS = os.environ.get('AUTH_CACHE_ALIAS', 'auth' if AUTH_CACHE == 'db' else 'default')
+AUTH_CACHE_TIMEOUT = 60  # Giây; mục cache của 1 token sống tối đa bao lâu
+
+# Phân trang keyset (tasks/pagination.py): số dòng mặc định mỗi trang
+# và giới hạn cứng cho ?page_size= do client gửi lên
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+# Số ngày tối đa của 1 lần gọi /api/cards/calendar/ (đủ cho lịch tháng có tuần đầu/cuối)
+CALENDAR_MAX_DAYS = 62
+
+# Hạn lưu trữ (lệnh `manage.py purge_expired`, xem tasks/retention.py)
+ARCHIVE_RETENTION_DAYS = 7            # Kho lưu trữ thẻ
+WORKSPACE_TRASH_RETENTION_DAYS = 30   # Thùng rác Workspace
+SYNC_LOG_RETENTION_DAYS = 30          # Nhật ký /api/sync/ (cursor cũ hơn -> client tải lại toàn bộ)
+ACTIVITY_RETENTION_DAYS = 90          # Nhật ký hoạt động; cũ hơn -> gộp thành số đếm theo ngày (ActivityRollup)
+
+# Sự kiện thời gian thực /api/events/ (tasks/realtime.py), cần chạy qua ASGI, vd:
+#   gunicorn task_api.asgi:application -k uvicorn.workers.UvicornWorker
+# Nhiều node -> trỏ REALTIME_BROKER tới lớp con của tasks.realtime.Broker
+REALTIME_BROKER = 'tasks.realtime.InProcessBroker'
+REALTIME_HEARTBEAT = 15         # Giây giữa 2 heartbeat (giữ kết nối qua proxy)
+REALTIME_STREAM_TIMEOUT = 300   # Giây; hết hạn -> client tự kết nối lại, token/quyền được kiểm tra lại
+REALTIME_QUEUE_SIZE = 100       # Sự kiện chờ tối đa mỗi kết nối; đầy -> gửi "resync"
+
+# Tìm kiếm thẻ (tasks/search.py): None -> tự chọn theo DB (PostgreSQL GIN / SQLite FTS5 /
+# inverted index trong bộ nhớ cho SQL Server)
+SEARCH_BACKEND = None
+
+# Cache đọc theo workspace (tasks/cache.py): khóa theo version workspace nên ghi là tự vô hiệu.
+# locmem = mỗi tiến trình 1 bản, LRU tối đa MAX_ENTRIES; xem hit/miss/evict ở /api/cache/stats/
+CACHES = {
+    'default': {
+        'BACKEND': 'tasks.cache.CountingLocMemCache',
+        'LOCATION': 'task-api-read',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+if AUTH_CACHE == 'db':
+    CACHES['auth'] = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'tasks_auth_cache',
+        'TIMEOUT': AUTH_CACHE_TIMEOUT,
+        # Mỗi token đang dùng 1 dòng + 1 dòng thế hệ mỗi user; đầy -> xóa 1/3 (chỉ ở lần ghi)
+        'OPTIONS': {'MAX_ENTRIES': 50000, 'CULL_FREQUENCY': 3},
+    }
+RETENTION_BATCH_SIZE = 500
+
+# Đo hiệu năng từng request (tasks/metrics.py): header Server-Timing, GET /api/metrics/ (Prometheus,
+# chỉ admin), log truy vấn chậm và request vượt ngân sách. PERF_METRICS=0 -> gỡ hẳn middleware
+PERF_METRICS_ENABLED = os.environ.get('PERF_METRICS', '1') != '0'
+PERF_SLOW_QUERY_MS = 200   # Truy vấn chậm hơn -> log kèm SQL và stack
+PERF_QUERY_BUDGET = 30     # Request nhiều truy vấn hơn -> log (thường là N+1)
+
+# Email thông báo (tasks/notifications.py): request chỉ ghi hàng đợi, lệnh
+# `manage.py send_notifications --loop` gửi theo lô; `--digest` chạy 1 lần mỗi ngày (cron).
+# Mặc định in ra console; production đặt EMAIL_BACKEND=django.core.mail.backends.smtp.EmailBackend + EMAIL_HOST...
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', '0') == '1'
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'Task Manager <no-reply@localhost>')
+NOTIFICATION_BATCH_SIZE = 100       # Số thư mỗi lô (1 kết nối mail mỗi lô)
+NOTIFICATION_MAX_ATTEMPTS = 5       # Gửi lỗi quá số lần này -> bỏ (xem last_error)
+NOTIFICATION_CLAIM_SECONDS = 600    # Thời gian 1 worker giữ lô đã nhận (đủ cho cả lô qua SMTP)
+NOTIFICATION_DIGEST_DAYS = 2        # Tổng hợp: thẻ quá hạn + thẻ đến hạn trong N ngày tới
+NOTIFICATION_DIGEST_MAX_CARDS = 50  # Số thẻ tối đa liệt kê mỗi nhóm trong 1 email
+NOTIFICATION_RETENTION_DAYS = 30    # Dòng đã gửi giữ lại bao lâu (purge_expired)
 
 ALLOWED_HOSTS = ['*']
 
@@ -0,0 +1,121 @@
+import functools
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import List, Activity, ActivityRollup
+from .changes import pending_changes
+
+logger = logging.getLogger(__name__)
+
+# ===================== NHẬT KÝ HOẠT ĐỘNG ===================== #
+# record() không ghi DB ngay: sự kiện được gom trong bộ đệm của request (`with recording():`,
+# mở trong ChangeTrackingMixin bên trong `with collect():`) rồi chuyển cho ChangeSet của request:
+# tasks/changes.py ghi bằng 1 bulk_create trong cùng transaction, workspace của thẻ lấy từ quan hệ
+# đã nạp cho ChangeLog (không tốn thêm truy vấn). Rollback -> không ghi gì (hành động không xảy ra).
+# Ngoài collect() (lệnh quản trị...): ghi khi commit, workspace suy ra từ list_id (1 truy vấn),
+# lỗi chỉ được log.
+# Feed: GET /api/workspaces/{id}/activity/ và /api/cards/{id}/activity/ (keyset theo -id).
+# Quá ACTIVITY_RETENTION_DAYS: gộp thành ActivityRollup (số đếm theo ngày) rồi xóa (purge_expired).
+
+_buffer = ContextVar('tasks_activity_buffer', default=None)
+
+
+@contextmanager
+def recording():
+    outer = _buffer.get()
+    if outer is not None:
+        yield outer  # Lồng nhau: khối ngoài cùng sẽ ghi
+        return
+    events = []
+    token = _buffer.set(events)
+    try:
+        yield events
+    finally:
+        _buffer.reset(token)
+    if events:
+        changes = pending_changes()
+        if changes is not None:
+            changes.activities.extend(events)
+        else:
+            # Ngoài transaction -> ghi ngay
+            transaction.on_commit(functools.partial(write_events, events), robust=True)
+
+
+def record(verb, actor=None, workspace_id=None, card=None, **data):
+    # card: instance thẻ (chỉ cần pk và list_id); workspace_id suy ra từ List khi ghi
+    event = (Activity(
+        verb=verb, actor_id=actor.pk if actor is not None and actor.is_authenticated else None,
+        workspace_id=workspace_id, card_id=card.pk if card is not None else None, data=data,
+    ), card.list_id if card is not None and workspace_id is None else None)
+    with recording() as events:
+        events.append(event)
+
+
+def write_events(events):
+    list_ids = {list_id for _, list_id in events if list_id is not None}
+    workspaces = dict(List.objects.filter(pk__in=list_ids).values_list('id', 'board__workspace_id')) if list_ids else {}
+    activities = []
+    for activity, list_id in events:
+        if list_id is not None:
+            activity.workspace_id = workspaces.get(list_id)
+        activities.append(activity)
+    Activity.objects.bulk_create(activities)
+
+
+# ===================== GỘP & DỌN THEO HẠN LƯU TRỮ ===================== #
+def activity_deadline(now=None, days=None):
+    days = settings.ACTIVITY_RETENTION_DAYS if days is None else days
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def rollup_batch(rows):
+    # rows: [(id, workspace_id, verb, created_at)] -> cộng vào ActivityRollup rồi xóa các dòng gốc
+    counts = Counter((workspace_id, timezone.localtime(created_at).date(), verb) for _, workspace_id, verb, created_at in rows)
+    workspace_ids = {workspace_id for workspace_id, _, _ in counts if workspace_id is not None}
+    existing = {
+        (rollup.workspace_id, rollup.day, rollup.verb): rollup
+        for rollup in ActivityRollup.objects.select_for_update().filter(
+            Q(workspace_id__in=workspace_ids) | Q(workspace_id__isnull=True),
+            day__in={day for _, day, _ in counts}, verb__in={verb for _, _, verb in counts},
+        )
+    }
+    for key, count in counts.items():
+        if key in existing:
+            existing[key].count += count
+    ActivityRollup.objects.bulk_update([existing[key] for key in counts if key in existing], ['count'])
+    ActivityRollup.objects.bulk_create(
+        ActivityRollup(workspace_id=workspace_id, day=day, verb=verb, count=count)
+        for (workspace_id, day, verb), count in counts.items() if (workspace_id, day, verb) not in existing
+    )
+    Activity.objects.filter(pk__in=[row[0] for row in rows]).delete()
+
+
+def rollup_activity(now=None, days=None, batch_size=None, report=None):
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    expired = (
+        Activity.objects.filter(created_at__lt=activity_deadline(now, days))
+        .order_by('created_at', 'id').values_list('id', 'workspace_id', 'verb', 'created_at')
+    )
+    total = 0
+    while True:
+        started = time.monotonic()
+        with transaction.atomic():
+            rows = list(expired[:batch_size])
+            if not rows:
+                break
+            rollup_batch(rows)
+        elapsed = time.monotonic() - started
+        total += len(rows)
+        logger.info("purge activity: gộp %d dòng trong %.3fs", len(rows), elapsed)
+        if report:
+            report('activity', len(rows), elapsed)
+        if len(rows) < batch_size:
+            break
+    return total
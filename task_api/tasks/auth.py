@@ -0,0 +1,87 @@
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from .models import WorkspaceMember
+
+# ===================== XÁC THỰC JWT CÓ CACHE ===================== #
+# JWTAuthentication gốc đọc bảng User ở mọi request. Ở đây chữ ký / hạn token vẫn được kiểm tra
+# mỗi lần (chỉ tốn CPU), còn user + vai trò của user trong các workspace ({workspace_id: role})
+# được cache theo jti của token trong AUTH_CACHE_TIMEOUT giây -> request đã "ấm" tốn 0 truy vấn
+# cho xác thực và kiểm tra quyền (permissions.workspace_role đọc user.workspace_roles).
+# Vô hiệu hóa: mỗi user có 1 "thế hệ" trong cache, tăng khi đổi mật khẩu / khóa tài khoản / sửa user
+# (signal của User) và khi thành viên / vai trò thay đổi (touch_members, import) -> mọi token
+# của user đó phải nạp lại. Thế hệ được tăng sau khi commit (rollback -> không đổi gì).
+# Thế hệ luôn là giá trị duy nhất (time_ns), không bao giờ là hằng số: khóa thế hệ bị đẩy ra khỏi
+# cache rồi tạo lại vẫn khác mọi giá trị đã lưu trong các mục cũ -> mục cũ không thể khớp lại.
+# Cần cache DÙNG CHUNG giữa các tiến trình (AUTH_CACHE_ALIAS: Redis / Memcached / DatabaseCache...)
+# (DatabaseCache, mặc định trên Render: request ấm tốn 1 truy vấn vào bảng cache thay vì user + vai trò)
+# để vô hiệu hóa ở 1 worker tới được mọi worker. Cache locmem (riêng từng tiến trình) -> tắt cache,
+# xác thực như JWTAuthentication gốc.
+
+
+def _entry_key(jti):
+    return f'tasks:auth:t{jti}'
+
+
+def _generation_key(user_id):
+    return f'tasks:auth:g{user_id}'
+
+
+def auth_cache():
+    # None -> không cache (chưa cấu hình hoặc cache riêng từng tiến trình)
+    alias = settings.AUTH_CACHE_ALIAS
+    if not alias:
+        return None
+    cache = caches[alias]
+    return None if isinstance(cache, LocMemCache) else cache
+
+
+def load_roles(user):
+    return dict(WorkspaceMember.objects.filter(user=user).values_list('workspace_id', 'role'))
+
+
+def invalidate_users(user_ids):
+    # Gọi trong transaction của đường ghi: chỉ tăng thế hệ khi đã commit
+    cache = auth_cache()
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if cache is None or not user_ids:
+        return
+
+    def bump():
+        for user_id in user_ids:
+            try:
+                cache.incr(_generation_key(user_id))
+            except ValueError:  # Chưa có (hoặc đã bị đẩy ra) -> giá trị mới, không trùng giá trị cũ nào
+                cache.set(_generation_key(user_id), time.time_ns(), None)
+
+    transaction.on_commit(bump)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        cache = auth_cache()
+        if cache is None or jti is None or user_id is None:
+            return super().get_user(validated_token)
+        entry_key, generation_key = _entry_key(jti), _generation_key(user_id)
+        found = cache.get_many([entry_key, generation_key])
+        generation = found.get(generation_key)
+        entry = found.get(entry_key)
+        if generation is not None and entry is not None and entry[0] == generation:
+            user, roles = entry[1], entry[2]
+        else:
+            if generation is None:
+                # Mục chỉ được lưu kèm 1 thế hệ thật sự có trong cache (không bao giờ là None)
+                cache.add(generation_key, time.time_ns(), None)
+                generation = cache.get(generation_key)
+            # Kiểm tra is_active / token bị thu hồi (đổi mật khẩu) như bản gốc
+            user = super().get_user(validated_token)
+            roles = load_roles(user)
+            cache.set(entry_key, (generation, user, roles), settings.AUTH_CACHE_TIMEOUT)
+        user.workspace_roles = roles
+        return user
@@ -0,0 +1,170 @@
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import List, Card
+from .ordering import ORDER_GAP
+from .serializers import CardSerializer
+from .changes import touch_cards
+from .labels import set_card_labels, relabel_moved
+from .bulk import create_rows
+from .activity import record
+
+# ===================== THAO TÁC THẺ HÀNG LOẠT (POST /cards/batch/) ===================== #
+# Validate toàn bộ trước, lỗi 1 mục -> không ghi gì cả (trả lỗi theo từng mục).
+# Hợp lệ -> 1 transaction: bulk_create (tạo), bulk_update (sửa), .update() (lưu trữ/xóa/khôi phục).
+# Số truy vấn không phụ thuộc số mục (trừ DB không trả id sau bulk_create, xem tasks/bulk.py):
+# List / Board của thẻ và List đích được nạp cùng lúc validate -> biết workspace mà không hỏi lại.
+
+STATE_CHANGES = {
+    'archive': lambda now: {'is_archived': True, 'is_deleted': False, 'archived_at': now, 'status': 'DONE'},
+    'soft_delete': lambda now: {'is_deleted': True, 'is_archived': False, 'deleted_at': now},
+    'restore': lambda now: {'is_deleted': False, 'deleted_at': None, 'is_archived': False, 'archived_at': None},
+}
+
+
+ACTIVITY_VERBS = {'archive': 'card_archived', 'soft_delete': 'card_deleted', 'restore': 'card_restored'}
+
+
+def is_active(card):
+    return not card.is_deleted and not card.is_archived
+
+
+def run_card_batch(operations, cards, lists, context):
+    """
+    operations: danh sách đã qua CardOperationSerializer.
+    cards / lists: queryset trong phạm vi của user (mọi trạng thái / các List được phép).
+    Trả về (thành công?, kết quả theo từng mục, theo đúng thứ tự gửi lên).
+    """
+    user = context['request'].user
+    errors = {}
+
+    seen = set()
+    for index, operation in enumerate(operations):
+        card_id = operation.get('id')
+        if card_id is not None:
+            if card_id in seen:
+                errors[index] = {'id': "Mỗi thẻ chỉ được xuất hiện 1 lần trong batch."}
+            seen.add(card_id)
+    targets = cards.select_related('list__board').in_bulk(seen)
+
+    # Nạp trước mọi List được nhắc tới -> validate không phải hỏi DB cho từng thẻ
+    list_ids = set()
+    for operation in operations:
+        try:
+            list_ids.add(int(operation.get('data', {}).get('list')))
+        except (TypeError, ValueError):
+            pass
+    context = {**context, 'prefetched': {List: List.objects.select_related('board').in_bulk(list_ids)}}
+
+    # Tạo mới: validate cả nhóm bằng CardSerializer(many=True)
+    creates = [index for index, operation in enumerate(operations) if operation['op'] == 'create']
+    create_serializer = CardSerializer(data=[operations[i]['data'] for i in creates], many=True, context=context)
+    if not create_serializer.is_valid():
+        for index, item_errors in zip(creates, create_serializer.errors):
+            if item_errors:
+                errors[index] = item_errors
+    created_data = dict(zip(creates, create_serializer.validated_data)) if create_serializer.is_valid() else {}
+
+    updates = {}
+    for index, operation in enumerate(operations):
+        if operation['op'] == 'create' or index in errors:
+            continue
+        card = targets.get(operation['id'])
+        # Sửa / lưu trữ / xóa chỉ áp dụng cho thẻ đang hoạt động (giống các API đơn lẻ)
+        if card is None or (operation['op'] != 'restore' and not is_active(card)):
+            errors[index] = {'id': "Không tìm thấy thẻ."}
+        elif operation['op'] == 'update':
+            serializer = CardSerializer(card, data=operation['data'], partial=True, context=context)
+            if serializer.is_valid():
+                updates[index] = serializer.validated_data
+            else:
+                errors[index] = serializer.errors
+
+    # Quyền với List đích: 1 truy vấn cho cả batch
+    wanted = {data['list'].pk for data in list(created_data.values()) + list(updates.values()) if data.get('list')}
+    allowed = set(lists.filter(pk__in=wanted).values_list('pk', flat=True))
+    for index, data in list(created_data.items()) + list(updates.items()):
+        if data.get('list') and data['list'].pk not in allowed:
+            errors[index] = {'list': "Bạn không có quyền với List này!"}
+
+    if errors:
+        return False, [
+            {'index': index, 'op': operations[index]['op'], 'errors': item_errors}
+            for index, item_errors in sorted(errors.items())
+        ]
+
+    # List -> workspace của mọi List liên quan (cũ và đích), từ các đối tượng đã nạp
+    workspaces = {card.list_id: card.list.board.workspace_id for card in targets.values()}
+    workspaces.update(
+        (board_list.pk, board_list.board.workspace_id) for board_list in context['prefetched'][List].values()
+    )
+
+    now = timezone.now()
+    # savepoint=False: gọi từ view thì đã nằm trong transaction của request (ChangeTrackingMixin)
+    with transaction.atomic(savepoint=False):
+        # Thứ tự: thêm vào cuối List, mỗi thẻ mới cách nhau ORDER_GAP
+        list_ids = {data['list'].pk for data in created_data.values() if 'order' not in data}
+        last_orders = dict(
+            Card.objects.filter(list__in=list_ids, is_deleted=False, is_archived=False)
+            .values('list').annotate(last=Max('order')).values_list('list', 'last')
+        )
+        new_cards = {}
+        new_labels = {}
+        for index, data in created_data.items():
+            data = dict(data)
+            new_labels[index] = data.pop('labels', [])
+            card = Card(**{**data, 'created_by': user})
+            if 'order' not in data:
+                last_orders[card.list_id] = last_orders.get(card.list_id, 0) + ORDER_GAP
+                card.order = last_orders[card.list_id]
+            new_cards[index] = card
+        create_rows(Card, new_cards.values())
+        labels = {new_cards[index]: names for index, names in new_labels.items()}
+
+        old_lists = {}
+        fields = {'updated_at'}  # bulk_update/update() bỏ qua auto_now
+        for index, data in updates.items():
+            card = targets[operations[index]['id']]
+            old_lists[card.pk] = card.list_id
+            data = dict(data)
+            if 'labels' in data:
+                labels[card] = data.pop('labels')
+            for field, value in data.items():
+                setattr(card, field, value)
+            card.updated_at = now
+            fields.update(data)
+        if updates:
+            Card.objects.bulk_update([targets[operations[i]['id']] for i in updates], sorted(fields))
+        # Nhãn: 1 lượt ghi bảng nối cho cả batch; thẻ đổi workspace giữ nhãn cùng tên
+        set_card_labels(labels, workspaces)
+        updated = [targets[operations[i]['id']] for i in updates]
+        relabel_moved([
+            card for card in updated
+            if card not in labels and workspaces.get(card.list_id) != workspaces.get(old_lists[card.pk])
+        ], workspaces)
+
+        for op, changes in STATE_CHANGES.items():
+            ids = [operation['id'] for operation in operations if operation['op'] == op]
+            if ids:
+                Card.objects.filter(pk__in=ids).update(**changes(now), updated_at=now)
+                for card_id in ids:
+                    record(ACTIVITY_VERBS[op], user, card=targets[card_id])
+        for card in updated:
+            if card.list_id != old_lists[card.pk]:
+                record('card_moved', user, card=card, from_list=old_lists[card.pk], to_list=card.list_id)
+
+        # bulk_create/bulk_update/update() không phát signal -> tự báo thay đổi
+        touched = [targets[operation['id']] for operation in operations if operation['op'] != 'create']
+        touch_cards(list(new_cards.values()) + touched, old_lists=old_lists)
+
+    results = []
+    for index, operation in enumerate(operations):
+        if index in new_cards:
+            card = new_cards[index]
+            results.append({'index': index, 'op': 'create', 'id': card.pk, 'card': CardSerializer(card, context=context).data})
+        elif index in updates:
+            card = targets[operation['id']]
+            results.append({'index': index, 'op': 'update', 'id': card.pk, 'card': CardSerializer(card, context=context).data})
+        else:
+            results.append({'index': index, 'op': operation['op'], 'id': operation['id']})
+    return True, results
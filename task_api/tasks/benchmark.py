@@ -0,0 +1,252 @@
+import gc
+import time
+import tracemalloc
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import Workspace, WorkspaceMember, Card, Activity
+from .seeding import SEED_PASSWORD, seed_tenant
+from . import urls
+
+# ===================== BENCHMARK CÁC ROUTE TRONG tasks.urls ===================== #
+# `manage.py benchmark_api` tạo DB test riêng, seed dữ liệu theo từng kích thước (tasks/seeding.py)
+# rồi gọi mọi route qua APIClient: đo độ trễ (p50/p95/p99), số truy vấn và bộ nhớ đỉnh.
+# Request ghi chạy trong savepoint và rollback ngay -> mọi lần đo thấy cùng dữ liệu.
+# Mỗi lần đo xóa cache đọc (tasks/cache.py) -> đo đường không cache.
+
+SKIPPED = {
+    'events': "SSE cần ASGI (test client chạy WSGI)",
+}
+
+
+def route(name, method, path, data=None):
+    # path / data: chuỗi format hoặc dict theo context (id của dữ liệu seed)
+    return {'name': name, 'method': method, 'path': path, 'data': data}
+
+
+ROUTES = [
+    route('api-root', 'get', '/api/'),
+    route('token_obtain_pair', 'post', '/api/token/', {'username': '{username}', 'password': SEED_PASSWORD}),
+    route('token_refresh', 'post', '/api/token/refresh/', {'refresh': '{refresh}'}),
+    route('register', 'post', '/api/register/', {'username': 'bench-new', 'password': 'bench-pass', 'email': 'new@example.com'}),
+    route('sync', 'get', '/api/sync/?workspace={workspace}'),
+    route('cache_stats', 'get', '/api/cache/stats/'),
+    route('metrics', 'get', '/api/metrics/'),
+    route('user-list', 'get', '/api/users/'),
+    route('user-detail', 'get', '/api/users/{member}/'),
+    # Workspace
+    route('workspace-list', 'get', '/api/workspaces/'),
+    route('workspace-list', 'post', '/api/workspaces/', {'name': 'Workspace mới'}),
+    route('workspace-trash', 'get', '/api/workspaces/trash/'),
+    route('workspace-detail', 'get', '/api/workspaces/{workspace}/'),
+    route('workspace-detail', 'patch', '/api/workspaces/{workspace}/', {'name': 'Đổi tên'}),
+    route('workspace-detail', 'delete', '/api/workspaces/{workspace}/'),
+    route('workspace-members', 'get', '/api/workspaces/{workspace}/members/'),
+    route('workspace-snapshot', 'get', '/api/workspaces/{workspace}/snapshot/'),
+    route('workspace-stats', 'get', '/api/workspaces/{workspace}/stats/'),
+    route('workspace-add-member', 'post', '/api/workspaces/{workspace}/add_member/', {'email': '{outsider_email}'}),
+    route('workspace-remove-member', 'post', '/api/workspaces/{workspace}/remove_member/', {'user_id': '{member}'}),
+    route('workspace-update-member-role', 'post', '/api/workspaces/{workspace}/update_member_role/', {'user_id': '{member}', 'role': 'admin'}),
+    route('workspace-restore', 'post', '/api/workspaces/{trashed_workspace}/restore/'),
+    route('workspace-export', 'get', '/api/workspaces/{workspace}/export/'),
+    route('workspace-activity', 'get', '/api/workspaces/{workspace}/activity/'),
+    # Board / List
+    route('board-list', 'get', '/api/boards/?workspace={workspace}'),
+    route('board-list', 'post', '/api/boards/', {'name': 'Board mới', 'workspace': '{workspace}'}),
+    route('board-detail', 'get', '/api/boards/{board}/'),
+    route('board-detail', 'patch', '/api/boards/{board}/', {'name': 'Đổi tên'}),
+    route('board-detail', 'delete', '/api/boards/{board}/'),
+    route('board-snapshot', 'get', '/api/boards/{board}/snapshot/'),
+    route('list-list', 'get', '/api/lists/?board={board}'),
+    route('list-list', 'post', '/api/lists/', {'board': '{board}', 'title': 'List mới'}),
+    route('list-detail', 'get', '/api/lists/{list}/'),
+    route('list-detail', 'patch', '/api/lists/{list}/', {'title': 'Đổi tên'}),
+    route('list-detail', 'delete', '/api/lists/{list}/'),
+    route('list-move', 'post', '/api/lists/move/', {'moves': [{'id': '{list}', 'index': 1}]}),
+    # Thẻ
+    route('card-list', 'get', '/api/cards/?workspace={workspace}'),
+    route('card-list', 'post', '/api/cards/', {'list': '{list}', 'title': 'Thẻ mới', 'labels': ['Nhãn 1']}),
+    route('card-detail', 'get', '/api/cards/{card}/'),
+    route('card-detail', 'patch', '/api/cards/{card}/', {'title': 'Đổi tên', 'status': 'DONE'}),
+    route('card-detail', 'delete', '/api/cards/{card}/'),
+    route('card-archived', 'get', '/api/cards/archived/'),
+    route('card-trash', 'get', '/api/cards/trash/'),
+    route('card-calendar', 'get', '/api/cards/calendar/?workspace={workspace}&from={month_start}&to={month_end}'),
+    route('card-label-counts', 'get', '/api/cards/label_counts/?workspace={workspace}'),
+    route('card-overdue-dashboard', 'get', '/api/cards/overdue/?workspace={workspace}'),
+    route('card-search', 'get', '/api/cards/search/?workspace={workspace}&q=thiết kế'),
+    route('card-move', 'post', '/api/cards/move/', {'moves': [{'id': '{card}', 'list': '{other_list}', 'index': 0}]}),
+    route('card-batch', 'post', '/api/cards/batch/', {'operations': [
+        {'op': 'create', 'data': {'list': '{list}', 'title': 'Thẻ mới'}},
+        {'op': 'update', 'id': '{card}', 'data': {'status': 'DONE'}},
+        {'op': 'archive', 'id': '{other_card}'},
+    ]}),
+    route('card-archive', 'post', '/api/cards/{card}/archive/'),
+    route('card-restore', 'post', '/api/cards/{archived_card}/restore/'),
+    route('card-soft-delete', 'post', '/api/cards/{card}/soft_delete/'),
+    route('card-activity', 'get', '/api/cards/{card}/activity/'),
+]
+
+
+def url_names(patterns=None):
+    # Tên mọi route trong tasks.urls (để kiểm tra benchmark không bỏ sót route nào)
+    names = set()
+    for pattern in urls.urlpatterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            names |= url_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+def uncovered_routes():
+    return sorted(url_names() - {spec['name'] for spec in ROUTES} - SKIPPED.keys())
+
+
+def fill(value, context):
+    # Thay '{tên}' bằng giá trị trong context (giữ kiểu int khi cả chuỗi là 1 placeholder)
+    if isinstance(value, dict):
+        return {key: fill(item, context) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, context) for item in value]
+    if isinstance(value, str):
+        if value.startswith('{') and value.endswith('}') and value[1:-1] in context:
+            return context[value[1:-1]]
+        return value.format(**context)
+    return value
+
+
+def build_context(size, seed=0):
+    data = seed_tenant(**size, seed=seed, prefix='bench')
+    workspace = data['workspaces'][0]
+    owner, member = workspace.owner, data['users'][1]
+    owner.is_staff = True  # Route chỉ dành cho admin (metrics, cache/stats, users)
+    owner.save(update_fields=['is_staff'])
+    # Owner thấy mọi workspace seed và có 1 workspace trong thùng rác cho mỗi workspace
+    # -> danh sách workspace / thùng rác lớn lên theo kích thước dữ liệu
+    WorkspaceMember.objects.bulk_create(
+        WorkspaceMember(workspace=space, user=owner, role='admin') for space in data['workspaces'][1:]
+    )
+    trashed = Workspace.objects.bulk_create(
+        Workspace(name=f'Thùng rác {i + 1}', owner=owner, is_deleted=True, deleted_at=timezone.now())
+        for i in range(len(data['workspaces']))
+    )
+    outsider = seed_tenant(workspaces=1, members=1, boards=0, lists=0, cards=0, labels=0, prefix='outsider')['users'][0]
+    lists = [board_list for board_list in data['lists'] if board_list.board.workspace_id == workspace.pk]
+    active = Card.objects.active().filter(list__board__workspace=workspace).order_by('list_id', 'order', 'id')
+    # Thẻ đích luôn ở trạng thái TODO -> PATCH status=DONE đi cùng 1 nhánh code ở mọi kích thước
+    todo = list(active.filter(status='TODO').values_list('pk', flat=True)[:2])
+    archived = Card.objects.filter(list__board__workspace=workspace, is_archived=True).order_by('id').first()
+    # Nhật ký hoạt động (bình thường ghi khi commit, ở đây benchmark rollback) -> seed sẵn, nhiều người thực hiện
+    actors = [user for user in data['users'] if user.pk in {m.user_id for m in workspace.memberships.all()}]
+    card_ids = list(active.values_list('pk', flat=True))
+    Activity.objects.bulk_create(
+        Activity(verb='card_moved', workspace_id=workspace.pk, card_id=card_ids[i % 2], actor=actors[i % len(actors)],
+                 data={'from_list': lists[0].pk, 'to_list': lists[-1].pk})
+        for i in range(len(card_ids))
+    )
+    today = timezone.localdate()
+    return owner, {
+        'username': owner.username,
+        'refresh': str(RefreshToken.for_user(owner)),
+        'workspace': workspace.pk,
+        'trashed_workspace': trashed[0].pk,
+        'member': member.pk if member.pk != owner.pk else outsider.pk,
+        'outsider_email': outsider.email,
+        'board': lists[0].board_id,
+        'list': lists[0].pk,
+        'other_list': lists[1].pk if len(lists) > 1 else lists[0].pk,
+        'card': todo[0],
+        'other_card': todo[1],
+        'archived_card': archived.pk if archived else active[2].pk,
+        'month_start': today.replace(day=1).isoformat(),
+        'month_end': (today.replace(day=1) + timezone.timedelta(days=31)).replace(day=1).isoformat(),
+    }
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def call(client, spec, context):
+    method = getattr(client, spec['method'])
+    data = fill(spec['data'], context) if spec['data'] is not None else None
+    path = fill(spec['path'], context)
+    caches['default'].clear()
+    # Request ghi: savepoint + rollback -> dữ liệu như cũ cho lần đo sau
+    with transaction.atomic():
+        response = method(path, data, format='json') if data is not None else method(path)
+        if response.streaming:
+            b''.join(response.streaming_content)  # Export: truy vấn chạy khi đọc stream
+        transaction.set_rollback(True)
+    return response
+
+
+def count_queries(client, spec, context):
+    # (mã trạng thái, số truy vấn) của 1 lần gọi; số truy vấn gồm cả SAVEPOINT/RELEASE của call()
+    with CaptureQueriesContext(connection) as captured:
+        response = call(client, spec, context)
+    return response.status_code, len(captured)
+
+
+def spec_key(spec):
+    return f"{spec['name']} {spec['method'].upper()}"
+
+
+def measure(client, spec, context, repeat):
+    samples, queries = [], None
+    status = None
+    for _ in range(max(repeat, 1)):
+        started = time.perf_counter()
+        status, queries = count_queries(client, spec, context)
+        samples.append(time.perf_counter() - started)
+    # Bộ nhớ đo riêng 1 lần: tracemalloc làm chậm mọi thứ, không được tính vào độ trễ
+    gc.collect()
+    tracemalloc.start()
+    call(client, spec, context)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'status': status,
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(samples, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 2),
+        'queries': queries,
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def run_size(size, repeat, selected=None, seed=0):
+    # Trả về {"<route> <METHOD>": số liệu}; gọi trong transaction sẽ được rollback bởi người gọi
+    user, context = build_context(size, seed)
+    client = APIClient()
+    client.force_authenticate(user)
+    results = {}
+    for spec in ROUTES:
+        key = spec_key(spec)
+        if selected and not any(part in key for part in selected):
+            continue
+        results[key] = measure(client, spec, context, repeat)
+    return results
+
+
+def compare(results, baseline, tolerance, min_ms=5.0, min_kib=64):
+    # Trả về danh sách hồi quy so với baseline cùng kích thước. Số truy vấn phải giữ nguyên hoặc giảm;
+    # độ trễ p50 và bộ nhớ đỉnh được phép vượt `tolerance` (tỉ lệ) và một ngưỡng tuyệt đối nhỏ (nhiễu đo).
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{key}: {previous['queries']} -> {current['queries']} truy vấn")
+        if current['p50_ms'] > previous['p50_ms'] * (1 + tolerance) and current['p50_ms'] - previous['p50_ms'] > min_ms:
+            regressions.append(f"{key}: p50 {previous['p50_ms']} -> {current['p50_ms']} ms")
+        if current['peak_kib'] > previous['peak_kib'] * (1 + tolerance) and current['peak_kib'] - previous['peak_kib'] > min_kib:
+            regressions.append(f"{key}: bộ nhớ đỉnh {previous['peak_kib']} -> {current['peak_kib']} KiB")
+    return regressions
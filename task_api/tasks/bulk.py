@@ -0,0 +1,21 @@
+from django.db import connection
+
+# ===================== GHI HÀNG LOẠT CẦN ID MỚI ===================== #
+# bulk_create chỉ gán id cho đối tượng khi DB trả được các dòng vừa chèn (PostgreSQL, SQLite 3.35+).
+# SQL Server (mssql-django, DB local mặc định) không trả id -> chèn từng dòng bằng save(force_insert=True):
+# có id ngay nhưng phát signal, nên người gọi đặt trong `with collect():` (tasks/changes.py) để mọi
+# thay đổi được gom vào 1 lần flush như đường bulk.
+
+
+def returns_ids():
+    return connection.features.can_return_rows_from_bulk_insert
+
+
+def create_rows(model, objs, batch_size=None):
+    # -> danh sách đối tượng đã có pk, cùng thứ tự với objs
+    objs = list(objs)
+    if returns_ids():
+        return model.objects.bulk_create(objs, batch_size=batch_size)
+    for obj in objs:
+        obj.save(force_insert=True)
+    return objs
@@ -0,0 +1,71 @@
+import hashlib
+import threading
+from collections import Counter
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+# ===================== CACHE ĐỌC THEO WORKSPACE ===================== #
+# Các GET có điều kiện (conditional_on_workspace trong views.py: list / retrieve / snapshot /
+# members / stats / ...) lưu response.data vào cache của Django với khóa gồm:
+#   workspace + version + changed_at + phạm vi (vai trò của user, hoặc chính user) + URL + ngày.
+# Vô hiệu hóa: mọi đường ghi (signal của save/delete, touch_* của bulk_create/bulk_update/update,
+# archive/restore/soft_delete, add_member/remove_member, đổi tên / email của user) đều tăng
+# Workspace.version trong cùng transaction (tasks/changes.py) -> khóa cũ không bao giờ được đọc lại,
+# tự bị đẩy ra theo LRU. URL trong khóa là URL tuyệt đối (host khác -> link `next` khác).
+# Version được đọc từ DB mỗi request (truy vấn theo khóa chính, vốn đã cần cho ETag) -> vẫn đúng
+# khi chạy nhiều tiến trình, mỗi tiến trình giữ 1 cache locmem riêng.
+# Số lần hit/miss/evict: GET /api/cache/stats/ (chỉ admin) để chọn MAX_ENTRIES.
+
+_lock = threading.Lock()
+_counters = Counter()  # hits / misses của tiến trình hiện tại
+_evictions = Counter()  # LOCATION -> số mục bị đẩy ra khi cache đầy
+
+
+class CountingLocMemCache(LocMemCache):
+    # LocMemCache (LRU, giới hạn MAX_ENTRIES) có đếm số mục bị đẩy ra
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self._location = name
+
+    def _cull(self):
+        # Gọi khi đang giữ self._lock
+        before = len(self._cache)
+        super()._cull()
+        _evictions[self._location] += before - len(self._cache)
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._cache)
+        return {'entries': entries, 'max_entries': self._max_entries, 'evictions': _evictions[self._location]}
+
+
+def response_key(workspace_id, version, changed_at, scope, url, today):
+    url_hash = hashlib.md5(url.encode()).hexdigest()
+    # changed_at: DB tạo lại (test, khôi phục bản sao lưu) có thể lặp lại cùng id + version
+    return f'tasks:read:w{workspace_id}:v{version}:{changed_at.timestamp()}:{scope}:{today}:{url_hash}'
+
+
+def get_response_data(key):
+    data = caches['default'].get(key)
+    with _lock:
+        _counters['hits' if data is not None else 'misses'] += 1
+    return data
+
+
+def set_response_data(key, data):
+    caches['default'].set(key, data)
+
+
+def cache_stats():
+    cache = caches['default']
+    with _lock:
+        hits, misses = _counters['hits'], _counters['misses']
+    stats = {
+        'backend': f'{type(cache).__module__}.{type(cache).__name__}',
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+    }
+    if isinstance(cache, CountingLocMemCache):
+        stats.update(cache.stats())
+    return stats
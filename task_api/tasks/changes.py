@@ -0,0 +1,220 @@
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Workspace, Board, List, ChangeLog, Activity
+from .counters import recount_lists, refresh_counts
+from .realtime import publish_changes
+from .search import index_cards
+from .auth import invalidate_users
+
+# ===================== THEO DÕI THAY ĐỔI THEO WORKSPACE ===================== #
+# Mỗi workspace có `version` tăng dần, được tăng khi board/list/card/thành viên của nó thay đổi.
+# Các đường ghi đơn lẻ đi qua signal (tasks/signals.py); các đường ghi hàng loạt
+# (bulk_create, bulk_update, queryset.update) gọi touch_* trực tiếp.
+#
+# Trong `with collect():` mọi thay đổi được gom lại và chỉ tăng version 1 lần cho mỗi
+# workspace khi ra khỏi khối (vẫn nằm trong transaction của người gọi).
+# Đồng thời ghi ChangeLog (kind, object_id, op) theo version mới -> /api/sync/ trả delta,
+# và sau khi commit thì phát sự kiện thời gian thực (tasks/realtime.py).
+# Thẻ thay đổi được cập nhật vào index tìm kiếm (tasks/search.py) và bộ đếm của List
+# (tasks/counters.py) trong cùng transaction; bộ đếm được tính sau khi UPDATE version đã khóa dòng workspace.
+# Nhật ký hoạt động của khối (tasks/activity.py) cũng được ghi ở đây: 1 INSERT, workspace của thẻ lấy từ
+# quan hệ List -> Board -> Workspace đã nạp cho ChangeLog.
+
+_pending = ContextVar('tasks_pending_changes', default=None)
+
+
+class ChangeSet:
+    def __init__(self):
+        # (kind, id) -> {'op', 'parent': (kind cha, id cha), 'previous': {cha cũ}}
+        self.objects = {}
+        # Quan hệ cha đã biết từ instance (kể cả dòng đã bị xóa) -> không phải hỏi DB
+        self.board_workspace = {}
+        self.list_board = {}
+        self.activities = []  # [(Activity, list_id của thẻ)] do tasks/activity.py chuyển sang
+
+    def record(self, kind, object_id, parent, op='upsert'):
+        entry = self.objects.setdefault((kind, object_id), {'op': op, 'parent': None, 'previous': set()})
+        entry['op'] = op
+        entry['parent'] = parent
+        if kind == 'board':
+            self.board_workspace[object_id] = parent[1]
+        elif kind == 'list':
+            self.list_board[object_id] = parent[1]
+
+    def moved(self, kind, object_id, old_parent):
+        # Đối tượng rời khỏi cha cũ: nếu cha cũ thuộc workspace khác -> tombstone ở đó
+        entry = self.objects.setdefault((kind, object_id), {'op': 'upsert', 'parent': None, 'previous': set()})
+        entry['previous'].add(old_parent)
+
+    def parents(self):
+        for entry in self.objects.values():
+            if entry['parent'] is not None:
+                yield entry['parent']
+            yield from entry['previous']
+
+    def card_lists(self):
+        # Các List có thẻ được thêm / sửa / chuyển đến / chuyển đi / xóa
+        return {
+            ref[1]
+            for (kind, _), entry in self.objects.items() if kind == 'card'
+            for ref in [entry['parent'], *entry['previous']] if ref is not None and ref[0] == 'list'
+        }
+
+    def resolve(self, lists=()):
+        # Cha (và các List thêm vào) -> workspace_id: tối đa 2 truy vấn (List kèm Board, Board còn thiếu)
+        refs = set(self.parents()) | {('list', pk) for pk in lists}
+        unknown_lists = {pk for kind, pk in refs if kind == 'list'} - self.list_board.keys()
+        if unknown_lists:
+            rows = List.objects.filter(pk__in=unknown_lists).values_list('id', 'board_id', 'board__workspace_id')
+            for list_id, board_id, workspace_id in rows:
+                self.list_board[list_id] = board_id
+                self.board_workspace.setdefault(board_id, workspace_id)  # Giá trị từ instance được ưu tiên
+        board_ids = {pk for kind, pk in refs if kind == 'board'}
+        board_ids.update(self.list_board[pk] for kind, pk in refs if kind == 'list' and pk in self.list_board)
+        unknown_boards = board_ids - self.board_workspace.keys()
+        if unknown_boards:
+            self.board_workspace.update(Board.objects.filter(pk__in=unknown_boards).values_list('id', 'workspace_id'))
+
+    def board_of(self, kind, object_id, ref):
+        if kind == 'board':
+            return object_id
+        if ref is None or ref[0] == 'workspace':
+            return None
+        return ref[1] if ref[0] == 'board' else self.list_board.get(ref[1])
+
+    def workspace_of(self, ref):
+        if ref is None:
+            return None
+        kind, pk = ref
+        if kind == 'list':
+            kind, pk = 'board', self.list_board.get(pk)
+        if kind == 'board':
+            return self.board_workspace.get(pk)
+        return pk
+
+    def entries(self):
+        # {workspace_id: [(kind, id, op, board_id)]}; chuyển sang workspace khác -> 'delete' ở workspace cũ.
+        # Chuyển sang Board khác cùng workspace -> thêm 1 mục cho Board cũ (để báo realtime theo Board)
+        self.resolve()
+        result = {}
+        for (kind, object_id), entry in self.objects.items():
+            current = self.workspace_of(entry['parent'])
+            board_id = self.board_of(kind, object_id, entry['parent'])
+            if current is not None:
+                result.setdefault(current, []).append((kind, object_id, entry['op'], board_id))
+            for ref in entry['previous']:
+                workspace_id = self.workspace_of(ref)
+                old_board_id = self.board_of(kind, object_id, ref)
+                if workspace_id not in (current, None):
+                    result.setdefault(workspace_id, []).append((kind, object_id, 'delete', old_board_id))
+                elif workspace_id is not None and old_board_id != board_id:
+                    result[workspace_id].append((kind, object_id, entry['op'], old_board_id))
+        return result
+
+    def workspaces(self):
+        return set(self.entries())
+
+
+def pending_changes():
+    # ChangeSet của khối collect() đang mở (None nếu không có)
+    return _pending.get()
+
+
+@contextmanager
+def collect():
+    outer = _pending.get()
+    if outer is not None:
+        yield outer  # Lồng nhau: khối ngoài cùng sẽ flush
+        return
+    changes = ChangeSet()
+    token = _pending.set(changes)
+    try:
+        yield changes
+    finally:
+        _pending.reset(token)
+    flush(changes)
+
+
+def flush(changes):
+    # Kể cả thẻ trên Board cá nhân (không thuộc workspace nào)
+    index_cards([object_id for kind, object_id in changes.objects if kind == 'card'])
+    entries = changes.entries()
+    versions = bump_versions(changes, entries) if entries else {}
+    # Sau khi khóa workspace: ghi đồng thời vào cùng List được xếp nối tiếp, đếm lại thấy dữ liệu mới nhất.
+    # List trên Board cá nhân không có workspace -> khóa chính dòng List
+    card_lists = changes.card_lists()
+    personal = {list_id for list_id in card_lists if changes.workspace_of(('list', list_id)) is None}
+    refresh_counts(card_lists - personal)
+    recount_lists(personal, lock=True)
+    if changes.activities:
+        write_activities(changes)
+    return versions
+
+
+def write_activities(changes):
+    changes.resolve({list_id for _, list_id in changes.activities if list_id is not None})
+    for activity, list_id in changes.activities:
+        if list_id is not None:
+            activity.workspace_id = changes.workspace_of(('list', list_id))
+    Activity.objects.bulk_create(activity for activity, _ in changes.activities)
+
+
+def bump_versions(changes, entries):
+    now = timezone.now()
+    # UPDATE nguyên tử: giữ khóa dòng workspace tới khi commit -> version tăng đúng thứ tự
+    Workspace.objects.filter(pk__in=entries.keys()).update(version=F('version') + 1, changed_at=now)
+    # Workspace đã bị xóa hẳn không còn dòng -> không ghi log cho nó
+    versions = dict(Workspace.objects.filter(pk__in=entries.keys()).values_list('id', 'version'))
+    ChangeLog.objects.bulk_create(
+        ChangeLog(workspace_id=workspace_id, version=versions[workspace_id], kind=kind, object_id=object_id, op=op)
+        for workspace_id, items in entries.items() if workspace_id in versions
+        for kind, object_id, op in dict.fromkeys((kind, object_id, op) for kind, object_id, op, _ in items)
+    )
+    events = {workspace_id: (versions[workspace_id], items) for workspace_id, items in entries.items() if workspace_id in versions}
+    # Rollback -> không phát gì; ngoài transaction -> phát ngay
+    transaction.on_commit(functools.partial(publish_changes, events))
+    return versions
+
+
+def touch_workspace(workspace_id, op='upsert'):
+    with collect() as changes:
+        changes.record('workspace', workspace_id, ('workspace', workspace_id), op)
+
+
+def touch_members(members, op='upsert'):
+    invalidate_users(member.user_id for member in members)  # Vai trò trong cache xác thực (tasks/auth.py)
+    with collect() as changes:
+        for member in members:
+            changes.record('member', member.pk, ('workspace', member.workspace_id), op)
+
+
+def touch_boards(boards, op='upsert', old_workspaces=None):
+    # old_workspaces: {board_id: workspace_id cũ} khi Board bị chuyển workspace
+    with collect() as changes:
+        for board in boards:
+            changes.record('board', board.pk, ('workspace', board.workspace_id), op)
+        for board_id, workspace_id in (old_workspaces or {}).items():
+            changes.moved('board', board_id, ('workspace', workspace_id))
+
+
+def touch_lists(lists, op='upsert', old_boards=None):
+    # old_boards: {list_id: board_id cũ} khi List bị chuyển sang Board khác
+    with collect() as changes:
+        for board_list in lists:
+            changes.record('list', board_list.pk, ('board', board_list.board_id), op)
+        for list_id, board_id in (old_boards or {}).items():
+            changes.moved('list', list_id, ('board', board_id))
+
+
+def touch_cards(cards, op='upsert', old_lists=None):
+    # Thẻ chỉ cần biết list_id; workspace được suy ra khi flush (1 truy vấn cho cả nhóm).
+    # old_lists: {card_id: list_id cũ} khi thẻ bị chuyển đi
+    with collect() as changes:
+        for card in cards:
+            changes.record('card', card.pk, ('list', card.list_id), op)
+        for card_id, list_id in (old_lists or {}).items():
+            changes.moved('card', card_id, ('list', list_id))
@@ -0,0 +1,114 @@
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from .models import Board, List, Card, WorkspaceMember
+
+# ===================== BỘ ĐẾM THẺ THEO LIST ===================== #
+# List.todo_count / done_count / cancelled_count = số thẻ đang hoạt động theo trạng thái.
+# tasks/changes.py gọi recount_lists() khi flush với các List có thẻ thay đổi (tạo, sửa,
+# chuyển, lưu trữ, xóa, khôi phục) -> cùng transaction với lần ghi thẻ.
+# Đếm lại thay vì cộng/trừ: không lệch khi 1 request đổi thẻ nhiều lần.
+# Đếm SAU khi đã giữ khóa: dòng workspace (UPDATE version trong flush, rồi refresh_counts: 1 câu UPDATE
+# đếm bằng subquery) hoặc chính dòng List (Board cá nhân, recount_lists(lock=True)) -> 2 transaction cùng
+# ghi thẻ vào 1 List chạy nối tiếp, lần đếm sau thấy thẻ của lần trước.
+# Thống kê (GET /api/workspaces/{id}/stats/) chỉ đọc bộ đếm: O(số List), không O(số thẻ).
+
+COUNTERS = {
+    'todo_count': 'TODO',
+    'done_count': 'DONE',
+    'cancelled_count': 'CANCELLED',
+}
+
+
+def count_cards(list_ids):
+    # {list_id: {counter: n}} bằng 1 truy vấn GROUP BY (index card_active_list_order_idx)
+    rows = (
+        Card.objects.active().filter(list__in=list_ids).order_by().values('list')
+        .annotate(**{field: Count('id', filter=Q(status=status)) for field, status in COUNTERS.items()})
+    )
+    counts = {list_id: dict.fromkeys(COUNTERS, 0) for list_id in list_ids}
+    for row in rows:
+        counts[row.pop('list')] = row
+    return counts
+
+
+def refresh_counts(list_ids):
+    # Đếm lại và ghi trong 1 câu UPDATE mỗi 1000 List (không trả về List nào lệch như recount_lists)
+    list_ids = sorted(set(list_ids))
+    counts = {
+        field: Coalesce(Subquery(
+            Card.objects.active().filter(list=OuterRef('pk'), status=status).order_by()
+            .values('list').annotate(count=Count('id')).values('count')
+        ), 0)
+        for field, status in COUNTERS.items()
+    }
+    for start in range(0, len(list_ids), 1000):  # SQL Server: tối đa 2100 tham số
+        List.objects.filter(pk__in=list_ids[start:start + 1000]).update(**counts)
+
+
+def recount_lists(list_ids, dry_run=False, lock=False):
+    # Trả về các List có bộ đếm bị lệch (đã sửa, trừ khi dry_run). lock: khóa dòng List trước khi đếm
+    list_ids = sorted(set(list_ids))
+    drifted = []
+    for start in range(0, len(list_ids), 1000):  # SQL Server: tối đa 2100 tham số
+        chunk = list_ids[start:start + 1000]
+        # List đã bị xóa không còn dòng -> tự bỏ qua
+        lists = List.objects.filter(pk__in=chunk).only('id', *COUNTERS).order_by('pk')
+        if lock:
+            lists = list(lists.select_for_update())
+        counts = count_cards(chunk)
+        changed = []
+        for board_list in lists:
+            expected = counts[board_list.pk]
+            if any(getattr(board_list, field) != value for field, value in expected.items()):
+                for field, value in expected.items():
+                    setattr(board_list, field, value)
+                changed.append(board_list)
+        if changed and not dry_run:
+            # bulk_update không phát signal và không đổi updated_at: bộ đếm không phải thay đổi của List
+            List.objects.bulk_update(changed, list(COUNTERS))
+        drifted += changed
+    return drifted
+
+
+# ===================== THỐNG KÊ WORKSPACE ===================== #
+def completion_rate(counts):
+    # Tỉ lệ hoàn thành = DONE / (TODO + DONE); thẻ đã hủy không tính. Chưa có thẻ -> None
+    pending = counts['todo'] + counts['done']
+    return round(counts['done'] / pending, 4) if pending else None
+
+
+def stats_row(counts):
+    return {**counts, 'total': counts['todo'] + counts['done'] + counts['cancelled']}
+
+
+def workspace_stats(workspace):
+    # 3 truy vấn cố định: Board, List (kèm bộ đếm), thành viên GROUP BY role -> không quét thẻ
+    boards = {
+        board_id: {'id': board_id, 'name': name, 'lists': []}
+        for board_id, name in Board.objects.filter(workspace=workspace).order_by('id').values_list('id', 'name')
+    }
+    lists = (
+        List.objects.filter(board__workspace=workspace).order_by('board_id', 'order', 'id')
+        .values_list('id', 'board_id', 'title', *COUNTERS)
+    )
+    for list_id, board_id, title, todo, done, cancelled in lists:
+        counts = {'todo': todo, 'done': done, 'cancelled': cancelled}
+        boards[board_id]['lists'].append({'id': list_id, 'title': title, **stats_row(counts)})
+
+    totals = {'todo': 0, 'done': 0, 'cancelled': 0}
+    for board in boards.values():
+        counts = {key: sum(item[key] for item in board['lists']) for key in totals}
+        board.update(stats_row(counts), completion_rate=completion_rate(counts))
+        for key in totals:
+            totals[key] += counts[key]
+
+    by_role = dict(
+        WorkspaceMember.objects.filter(workspace=workspace).order_by()
+        .values_list('role').annotate(count=Count('id'))
+    )
+    return {
+        'workspace': workspace.pk,
+        'members': {'total': sum(by_role.values()), 'by_role': by_role},
+        'cards': {**stats_row(totals), 'completion_rate': completion_rate(totals)},
+        'boards': list(boards.values()),
+    }
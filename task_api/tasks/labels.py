@@ -0,0 +1,111 @@
+from django.db import connection
+from django.db.models import Count, Q
+from .models import Card, List, Label
+
+# ===================== NHÃN THẺ (LABEL) ===================== #
+# Client gửi nhãn theo tên (danh sách hoặc chuỗi "A, B"); server tự tạo Label trong
+# workspace của thẻ. Lọc và đếm đi qua bảng nối Card.labels -> dùng index, không LIKE.
+
+MAX_LABEL_LENGTH = 50
+CardLabel = Card.labels.through
+
+
+def parse_label_names(value):
+    # "A, B" hoặc ["A", "B"] -> ["A", "B"] (bỏ trống, bỏ trùng, giữ thứ tự)
+    if value is None:
+        return []
+    parts = value.split(',') if isinstance(value, str) else value
+    names = []
+    for part in parts:
+        if not isinstance(part, str):
+            raise ValueError("Tên nhãn phải là chuỗi.")
+        name = part.strip()
+        if len(name) > MAX_LABEL_LENGTH:
+            raise ValueError(f"Tên nhãn tối đa {MAX_LABEL_LENGTH} ký tự.")
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def resolve_labels(workspace_id, names):
+    # Tên -> Label trong workspace (tạo những nhãn còn thiếu), 2-3 truy vấn cho cả nhóm
+    if not names:
+        return {}
+    existing = {label.name: label for label in Label.objects.filter(workspace_id=workspace_id, name__in=names)}
+    missing = [Label(workspace_id=workspace_id, name=name) for name in names if name not in existing]
+    if missing and connection.features.supports_ignore_conflicts:
+        # ignore_conflicts: request khác vừa tạo cùng tên -> đọc lại bên dưới
+        Label.objects.bulk_create(missing, ignore_conflicts=True)
+        existing.update((label.name, label) for label in Label.objects.filter(workspace_id=workspace_id, name__in=[m.name for m in missing]))
+    elif missing:
+        # SQL Server (mssql-django) không có ignore_conflicts -> từng nhãn; get_or_create tạo trong
+        # savepoint và đọc lại nếu request khác vừa tạo cùng tên
+        for label in missing:
+            existing[label.name] = Label.objects.get_or_create(workspace_id=workspace_id, name=label.name)[0]
+    return existing
+
+
+def list_workspaces(list_ids, known=None):
+    # {list_id: workspace_id}; known: các List người gọi đã biết workspace -> không hỏi lại DB
+    workspaces = dict(known or {})
+    missing = set(list_ids) - workspaces.keys()
+    if missing:
+        workspaces.update(List.objects.filter(pk__in=missing).values_list('id', 'board__workspace_id'))
+    return workspaces
+
+
+def set_card_labels(assignments, workspaces=None):
+    # assignments: {card: [tên nhãn]} -> thay toàn bộ nhãn của các thẻ đó (bulk, không N+1)
+    if not assignments:
+        return
+    workspaces = list_workspaces({card.list_id for card in assignments}, workspaces)
+    by_workspace = {}
+    for card, names in assignments.items():
+        by_workspace.setdefault(workspaces.get(card.list_id), set()).update(names)
+    labels = {
+        (workspace_id, name): label
+        for workspace_id, names in by_workspace.items()
+        for name, label in resolve_labels(workspace_id, sorted(names)).items()
+    }
+    CardLabel.objects.filter(card__in=[card.pk for card in assignments]).delete()
+    CardLabel.objects.bulk_create(
+        CardLabel(card_id=card.pk, label_id=labels[(workspaces.get(card.list_id), name)].pk)
+        for card, names in assignments.items() for name in names
+    )
+    for card, names in assignments.items():
+        # Kết quả trả về không phải hỏi lại DB
+        card._prefetched_objects_cache = {
+            **getattr(card, '_prefetched_objects_cache', {}),
+            'labels': [labels[(workspaces.get(card.list_id), name)] for name in names],
+        }
+
+
+def relabel_moved(cards, workspaces=None):
+    # Thẻ chuyển sang workspace khác: gắn lại nhãn cùng tên trong workspace mới
+    cards = {card.pk: card for card in cards}
+    if not cards:
+        return
+    workspaces = list_workspaces({card.list_id for card in cards.values()}, workspaces)
+    names, stale = {}, set()
+    rows = CardLabel.objects.filter(card__in=cards).values_list('card_id', 'label__name', 'label__workspace_id')
+    for card_id, name, workspace_id in rows:
+        names.setdefault(card_id, []).append(name)
+        if workspace_id != workspaces.get(cards[card_id].list_id):
+            stale.add(card_id)
+    set_card_labels({cards[card_id]: sorted(names[card_id]) for card_id in stale}, workspaces)
+
+
+def label_filter(names):
+    # Thẻ có ít nhất 1 trong các nhãn: label_name_idx -> index label_id của bảng nối -> khóa chính thẻ.
+    # IN (subquery) thay vì JOIN -> không bị nhân dòng, không cần DISTINCT
+    return Q(pk__in=CardLabel.objects.filter(label__name__in=names).values('card_id'))
+
+
+def count_by_label(cards):
+    # Số thẻ theo từng nhãn: 1 truy vấn GROUP BY trên bảng nối
+    return list(
+        CardLabel.objects.filter(card__in=cards.values('pk'))
+        .values('label__name')
+        .annotate(count=Count('card_id', distinct=True))
+        .order_by('-count', 'label__name')
+    )
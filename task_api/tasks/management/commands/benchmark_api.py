@@ -0,0 +1,88 @@
+import json
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+from tasks.benchmark import SKIPPED, compare, run_size, uncovered_routes
+from tasks.seeding import SIZES
+
+BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+
+class Command(BaseCommand):
+    help = ("Đo mọi route trong tasks.urls (độ trễ p50/p95/p99, số truy vấn, bộ nhớ đỉnh) trên DB test riêng "
+            "với dữ liệu giả lập ở nhiều kích thước; so sánh với baseline và báo lỗi nếu hồi quy.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='small,medium', help=f"Kích thước dữ liệu, cách nhau bởi dấu phẩy ({', '.join(SIZES)})")
+        parser.add_argument('--repeat', type=int, default=10, help="Số lần gọi mỗi route")
+        parser.add_argument('--route', action='append', default=[], help="Chỉ đo route chứa chuỗi này (lặp lại được)")
+        parser.add_argument('--baseline', default=str(BASELINE), help="File baseline JSON")
+        parser.add_argument('--tolerance', type=float, default=1.0, help="Mức chậm hơn / tốn bộ nhớ hơn cho phép (1.0 = gấp đôi)")
+        parser.add_argument('--update-baseline', action='store_true',
+                            help="Ghi kết quả của các route đã đo (--route) vào baseline thay vì so sánh; "
+                                 "route khác giữ nguyên. Chỉ dùng khi cố ý đổi chi phí route, ghi lý do trong commit")
+        parser.add_argument('--keepdb', action='store_true', help="Giữ DB test sau khi chạy")
+
+    def handle(self, *args, **options):
+        sizes = [size.strip() for size in options['sizes'].split(',') if size.strip()]
+        unknown = [size for size in sizes if size not in SIZES]
+        if unknown:
+            raise CommandError(f"Kích thước không hợp lệ: {', '.join(unknown)}")
+        missing = uncovered_routes()
+        if missing:
+            raise CommandError(f"Route chưa có trong tasks/benchmark.py: {', '.join(missing)}")
+        for name, reason in SKIPPED.items():
+            self.stdout.write(f"Bỏ qua {name}: {reason}")
+
+        results = self.run(sizes, options)
+        path = Path(options['baseline'])
+        if options['update_baseline']:
+            baseline = json.loads(path.read_text(encoding='utf-8')) if path.exists() else {}
+            for size, routes in results.items():
+                previous = baseline.setdefault(size, {})
+                for key, row in routes.items():
+                    if key in previous and previous[key]['queries'] != row['queries']:
+                        self.stdout.write(f"[{size}] {key}: {previous[key]['queries']} -> {row['queries']} truy vấn")
+                previous.update(routes)  # Chỉ thay các route vừa đo
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(baseline, indent=2, ensure_ascii=False, sort_keys=True) + '\n', encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f"Đã ghi baseline: {path}"))
+            return
+        if not path.exists():
+            self.stdout.write(self.style.WARNING(f"Chưa có baseline ({path}); chạy với --update-baseline để tạo."))
+            return
+        baseline = json.loads(path.read_text(encoding='utf-8'))
+        regressions = [
+            f"[{size}] {line}" for size in sizes
+            for line in compare(results[size], baseline.get(size, {}), options['tolerance'])
+        ]
+        if regressions:
+            raise CommandError("Hồi quy hiệu năng so với baseline:\n" + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS("Không có hồi quy so với baseline."))
+
+    def run(self, sizes, options):
+        # DB test riêng (như `manage.py test`): không đụng dữ liệu thật
+        setup_test_environment(debug=False)
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            results = {}
+            for size in sizes:
+                with transaction.atomic():
+                    results[size] = run_size(SIZES[size], options['repeat'], options['route'])
+                    transaction.set_rollback(True)
+                self.report(size, results[size])
+            return results
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+    def report(self, size, results):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {size} =="))
+        self.stdout.write(f"{'route':<36} {'status':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8} {'peak KiB':>9}")
+        for key, row in results.items():
+            line = (f"{key:<36} {row['status']:>6} {row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} "
+                    f"{row['queries']:>8} {row['peak_kib']:>9}")
+            self.stdout.write(self.style.ERROR(line) if row['status'] >= 400 else line)
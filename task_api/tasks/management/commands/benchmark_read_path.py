@@ -0,0 +1,68 @@
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from tasks.models import Workspace, Board, List, Card
+from tasks.serializers import CardSerializer, ListSerializer
+from tasks.labels import set_card_labels
+from tasks.renderers import FastJSONRenderer
+from tasks.rows import card_values, card_rows, list_rows
+
+
+class Command(BaseCommand):
+    help = ("So sánh đường đọc DRF (instance + serializer + JSONRenderer) với đường đọc nhanh "
+            "(.values() + orjson) trên dữ liệu tạm. Dữ liệu được rollback sau khi đo.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lists', type=int, default=20, help="Số List tạo tạm")
+        parser.add_argument('--cards', type=int, default=2000, help="Số thẻ tạo tạm (chia đều cho các List)")
+        parser.add_argument('--repeat', type=int, default=5, help="Số lần đo mỗi đường (lấy lần nhanh nhất)")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            board = self.seed(options['lists'], options['cards'])
+            cards = Card.objects.active().with_overdue().filter(list__board=board).order_by('order', 'id')
+            lists = List.objects.filter(board=board).order_by('order', 'id')
+            self.compare('cards', options['repeat'],
+                         lambda: JSONRenderer().render(CardSerializer(cards.prefetch_related('labels'), many=True).data),
+                         lambda: FastJSONRenderer().render(card_rows(list(card_values(cards)))))
+            self.compare('lists', options['repeat'],
+                         lambda: JSONRenderer().render(ListSerializer(lists, many=True).data),
+                         lambda: FastJSONRenderer().render(list_rows(lists)))
+            transaction.set_rollback(True)
+
+    def seed(self, list_count, card_count):
+        user = User.objects.create(username=f'benchmark-{time.time_ns()}')
+        workspace = Workspace.objects.create(name='benchmark', owner=user)
+        board = Board.objects.create(name='benchmark', workspace=workspace, owner=user)
+        lists = List.objects.bulk_create(List(board=board, title=f'List {i}', order=i) for i in range(max(list_count, 1)))
+        statuses = [status for status, _ in Card.STATUS_CHOICES]
+        cards = Card.objects.bulk_create(
+            Card(list=lists[i % len(lists)], title=f'Thẻ {i}', description='Mô tả ' * 10, order=i,
+                 status=statuses[i % len(statuses)], created_by=user)
+            for i in range(card_count)
+        )
+        if not cards or cards[0].pk is None:
+            raise CommandError("DB không trả về id sau bulk_create (cần PostgreSQL / SQLite / SQL Server mới).")
+        set_card_labels({card: sorted({f'nhãn {i % 5}', f'nhãn {i % 3}'}) for i, card in enumerate(cards)})
+        return board
+
+    def compare(self, name, repeat, drf_path, fast_path):
+        drf_output, drf_time = self.measure(drf_path, repeat)
+        fast_output, fast_time = self.measure(fast_path, repeat)
+        if drf_output != fast_output:
+            raise CommandError(f"{name}: output của 2 đường khác nhau!")
+        self.stdout.write(self.style.SUCCESS(
+            f"{name}: {len(fast_output)} byte | DRF {drf_time * 1000:.1f} ms | "
+            f"nhanh {fast_time * 1000:.1f} ms | x{drf_time / fast_time:.1f}"
+        ))
+
+    def measure(self, path, repeat):
+        best, output = None, None
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            output = path()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return output, best
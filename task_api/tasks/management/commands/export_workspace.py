@@ -0,0 +1,33 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from tasks.models import Workspace
+from tasks.transfer import CHUNK_SIZE, csv_lines, export_records, ndjson_lines
+
+
+class Command(BaseCommand):
+    help = "Xuất 1 workspace (board, list, thẻ, nhãn, thành viên) ra ndjson hoặc csv theo dạng stream."
+
+    def add_arguments(self, parser):
+        parser.add_argument('workspace', type=int, help="Id workspace")
+        parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+        parser.add_argument('--output', default='-', help="File đích ('-' = stdout)")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Số dòng đọc mỗi lần từ DB")
+
+    def handle(self, *args, **options):
+        workspace = Workspace.objects.filter(pk=options['workspace']).select_related('owner').first()
+        if workspace is None:
+            raise CommandError(f"Không tìm thấy workspace #{options['workspace']}")
+        chunk_size = options['chunk_size']
+        if options['format'] == 'csv':
+            lines = csv_lines(workspace, chunk_size)
+        else:
+            lines = ndjson_lines(export_records(workspace, chunk_size))
+        if options['output'] == '-':
+            for line in lines:
+                sys.stdout.buffer.write(line)
+            sys.stdout.buffer.flush()
+            return
+        with open(options['output'], 'wb') as output:
+            for line in lines:
+                output.write(line)
+        self.stderr.write(self.style.SUCCESS(f"Đã xuất workspace #{workspace.pk} ra {options['output']}"))
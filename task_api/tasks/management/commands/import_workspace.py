@@ -0,0 +1,37 @@
+import sys
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from tasks.transfer import CHUNK_SIZE, import_lines
+
+
+class Command(BaseCommand):
+    help = ("Nhập file ndjson (từ export_workspace hoặc /api/workspaces/{id}/export/) thành 1 workspace mới. "
+            "Ghi theo lô bulk_create, mỗi lô 1 transaction; lỗi giữa chừng -> xóa workspace nhập dở.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File ndjson ('-' = stdin)")
+        parser.add_argument('--owner', required=True, help="Username chủ sở hữu workspace mới")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Số bản ghi mỗi lô")
+
+    def handle(self, *args, **options):
+        owner = User.objects.filter(username=options['owner']).first()
+        if owner is None:
+            raise CommandError(f"Không tìm thấy user {options['owner']}")
+        started = time.monotonic()
+        try:
+            if options['path'] == '-':
+                importer = import_lines(sys.stdin.buffer, owner, options['chunk_size'])
+            else:
+                with open(options['path'], 'rb') as lines:
+                    importer = import_lines(lines, owner, options['chunk_size'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        counts = ', '.join(f"{kind}: {count}" for kind, count in importer.counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã nhập workspace #{importer.workspace.pk} ({counts}) trong {time.monotonic() - started:.1f}s"
+        ))
+        if importer.skipped_members:
+            self.stdout.write(self.style.WARNING(
+                f"Bỏ qua {importer.skipped_members} thành viên không có tài khoản ở DB này"
+            ))
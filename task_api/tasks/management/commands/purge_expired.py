@@ -0,0 +1,43 @@
+import time
+from django.core.management.base import BaseCommand
+from tasks.retention import purge_expired
+
+
+class Command(BaseCommand):
+    help = ("Xóa vĩnh viễn thẻ lưu trữ quá hạn, workspace trong thùng rác quá hạn, nhật ký đồng bộ cũ, thông báo đã gửi; "
+            "gộp nhật ký hoạt động cũ thành số đếm theo ngày (theo lô).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Số dòng mỗi lô (mặc định RETENTION_BATCH_SIZE)")
+        parser.add_argument('--archive-days', type=int, help="Số ngày giữ thẻ trong Kho lưu trữ")
+        parser.add_argument('--trash-days', type=int, help="Số ngày giữ workspace trong thùng rác")
+        parser.add_argument('--sync-days', type=int, help="Số ngày giữ nhật ký đồng bộ (/api/sync/)")
+        parser.add_argument('--activity-days', type=int, help="Số ngày giữ nhật ký hoạt động (cũ hơn -> gộp theo ngày)")
+        parser.add_argument('--loop', action='store_true', help="Chạy liên tục như một scheduler")
+        parser.add_argument('--interval', type=int, default=3600, help="Số giây giữa 2 lần chạy khi --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options)
+            if not options['loop']:
+                break
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                break
+
+    def run_once(self, options):
+        started = time.monotonic()
+        totals = purge_expired(
+            batch_size=options['batch_size'],
+            archive_days=options['archive_days'],
+            trash_days=options['trash_days'],
+            sync_days=options['sync_days'],
+            activity_days=options['activity_days'],
+            report=self.report_batch,
+        )
+        summary = ", ".join(f"{name}={count}" for name, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(f"Hoàn tất: {summary} ({time.monotonic() - started:.3f}s)"))
+
+    def report_batch(self, label, purged, elapsed):
+        self.stdout.write(f"  {label}: {purged} dòng trong {elapsed:.3f}s")
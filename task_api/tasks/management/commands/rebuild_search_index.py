@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from tasks.search import get_search_backend, InMemorySearchBackend
+
+
+class Command(BaseCommand):
+    help = "Dựng lại toàn bộ index tìm kiếm thẻ (FTS5 / GIN / inverted index trong bộ nhớ)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help="Số thẻ đọc mỗi lô")
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        started = time.monotonic()
+        total = backend.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{type(backend).__name__}: đã index {total} thẻ ({time.monotonic() - started:.3f}s)"
+        ))
+        if isinstance(backend, InMemorySearchBackend):
+            self.stdout.write(self.style.WARNING(
+                "Index trong bộ nhớ thuộc từng tiến trình server và tự dựng lại khi tìm kiếm lần đầu."
+            ))
@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from tasks.models import List
+from tasks.counters import recount_lists
+
+
+class Command(BaseCommand):
+    help = "Đếm lại bộ đếm thẻ (todo/done/cancelled) của mọi List từ bảng thẻ."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Số List xử lý mỗi lô")
+        parser.add_argument('--dry-run', action='store_true', help="Chỉ báo các List bị lệch, không sửa")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.monotonic()
+        ids = List.objects.order_by('pk').values_list('pk', flat=True)
+        total, drifted, batch = 0, [], []
+        for list_id in ids.iterator(chunk_size=batch_size):
+            batch.append(list_id)
+            if len(batch) == batch_size:
+                drifted += self.repair(batch, options['dry_run'])
+                total += len(batch)
+                batch = []
+        drifted += self.repair(batch, options['dry_run'])
+        total += len(batch)
+
+        for board_list in drifted:
+            self.stdout.write(f"List #{board_list.pk}: todo={board_list.todo_count} "
+                              f"done={board_list.done_count} cancelled={board_list.cancelled_count}")
+        action = "bị lệch" if options['dry_run'] else "đã sửa"
+        self.stdout.write(self.style.SUCCESS(
+            f"Đã kiểm tra {total} List, {len(drifted)} List {action} ({time.monotonic() - started:.3f}s)"
+        ))
+
+    def repair(self, list_ids, dry_run):
+        if not list_ids:
+            return []
+        # Mỗi lô 1 transaction: không khóa cả bảng List trong lúc chạy
+        with transaction.atomic():
+            return recount_lists(list_ids, dry_run=dry_run)
@@ -0,0 +1,44 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from tasks.seeding import SIZES, SEED_PASSWORD, seed_tenant
+
+
+class Command(BaseCommand):
+    help = ("Tạo dữ liệu giả lập (workspace, thành viên, Board, List, thẻ, nhãn) bằng bulk_create "
+            "vào DB đang cấu hình, vd: DATABASE_URL=sqlite:///bench.sqlite3 python manage.py seed_data --size medium")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', choices=sorted(SIZES), default='small', help="Bộ kích thước có sẵn")
+        for name, text in (
+            ('workspaces', "Số workspace"), ('members', "Số thành viên mỗi workspace"),
+            ('boards', "Số Board mỗi workspace"), ('lists', "Số List mỗi Board"), ('cards', "Số thẻ mỗi List"),
+        ):
+            parser.add_argument(f'--{name}', type=int, help=f"{text} (ghi đè --size)")
+        parser.add_argument('--labels', type=int, default=8, help="Số nhãn mỗi workspace")
+        parser.add_argument('--archived-ratio', type=float, default=0.1, help="Tỉ lệ thẻ trong Kho lưu trữ")
+        parser.add_argument('--deleted-ratio', type=float, default=0.05, help="Tỉ lệ thẻ trong Thùng rác")
+        parser.add_argument('--due-ratio', type=float, default=0.7, help="Tỉ lệ thẻ có hạn (từ 30 ngày trước tới 60 ngày sau)")
+        parser.add_argument('--seed', type=int, default=0, help="Seed ngẫu nhiên (cùng seed -> cùng dữ liệu)")
+        parser.add_argument('--prefix', default='seed', help="Tiền tố username")
+
+    def handle(self, *args, **options):
+        sizes = dict(SIZES[options['size']])
+        sizes.update({name: options[name] for name in sizes if options[name] is not None})
+        if any(value < 0 for value in sizes.values()):
+            raise CommandError("Số lượng không được âm.")
+        started = time.monotonic()
+        try:
+            data = seed_tenant(
+                **sizes, labels=options['labels'], archived_ratio=options['archived_ratio'],
+                deleted_ratio=options['deleted_ratio'], due_ratio=options['due_ratio'],
+                seed=options['seed'], prefix=options['prefix'],
+            )
+        except RuntimeError as exc:
+            raise CommandError(str(exc))
+        counts = ', '.join(f"{len(rows)} {name}" for name, rows in data.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"{connection.vendor}: đã tạo {counts} ({time.monotonic() - started:.2f}s)"
+        ))
+        if data['users']:
+            self.stdout.write(f"Đăng nhập thử: {data['users'][0].username} / {SEED_PASSWORD}")
@@ -0,0 +1,38 @@
+import time
+from django.core.management.base import BaseCommand
+from tasks.notifications import queue_due_digests, send_pending
+
+
+class Command(BaseCommand):
+    help = "Gửi email trong hàng đợi thông báo theo lô; --digest xếp hàng email tổng hợp hạn thẻ hằng ngày trước khi gửi."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--digest', action='store_true', help="Tạo email tổng hợp thẻ sắp đến hạn / quá hạn (tối đa 1 lần mỗi người mỗi ngày)")
+        parser.add_argument('--days', type=int, help="Số ngày tới tính là 'sắp đến hạn' (mặc định NOTIFICATION_DIGEST_DAYS)")
+        parser.add_argument('--batch-size', type=int, help="Số thư mỗi lô (mặc định NOTIFICATION_BATCH_SIZE)")
+        parser.add_argument('--loop', action='store_true', help="Chạy liên tục như một worker")
+        parser.add_argument('--interval', type=int, default=30, help="Số giây giữa 2 lần gửi khi --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options)
+            if not options['loop']:
+                break
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                break
+
+    def run_once(self, options):
+        started = time.monotonic()
+        if options['digest']:
+            # dedupe_key theo ngày -> gọi mỗi vòng --loop cũng chỉ tạo 1 email mỗi người mỗi ngày
+            queued = queue_due_digests(days=options['days'])
+            self.stdout.write(f"Tổng hợp hạn thẻ: {queued} người có thẻ cần nhắc (ai đã có email hôm nay thì bỏ qua)")
+        totals = send_pending(batch_size=options['batch_size'], report=self.report_batch)
+        self.stdout.write(self.style.SUCCESS(
+            f"Hoàn tất: gửi {totals['sent']}, lỗi {totals['failed']} ({time.monotonic() - started:.3f}s)"
+        ))
+
+    def report_batch(self, size, sent, failed, elapsed):
+        self.stdout.write(f"  lô {size} thư: {sent} gửi, {failed} lỗi trong {elapsed:.3f}s")
@@ -0,0 +1,264 @@
+import logging
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import ExitStack, contextmanager, nullcontext
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# ===================== ĐO HIỆU NĂNG TỪNG REQUEST ===================== #
+# PerformanceMiddleware (đứng đầu MIDDLEWARE) ghi cho mỗi request:
+#   - số truy vấn SQL và tổng thời gian DB (connection.execute_wrapper),
+#   - "serialize": thời gian dựng dữ liệu response (to_representation của serializer, tasks/rows.py),
+#     không tính thời gian DB bên trong,
+#   - "render": thời gian encode response (JSON/HTML của DRF), phần còn lại của view = "app", tổng thời gian.
+# -> header Server-Timing (xem ngay trong DevTools của trình duyệt)
+# -> histogram theo route (tên URL, vd "card-list") trong bộ nhớ tiến trình,
+#    đọc ở GET /api/metrics/ (định dạng text của Prometheus, chỉ admin).
+# Truy vấn chậm hơn PERF_SLOW_QUERY_MS và request vượt PERF_QUERY_BUDGET truy vấn được ghi log
+# kèm SQL và vài dòng stack trong code của dự án (để tìm N+1).
+# PERF_METRICS_ENABLED = False -> MiddlewareNotUsed: Django gỡ middleware khỏi chuỗi, không tốn gì.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+MAX_STATEMENTS = 1000  # Số câu SQL giữ lại mỗi request để báo cáo vượt ngân sách
+
+current_stats = ContextVar('current_stats', default=None)  # RequestStats của request đang chạy
+
+
+def stack_snippet(limit=5):
+    # Các frame cuối thuộc code dự án (bỏ Django, thư viện và chính module này)
+    base = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(base) and 'site-packages' not in frame.filename and frame.filename != __file__
+    ]
+    return ''.join(traceback.format_list(frames[-limit:])).rstrip()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # Không cộng dồn; cộng dồn khi xuất
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+
+class Registry:
+    # Số liệu của tiến trình hiện tại; nhiều worker -> Prometheus scrape từng worker hoặc cộng lại
+    HISTOGRAMS = {
+        'request_duration_seconds': ("Tổng thời gian xử lý request", DURATION_BUCKETS),
+        'request_db_seconds': ("Thời gian chờ DB mỗi request", DURATION_BUCKETS),
+        'request_serialize_seconds': ("Thời gian serialize dữ liệu response (không tính DB)", DURATION_BUCKETS),
+        'request_render_seconds': ("Thời gian render (encode JSON) response", DURATION_BUCKETS),
+        'request_queries': ("Số truy vấn SQL mỗi request", QUERY_BUCKETS),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}  # (metric, route, method) -> Histogram
+        self.requests = Counter()  # (route, method, status) -> số request
+        self.slow_queries = Counter()  # route -> số truy vấn chậm
+        self.over_budget = Counter()  # route -> số request vượt ngân sách truy vấn
+
+    def record(self, route, method, status, stats, total):
+        values = {
+            'request_duration_seconds': total,
+            'request_db_seconds': stats.db_time,
+            'request_serialize_seconds': stats.serialize_time,
+            'request_render_seconds': stats.render_time,
+            'request_queries': stats.queries,
+        }
+        with self.lock:
+            for metric, value in values.items():
+                key = (metric, route, method)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(self.HISTOGRAMS[metric][1])
+                self.histograms[key].observe(value)
+            self.requests[(route, method, status)] += 1
+            self.slow_queries[route] += stats.slow_queries
+            if stats.over_budget:
+                self.over_budget[route] += 1
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.requests.clear()
+            self.slow_queries.clear()
+            self.over_budget.clear()
+
+    def prometheus(self, prefix='task_api'):
+        lines = []
+        with self.lock:
+            for metric, (help_text, buckets) in self.HISTOGRAMS.items():
+                name = f'{prefix}_{metric}'
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (key_metric, route, method), histogram in sorted(self.histograms.items()):
+                    if key_metric != metric:
+                        continue
+                    labels = f'route="{escape(route)}",method="{method}"'
+                    cumulative = 0
+                    for bound, count in zip(buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.total}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.total}')
+            name = f'{prefix}_requests_total'
+            lines += [f'# HELP {name} Số request theo route, method và mã trạng thái', f'# TYPE {name} counter']
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f'{name}{{route="{escape(route)}",method="{method}",status="{status}"}} {count}')
+            for metric, counter, help_text in (
+                ('slow_queries_total', self.slow_queries, "Số truy vấn chậm hơn PERF_SLOW_QUERY_MS"),
+                ('query_budget_exceeded_total', self.over_budget, "Số request vượt PERF_QUERY_BUDGET truy vấn"),
+            ):
+                name = f'{prefix}_{metric}'
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for route, count in sorted(counter.items()):
+                    lines.append(f'{name}{{route="{escape(route)}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+class RequestStats:
+    # execute_wrapper: được gọi quanh mỗi câu SQL của request
+    def __init__(self, slow_ms, budget):
+        self.slow_ms = slow_ms
+        self.budget = budget
+        self.queries = 0
+        self.slow_queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.serialize_depth = 0
+        self.render_time = 0.0
+        self.render_started = None
+        self.statements = []  # (sql, giây, stack hoặc None)
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.queries > self.budget
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db_time += elapsed
+            stack = None
+            if self.slow_ms is not None and elapsed * 1000 >= self.slow_ms:
+                self.slow_queries += 1
+                stack = stack_snippet()
+                logger.warning("Truy vấn chậm (%.1f ms): %s\n%s", elapsed * 1000, sql, stack)
+            elif self.over_budget and self.queries == self.budget + 1:
+                stack = stack_snippet()  # Truy vấn đầu tiên vượt ngân sách: thường là chỗ N+1
+            if len(self.statements) < MAX_STATEMENTS:
+                self.statements.append((sql, elapsed, stack))
+
+    @contextmanager
+    def serializing(self):
+        # Serializer lồng nhau chỉ tính ở lớp ngoài cùng; truy vấn lười bên trong đã tính ở "db"
+        outer = self.serialize_depth == 0
+        self.serialize_depth += 1
+        started, db_time = time.perf_counter(), self.db_time
+        try:
+            yield
+        finally:
+            self.serialize_depth -= 1
+            if outer:
+                self.serialize_time += time.perf_counter() - started - (self.db_time - db_time)
+
+    def render_begin(self):
+        self.render_started = time.perf_counter()
+
+    def render_end(self, response):
+        if self.render_started is not None:
+            self.render_time += time.perf_counter() - self.render_started
+            self.render_started = None
+
+    def budget_report(self):
+        repeated = Counter(sql for sql, _, _ in self.statements).most_common(5)
+        stack = next((stack for _, _, stack in self.statements[self.budget:] if stack), '')
+        lines = [f"  {count}x {sql}" for sql, count in repeated]
+        return '\n'.join(lines) + (f"\n  Truy vấn thứ {self.budget + 1} gọi từ:\n{stack}" if stack else '')
+
+    def server_timing(self, total):
+        app = max(total - self.db_time - self.serialize_time - self.render_time, 0)
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize_time * 1000:.1f}',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'app;dur={app * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+class PerformanceMiddleware:
+    # Chỉ chạy đồng bộ: dưới ASGI, Django chạy nó trong thread của view đồng bộ (cùng kết nối DB).
+    # Với /api/events/ (SSE) thời gian đo là tới khi bắt đầu stream.
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERF_METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'PERF_SLOW_QUERY_MS', 200)
+        self.budget = getattr(settings, 'PERF_QUERY_BUDGET', 30)
+
+    def __call__(self, request):
+        stats = RequestStats(self.slow_ms, self.budget)
+        request.performance_stats = stats
+        started = time.perf_counter()
+        token = current_stats.set(stats)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        total = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match is not None and match.view_name else 'unmatched'
+        registry.record(route, request.method, response.status_code, stats, total)
+        response['Server-Timing'] = stats.server_timing(total)
+        if stats.over_budget:
+            logger.warning(
+                "%s %s (%s): %d truy vấn, vượt ngân sách %d; DB %.1f ms\n%s",
+                request.method, request.get_full_path(), route, stats.queries, self.budget,
+                stats.db_time * 1000, stats.budget_report(),
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF Response được render ngay sau bước này -> đo bằng post-render callback
+        stats = getattr(request, 'performance_stats', None)
+        if stats is not None:
+            stats.render_begin()
+            response.add_post_render_callback(stats.render_end)
+        return response
+
+
+def serializing():
+    # Đo 1 đoạn dựng dữ liệu response vào phase "serialize"; ngoài request (lệnh quản trị...) không làm gì
+    stats = current_stats.get()
+    return nullcontext() if stats is None else stats.serializing()
@@ -0,0 +1,25 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def backfill_timestamps(apps, schema_editor):
+    # Phân trang keyset theo deleted_at/archived_at -> các trường này không được NULL
+    # với dòng đang nằm trong thùng rác / kho lưu trữ. Dùng thời điểm hiện tại để
+    # các dòng cũ không bị dọn dẹp ngay (hạn lưu trữ tính lại từ lúc migrate).
+    now = timezone.now()
+    Card = apps.get_model('tasks', 'Card')
+    Workspace = apps.get_model('tasks', 'Workspace')
+    Card.objects.filter(is_deleted=True, deleted_at__isnull=True).update(deleted_at=now)
+    Card.objects.filter(is_archived=True, archived_at__isnull=True).update(archived_at=now)
+    Workspace.objects.filter(is_deleted=True, deleted_at__isnull=True).update(deleted_at=now)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_card_archived_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_timestamps, migrations.RunPython.noop),
+    ]
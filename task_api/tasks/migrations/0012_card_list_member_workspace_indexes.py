@@ -0,0 +1,47 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0011_backfill_deleted_at_archived_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(condition=models.Q(('is_archived', False), ('is_deleted', False)), fields=['list', 'order', 'id'], name='card_active_list_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(condition=models.Q(('is_archived', False), ('is_deleted', False)), fields=['due_date'], name='card_active_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(condition=models.Q(('is_archived', True)), fields=['archived_at', 'id'], name='card_archived_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['deleted_at', 'id'], name='card_deleted_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='list',
+            index=models.Index(fields=['board', 'order', 'id'], name='list_board_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workspace',
+            index=models.Index(fields=['owner', 'is_deleted'], name='workspace_owner_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workspacemember',
+            index=models.Index(fields=['workspace', 'user', 'role'], name='member_ws_user_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workspacemember',
+            index=models.Index(fields=['user', 'role', 'workspace'], name='member_user_role_ws_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0012_card_list_member_workspace_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workspace',
+            name='changed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='workspace',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,71 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def split_labels(apps, schema_editor):
+    # "Quan trọng, Marketing" -> 2 Label trong workspace của thẻ, gắn qua bảng nối
+    Card = apps.get_model('tasks', 'Card')
+    Label = apps.get_model('tasks', 'Label')
+    Through = Card.label_set.through
+    cards = (
+        Card.objects.exclude(labels__isnull=True).exclude(labels='')
+        .values_list('id', 'list__board__workspace_id', 'labels')
+    )
+    labels = {}
+    links = set()
+    for card_id, workspace_id, text in cards.iterator(chunk_size=2000):
+        for name in {part.strip()[:50] for part in text.split(',')} - {''}:
+            labels.setdefault((workspace_id, name), Label(workspace_id=workspace_id, name=name))
+            links.add((card_id, workspace_id, name))
+    Label.objects.bulk_create(labels.values(), batch_size=1000)
+    label_ids = {(label.workspace_id, label.name): label.pk for label in Label.objects.all()}
+    Through.objects.bulk_create(
+        (Through(card_id=card_id, label_id=label_ids[(workspace_id, name)]) for card_id, workspace_id, name in links),
+        batch_size=1000,
+    )
+
+
+def join_labels(apps, schema_editor):
+    Card = apps.get_model('tasks', 'Card')
+    for card in Card.objects.prefetch_related('label_set').iterator(chunk_size=2000):
+        names = sorted(label.name for label in card.label_set.all())
+        if names:
+            Card.objects.filter(pk=card.pk).update(labels=', '.join(names)[:255])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0014_changelog_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Label',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('workspace', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='labels', to='tasks.workspace')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['name'], name='label_name_idx')],
+                'constraints': [models.UniqueConstraint(fields=('workspace', 'name'), name='label_workspace_name_uniq')],
+            },
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='label_set',
+            field=models.ManyToManyField(blank=True, related_name='cards', to='tasks.label'),
+        ),
+        migrations.RunPython(split_labels, join_labels),
+        migrations.RemoveField(
+            model_name='card',
+            name='labels',
+        ),
+        migrations.RenameField(
+            model_name='card',
+            old_name='label_set',
+            new_name='labels',
+        ),
+    ]
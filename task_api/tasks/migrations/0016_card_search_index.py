@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# Index toàn văn cho tasks/search.py, tùy DB:
+#   - PostgreSQL: GIN trên biểu thức to_tsvector (phải khớp search.PG_DOCUMENT)
+#   - SQLite: bảng ảo FTS5 (rowid = id thẻ), nạp sẵn dữ liệu hiện có
+#   - DB khác: không tạo gì (dùng inverted index trong bộ nhớ)
+
+PG_INDEX = (
+    "CREATE INDEX IF NOT EXISTS card_search_idx ON tasks_card USING GIN "
+    "(to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(description, '')))"
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(PG_INDEX)
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_card_fts USING fts5("
+            "title, description, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO tasks_card_fts (rowid, title, description) "
+            "SELECT id, replace(replace(title, 'đ', 'd'), 'Đ', 'D'), "
+            "replace(replace(coalesce(description, ''), 'đ', 'd'), 'Đ', 'D') FROM tasks_card"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS card_search_idx")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS tasks_card_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0015_label_card_labels'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
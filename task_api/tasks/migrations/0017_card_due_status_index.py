@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0016_card_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Tạo index mới trước rồi mới bỏ index cũ -> không có lúc nào truy vấn lịch mất index
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(condition=models.Q(('is_archived', False), ('is_deleted', False)), fields=['due_date', 'status'], name='card_active_due_status_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='card',
+            name='card_active_due_idx',
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:44
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_counters(apps, schema_editor):
+    # Đếm thẻ đang hoạt động theo trạng thái cho mọi List: 1 truy vấn GROUP BY
+    List = apps.get_model('tasks', 'List')
+    Card = apps.get_model('tasks', 'Card')
+    rows = (
+        Card.objects.filter(is_deleted=False, is_archived=False).order_by().values('list')
+        .annotate(
+            todo_count=Count('id', filter=Q(status='TODO')),
+            done_count=Count('id', filter=Q(status='DONE')),
+            cancelled_count=Count('id', filter=Q(status='CANCELLED')),
+        )
+    )
+    lists = []
+    for row in rows:
+        list_id = row.pop('list')
+        lists.append(List(pk=list_id, **row))
+    List.objects.bulk_update(lists, ['todo_count', 'done_count', 'cancelled_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0017_card_due_status_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='list',
+            name='cancelled_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='list',
+            name='done_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='list',
+            name='todo_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0019_notification_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('workspace_id', models.BigIntegerField(blank=True, null=True)),
+                ('day', models.DateField()),
+                ('verb', models.CharField(choices=[('card_moved', 'Chuyển thẻ'), ('card_archived', 'Lưu trữ thẻ'), ('card_deleted', 'Xóa thẻ vào thùng rác'), ('card_restored', 'Khôi phục thẻ'), ('member_role_changed', 'Đổi vai trò thành viên'), ('workspace_deleted', 'Xóa workspace vào thùng rác'), ('workspace_restored', 'Khôi phục workspace')], max_length=30)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('workspace_id', 'day', 'verb'), name='activity_rollup_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Activity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('workspace_id', models.BigIntegerField(blank=True, null=True)),
+                ('card_id', models.BigIntegerField(blank=True, null=True)),
+                ('verb', models.CharField(choices=[('card_moved', 'Chuyển thẻ'), ('card_archived', 'Lưu trữ thẻ'), ('card_deleted', 'Xóa thẻ vào thùng rác'), ('card_restored', 'Khôi phục thẻ'), ('member_role_changed', 'Đổi vai trò thành viên'), ('workspace_deleted', 'Xóa workspace vào thùng rác'), ('workspace_restored', 'Khôi phục workspace')], max_length=30)),
+                ('data', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['workspace_id', '-id'], name='activity_ws_idx'), models.Index(condition=models.Q(('card_id__isnull', False)), fields=['card_id', '-id'], name='activity_card_idx'), models.Index(fields=['created_at', 'id'], name='activity_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+# Bảng cho CACHES['auth'] (DatabaseCache, xem AUTH_CACHE trong settings.py). Tạo ở mọi DB để bật
+# AUTH_CACHE=db sau này không cần chạy thêm `createcachetable`; cùng schema với lệnh đó.
+
+AUTH_CACHE_TABLE = 'tasks_auth_cache'
+
+
+def create_cache_table(apps, schema_editor):
+    from django.core.management.commands.createcachetable import Command
+    command = Command()
+    command.verbosity = 0
+    command.create_table(schema_editor.connection.alias, AUTH_CACHE_TABLE, dry_run=False)
+
+
+def drop_cache_table(apps, schema_editor):
+    schema_editor.execute(f'DROP TABLE {schema_editor.quote_name(AUTH_CACHE_TABLE)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0021_notification_claimed_until'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, drop_cache_table),
+    ]
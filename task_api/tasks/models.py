@@ -17,6 +17,25 @@ class Workspace(models.Model):
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    # Tăng mỗi khi board/list/card/thành viên thay đổi (ETag, đồng bộ) - xem tasks/changes.py
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Danh sách workspace / thùng rác của một chủ sở hữu
+            models.Index(fields=['owner', 'is_deleted'], name='workspace_owner_deleted_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # version/changed_at chỉ được tăng bằng UPDATE nguyên tử, không ghi đè bằng giá trị cũ trong bộ nhớ
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in ('version', 'changed_at')
+            ]
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
@@ -32,6 +51,12 @@ class WorkspaceMember(models.Model):
 
     class Meta:
         unique_together = ('workspace', 'user') # Đảm bảo 1 user chỉ xuất hiện 1 lần trong 1 workspace
+        indexes = [
+            # Kiểm tra quyền: WorkspaceMember(workspace, user, role='admin')
+            models.Index(fields=['workspace', 'user', 'role'], name='member_ws_user_role_idx'),
+            # Các workspace mà user tham gia (phạm vi dữ liệu, thùng rác của admin)
+            models.Index(fields=['user', 'role', 'workspace'], name='member_user_role_ws_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} ({self.role})"
@@ -44,6 +69,7 @@ class Board(models.Model):
     name = models.CharField(max_length=255)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -52,11 +78,75 @@ class List(models.Model):
     board = models.ForeignKey(Board, on_delete=models.CASCADE, related_name='lists')
     title = models.CharField(max_length=255)
     order = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Bộ đếm thẻ đang hoạt động theo trạng thái, cập nhật trong transaction ghi thẻ
+    # (tasks/counters.py). Sửa lệch: `manage.py repair_counters`
+    todo_count = models.PositiveIntegerField(default=0)
+    done_count = models.PositiveIntegerField(default=0)
+    cancelled_count = models.PositiveIntegerField(default=0)
+
+    COUNTERS = ('todo_count', 'done_count', 'cancelled_count')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['board', 'order', 'id'], name='list_board_order_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Bộ đếm chỉ được ghi bởi tasks/counters.py, không ghi đè bằng giá trị cũ trong bộ nhớ (PATCH/PUT List)
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.COUNTERS
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
 
+# ================= NHÃN (LABEL) ================= #
+class Label(models.Model):
+    # Nhãn dùng chung trong 1 workspace (Board cá nhân: workspace = NULL)
+    workspace = models.ForeignKey(
+        Workspace, on_delete=models.CASCADE, related_name='labels', null=True, blank=True
+    )
+    name = models.CharField(max_length=50)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['workspace', 'name'], name='label_workspace_name_uniq'),
+        ]
+        indexes = [
+            # Lọc ?label= theo tên trên nhiều workspace cùng lúc
+            models.Index(fields=['name'], name='label_name_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
 # ================= CARD (THẺ CÔNG VIỆC) ================= #
+def overdue_condition(today=None):
+    # Giống Card.is_overdue: đang hoạt động, chưa xong, đã qua ngày hết hạn
+    today = today or timezone.now().date()
+    return models.Q(is_deleted=False, is_archived=False, due_date__lt=today) & ~models.Q(status='DONE')
+
+class CardQuerySet(models.QuerySet):
+    def active(self):
+        # Chưa xóa, chưa cất kho
+        return self.filter(is_deleted=False, is_archived=False)
+
+    def with_overdue(self, today=None):
+        # Tính quá hạn trong SQL -> lọc / sắp xếp / đếm được, Card.is_overdue đọc lại giá trị này
+        return self.annotate(overdue=models.Case(
+            models.When(overdue_condition(today), then=models.Value(True)),
+            default=models.Value(False),
+            output_field=models.BooleanField(),
+        ))
+
+    def overdue(self, today=None):
+        return self.filter(overdue_condition(today))
+
 class Card(models.Model):
     STATUS_CHOICES = [
         ('TODO', 'Đang làm'),
@@ -68,10 +158,11 @@ class Card(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     due_date = models.DateField(blank=True, null=True)
-    labels = models.CharField(max_length=255, blank=True, null=True)
+    labels = models.ManyToManyField(Label, related_name='cards', blank=True)
     order = models.PositiveIntegerField(default=0)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cards', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)  # bulk_update/update() phải tự gán
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='TODO')
     
@@ -85,12 +176,160 @@ class Card(models.Model):
     is_deleted = models.BooleanField(default=False)  
     deleted_at = models.DateTimeField(null=True, blank=True)
 
+    objects = CardQuerySet.as_manager()
+
+    class Meta:
+        # Index một phần (partial): chỉ chứa các dòng khớp điều kiện -> nhỏ và đúng bộ lọc nóng.
+        # PostgreSQL, SQLite và SQL Server đều hỗ trợ.
+        indexes = [
+            # Thẻ "đang hoạt động" (chưa xóa, chưa cất kho) theo list, đúng thứ tự hiển thị
+            models.Index(
+                fields=['list', 'order', 'id'], name='card_active_list_order_idx',
+                condition=models.Q(is_deleted=False, is_archived=False),
+            ),
+            # Lịch theo ngày hết hạn và thẻ quá hạn (due_date < hôm nay, status khác DONE):
+            # status nằm trong index -> lọc trạng thái không phải đọc bảng
+            models.Index(
+                fields=['due_date', 'status'], name='card_active_due_status_idx',
+                condition=models.Q(is_deleted=False, is_archived=False),
+            ),
+            # Kho lưu trữ (dọn dẹp theo archived_at) và Thùng rác (sắp xếp theo deleted_at)
+            models.Index(
+                fields=['archived_at', 'id'], name='card_archived_at_idx',
+                condition=models.Q(is_archived=True),
+            ),
+            models.Index(
+                fields=['deleted_at', 'id'], name='card_deleted_at_idx',
+                condition=models.Q(is_deleted=True),
+            ),
+        ]
+
     @property
     def is_overdue(self):
-        # Kiểm tra quá hạn (chỉ tính khi chưa xong, chưa xóa, chưa cất kho)
+        # Kiểm tra quá hạn (chỉ tính khi chưa xong, chưa xóa, chưa cất kho).
+        # Queryset đã .with_overdue() -> dùng luôn giá trị DB tính sẵn
+        if 'overdue' in self.__dict__:
+            return self.overdue
         if self.due_date and self.status != 'DONE' and not self.is_deleted and not self.is_archived:
             return timezone.now().date() > self.due_date
         return False
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+# ================= NHẬT KÝ THAY ĐỔI (ĐỒNG BỘ DELTA) ================= #
+class ChangeLog(models.Model):
+    # Mỗi dòng: 1 đối tượng thay đổi ở version nào của workspace (ghi trong tasks/changes.py).
+    # op='delete' là tombstone: đối tượng đã bị xóa hẳn hoặc chuyển sang workspace khác.
+    KIND_CHOICES = [
+        ('workspace', 'Workspace'),
+        ('member', 'Member'),
+        ('board', 'Board'),
+        ('list', 'List'),
+        ('card', 'Card'),
+    ]
+    OP_CHOICES = [
+        ('upsert', 'Upsert'),
+        ('delete', 'Delete'),
+    ]
+    # Không dùng ForeignKey: tombstone phải sống sót sau khi đối tượng bị xóa
+    workspace_id = models.BigIntegerField()
+    version = models.PositiveBigIntegerField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    op = models.CharField(max_length=10, choices=OP_CHOICES, default='upsert')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['workspace_id', 'version'], name='changelog_ws_version_idx'),
+            models.Index(fields=['created_at'], name='changelog_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}#{self.object_id} {self.op} @v{self.version}"
+
+# ================= HÀNG ĐỢI THÔNG BÁO (OUTBOX) ================= #
+class Notification(models.Model):
+    # Ghi trong cùng transaction với thay đổi gây ra nó; lệnh `manage.py send_notifications`
+    # gửi email theo lô (tasks/notifications.py). sent_at = NULL -> còn chờ gửi.
+    KIND_CHOICES = [
+        ('member_added', 'Được thêm vào workspace'),
+        ('due_digest', 'Tổng hợp thẻ sắp đến hạn / quá hạn'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    # Chống gửi trùng (vd "due_digest:2025-01-15"); rỗng -> không kiểm tra
+    dedupe_key = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True, default='')
+    # Worker đã nhận dòng này tới thời điểm này (đang gửi); worker chết -> hết hạn thì worker khác gửi lại
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'dedupe_key'], name='notification_user_dedupe_uniq',
+                condition=~models.Q(dedupe_key=''),
+            ),
+        ]
+        indexes = [
+            # Worker lấy các dòng chờ gửi theo thứ tự id
+            models.Index(fields=['id'], name='notification_pending_idx', condition=models.Q(sent_at__isnull=True)),
+            # Dọn dòng đã gửi (purge_expired)
+            models.Index(fields=['sent_at'], name='notification_sent_idx', condition=models.Q(sent_at__isnull=False)),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} -> {self.user_id}"
+
+# ================= NHẬT KÝ HOẠT ĐỘNG (AUDIT) ================= #
+class Activity(models.Model):
+    # Chỉ thêm, không sửa: ghi theo lô trong transaction của request (tasks/activity.py).
+    # Không dùng ForeignKey tới workspace / thẻ: nhật ký phải còn sau khi chúng bị xóa hẳn.
+    VERB_CHOICES = [
+        ('card_moved', 'Chuyển thẻ'),
+        ('card_archived', 'Lưu trữ thẻ'),
+        ('card_deleted', 'Xóa thẻ vào thùng rác'),
+        ('card_restored', 'Khôi phục thẻ'),
+        ('member_role_changed', 'Đổi vai trò thành viên'),
+        ('workspace_deleted', 'Xóa workspace vào thùng rác'),
+        ('workspace_restored', 'Khôi phục workspace'),
+    ]
+    workspace_id = models.BigIntegerField(null=True, blank=True)  # NULL: thẻ trên Board cá nhân
+    card_id = models.BigIntegerField(null=True, blank=True)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    verb = models.CharField(max_length=30, choices=VERB_CHOICES)
+    data = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Feed theo workspace / theo thẻ, mới nhất trước (phân trang keyset theo -id)
+            models.Index(fields=['workspace_id', '-id'], name='activity_ws_idx'),
+            models.Index(fields=['card_id', '-id'], name='activity_card_idx', condition=models.Q(card_id__isnull=False)),
+            # Gộp / dọn theo hạn lưu trữ
+            models.Index(fields=['created_at', 'id'], name='activity_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.verb} @ws{self.workspace_id}"
+
+class ActivityRollup(models.Model):
+    # Hoạt động quá hạn lưu trữ được gộp thành số đếm theo ngày rồi xóa (purge_expired)
+    workspace_id = models.BigIntegerField(null=True, blank=True)
+    day = models.DateField()
+    verb = models.CharField(max_length=30, choices=Activity.VERB_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['workspace_id', 'day', 'verb'], name='activity_rollup_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.verb} x{self.count} @ws{self.workspace_id} {self.day}"
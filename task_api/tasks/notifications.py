@@ -0,0 +1,189 @@
+import logging
+import time
+from datetime import timedelta
+from itertools import groupby
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Card, Notification
+
+logger = logging.getLogger(__name__)
+
+# ===================== THÔNG BÁO EMAIL (OUTBOX) ===================== #
+# Request KHÔNG gửi mail: chỉ ghi 1 dòng Notification trong cùng transaction với thay đổi
+# (rollback -> không có thông báo "ma"). Lệnh nền `manage.py send_notifications`:
+#   - (--digest) xếp hàng email tổng hợp thẻ sắp đến hạn / quá hạn cho mỗi người tạo thẻ:
+#     1 truy vấn trên index card_active_due_status_idx, mỗi người tối đa 1 email mỗi ngày (dedupe_key,
+#     lọc trước các dòng đã có + ràng buộc unique, không dùng ignore_conflicts),
+#   - gửi các dòng chờ theo lô: 1 kết nối mail (get_connection) cho cả lô, ghi kết quả bằng bulk_update.
+# Mỗi lô 2 transaction ngắn, SMTP nằm ngoài transaction (không giữ khóa dòng / kết nối DB trong lúc gửi):
+#   1. nhận lô: SELECT ... FOR UPDATE SKIP LOCKED (DB hỗ trợ) + đặt claimed_until, commit,
+#   2. gửi, rồi ghi kết quả và bỏ claimed_until.
+# Nhiều worker cùng lúc: dòng đã nhận (claimed_until chưa hết hạn) bị bỏ qua -> không gửi trùng.
+# Gửi "ít nhất 1 lần": worker chết giữa lô -> hết NOTIFICATION_CLAIM_SECONDS thì lô được gửi lại.
+
+
+def notify(user, kind, subject, body, dedupe_key=''):
+    # Gọi bên trong transaction của request (vd cùng atomic() với thay đổi dữ liệu)
+    return Notification.objects.create(user=user, kind=kind, subject=subject, body=body, dedupe_key=dedupe_key)
+
+
+def notify_member_added(user, workspace, added_by):
+    return notify(
+        user, 'member_added',
+        f"Bạn được thêm vào workspace {workspace.name}",
+        f"Xin chào {user.username},\n\n{added_by.username} đã thêm bạn vào workspace \"{workspace.name}\".",
+    )
+
+
+# ===================== TỔNG HỢP HẠN THẺ HẰNG NGÀY ===================== #
+def digest_cards(today, days):
+    # Thẻ đang hoạt động, chưa làm xong, hạn <= hôm nay + days (gồm cả quá hạn), nhóm theo người tạo
+    return (
+        Card.objects.active()
+        .filter(status='TODO', due_date__lte=today + timedelta(days=days), created_by__isnull=False)
+        .exclude(created_by__email='')
+        .order_by('created_by_id', 'due_date', 'id')
+        .values('id', 'title', 'due_date', 'created_by_id', 'created_by__username', 'list__board__name')
+    )
+
+
+def digest_body(username, cards, today, limit):
+    overdue = [card for card in cards if card['due_date'] < today]
+    upcoming = [card for card in cards if card['due_date'] >= today]
+    lines = [f"Xin chào {username},", ""]
+    for title, group in (("Quá hạn", overdue), ("Sắp đến hạn", upcoming)):
+        if not group:
+            continue
+        lines.append(f"{title} ({len(group)}):")
+        lines += [f"- [{card['list__board__name']}] {card['title']} (hạn {card['due_date']:%d/%m/%Y})" for card in group[:limit]]
+        if len(group) > limit:
+            lines.append(f"... và {len(group) - limit} thẻ khác")
+        lines.append("")
+    return '\n'.join(lines).rstrip() + '\n'
+
+
+def queue_due_digests(today=None, days=None, limit=None):
+    # Mỗi người tối đa 1 email tổng hợp mỗi ngày: chạy lại trong ngày không tạo thêm (dedupe_key).
+    # Trả về số người có thẻ cần nhắc (gồm cả người đã có email hôm nay)
+    today = today or timezone.localdate()
+    days = settings.NOTIFICATION_DIGEST_DAYS if days is None else days
+    limit = limit or settings.NOTIFICATION_DIGEST_MAX_CARDS
+    dedupe_key = f'due_digest:{today.isoformat()}'
+    rows = digest_cards(today, days).iterator(chunk_size=2000)
+    digests = []
+    for user_id, cards in groupby(rows, key=lambda card: card['created_by_id']):
+        cards = list(cards)
+        overdue = sum(1 for card in cards if card['due_date'] < today)
+        digests.append(Notification(
+            user_id=user_id, kind='due_digest', dedupe_key=dedupe_key,
+            subject=f"{len(cards)} thẻ cần chú ý ({overdue} quá hạn)",
+            body=digest_body(cards[0]['created_by__username'], cards, today, limit),
+        ))
+    for start in range(0, len(digests), 500):
+        insert_digests(digests[start:start + 500], dedupe_key)
+    return len(digests)
+
+
+def insert_digests(digests, dedupe_key):
+    # Bỏ trước người đã có email hôm nay rồi bulk_create thường (SQL Server không có ignore_conflicts).
+    # Ràng buộc unique vẫn là chốt chặn: worker khác vừa chèn cùng người -> chèn lại từng dòng, bỏ dòng trùng
+    queued = set(
+        Notification.objects.filter(dedupe_key=dedupe_key, user_id__in=[digest.user_id for digest in digests])
+        .values_list('user_id', flat=True)
+    )
+    digests = [digest for digest in digests if digest.user_id not in queued]
+    try:
+        with transaction.atomic():
+            Notification.objects.bulk_create(digests)
+    except IntegrityError:
+        for digest in digests:
+            try:
+                with transaction.atomic():
+                    digest.save(force_insert=True)
+            except IntegrityError:
+                pass
+
+
+# ===================== GỬI THEO LÔ ===================== #
+def claim_batch(after_id, batch_size, max_attempts):
+    # Transaction ngắn: khóa các dòng chờ, đánh dấu đã nhận (claimed_until, attempts + 1) rồi commit ngay.
+    # Không giữ khóa dòng / transaction trong lúc chờ máy chủ mail
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = (
+            Notification.objects.filter(sent_at__isnull=True, attempts__lt=max_attempts, pk__gt=after_id)
+            .filter(Q(claimed_until__isnull=True) | Q(claimed_until__lt=now)).order_by('id')
+        )
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        elif connection.features.has_select_for_update:
+            queryset = queryset.select_for_update()
+        ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return []
+        Notification.objects.filter(pk__in=ids).update(
+            claimed_until=now + timedelta(seconds=settings.NOTIFICATION_CLAIM_SECONDS), attempts=F('attempts') + 1,
+        )
+    return list(Notification.objects.filter(pk__in=ids).select_related('user').order_by('id'))
+
+
+def deliver(batch):
+    # Gọi ngoài transaction. 1 kết nối cho cả lô; từng thư gửi riêng để biết chính xác thư nào lỗi
+    now = timezone.now()
+    sent = 0
+    try:
+        with get_connection() as mail:
+            for notification in batch:
+                if not notification.user.email:
+                    notification.sent_at, notification.last_error = now, "Người nhận không có email"
+                    continue
+                message = EmailMessage(notification.subject, notification.body, to=[notification.user.email])
+                try:
+                    mail.send_messages([message])
+                except Exception as exc:
+                    notification.last_error = str(exc)[:1000]
+                else:
+                    notification.sent_at, notification.last_error = now, ''
+                    sent += 1
+    except Exception as exc:  # Không mở / đóng được kết nối: dòng chưa gửi thử lại lần sau
+        logger.warning("Lỗi kết nối máy chủ mail: %s", exc)
+        for notification in batch:
+            if notification.sent_at is None:
+                notification.last_error = str(exc)[:1000]
+    return sent, sum(1 for notification in batch if notification.sent_at is None)
+
+
+def record_results(batch):
+    # Transaction ngắn thứ 2: ghi kết quả và trả dòng về hàng đợi (dòng lỗi được nhận lại lần sau)
+    for notification in batch:
+        notification.claimed_until = None
+    with transaction.atomic():
+        Notification.objects.bulk_update(batch, ['sent_at', 'last_error', 'claimed_until'])
+
+
+def send_pending(batch_size=None, max_attempts=None, report=None):
+    # Không gọi bên trong atomic(): lô đã nhận phải được commit trước khi gửi
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    max_attempts = max_attempts or settings.NOTIFICATION_MAX_ATTEMPTS
+    totals = {'sent': 0, 'failed': 0}
+    last_id = 0
+    while True:
+        started = time.monotonic()
+        batch = claim_batch(last_id, batch_size, max_attempts)
+        if not batch:
+            break
+        sent, failed = deliver(batch)
+        record_results(batch)
+        last_id = batch[-1].pk  # Dòng lỗi được thử lại ở lần chạy sau, không lặp trong lần này
+        totals['sent'] += sent
+        totals['failed'] += failed
+        elapsed = time.monotonic() - started
+        logger.info("notifications: %d gửi, %d lỗi trong %.3fs", sent, failed, elapsed)
+        if report:
+            report(len(batch), sent, failed, elapsed)
+        if len(batch) < batch_size:
+            break
+    return totals
@@ -0,0 +1,65 @@
+from django.db.models import Max
+
+# ===================== THỨ TỰ THƯA (GAP-BASED ORDERING) ===================== #
+# Card.order / List.order được đánh số cách nhau ORDER_GAP (1024, 2048, ...).
+# Chèn vào giữa 2 phần tử chỉ cần lấy trung điểm -> thường chỉ ghi đúng 1 dòng.
+# Khi hết khoảng trống (2 phần tử liền kề chênh nhau < 2) mới đánh số lại cả nhóm.
+
+ORDER_GAP = 1024
+MAX_ORDER = 2147483647  # Giới hạn của PositiveIntegerField
+
+
+def next_order(siblings):
+    # Thứ tự để thêm 1 phần tử mới vào cuối nhóm
+    last = siblings.aggregate(last=Max('order'))['last']
+    return ORDER_GAP if last is None else last + ORDER_GAP
+
+
+def rebalance(items):
+    for position, item in enumerate(items, start=1):
+        item.order = position * ORDER_GAP
+
+
+def apply_moves(moves, siblings, parent_field):
+    """
+    moves: danh sách (obj, parent_id, index) theo đúng thứ tự client gửi.
+    siblings: queryset các phần tử cùng loại được tính vào thứ tự (vd thẻ đang hoạt động).
+    Trả về (các object đã đổi, id các nhóm phải đánh số lại).
+    """
+    parent_attr = f'{parent_field}_id'
+    moved_ids = {obj.pk for obj, _, _ in moves}
+    parent_ids = {parent_id for _, parent_id, _ in moves}
+
+    # Nạp 1 lần các nhóm đích (đã sắp xếp), khóa dòng để 2 request không đánh số chồng nhau
+    groups = {parent_id: [] for parent_id in parent_ids}
+    rows = (
+        siblings.select_for_update()
+        .filter(**{f'{parent_field}__in': parent_ids})
+        .exclude(pk__in=moved_ids)
+        .order_by(parent_attr, 'order', 'id')
+        .only('id', 'order', parent_attr)
+    )
+    for row in rows:
+        groups[getattr(row, parent_attr)].append(row)
+
+    changed = {}
+    rebalanced = set()
+    for obj, parent_id, index in moves:
+        for group in groups.values():
+            if obj in group:
+                group.remove(obj)
+        group = groups[parent_id]
+        index = min(index, len(group))
+        setattr(obj, parent_attr, parent_id)
+        group.insert(index, obj)
+
+        low = group[index - 1].order if index > 0 else 0
+        high = group[index + 1].order if index + 1 < len(group) else low + 2 * ORDER_GAP
+        if high - low >= 2 and high <= MAX_ORDER:
+            obj.order = (low + high) // 2
+            changed[obj.pk] = obj
+        else:
+            rebalance(group)
+            rebalanced.add(parent_id)
+            changed.update((item.pk, item) for item in group)
+    return list(changed.values()), rebalanced
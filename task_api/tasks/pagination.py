@@ -0,0 +1,126 @@
+import base64
+import binascii
+import datetime
+import json
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+# ===================== PHÂN TRANG KEYSET (CURSOR) ===================== #
+# Thay vì OFFSET, mỗi trang lọc "sau dòng cuối của trang trước" theo bộ khóa sắp xếp,
+# vd (order, id) hoặc (-deleted_at, -id). Trang thứ 1000 tốn chi phí như trang đầu.
+# Cursor là base64 của danh sách giá trị khóa -> client coi như chuỗi mờ (opaque).
+# Lưu ý: các trường dùng làm khóa không được NULL (migration 0011 đã backfill).
+
+class KeysetPagination(BasePagination):
+    ordering = ('id',)
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def get_ordering(self, view):
+        # View có thể đổi khóa sắp xếp theo action (vd thùng rác theo deleted_at)
+        if view is not None and hasattr(view, 'get_keyset_ordering'):
+            return view.get_keyset_ordering()
+        return self.ordering
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, 'API_PAGE_SIZE', 50)
+        max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 500)
+        value = request.query_params.get(self.page_size_query_param)
+        if value:
+            try:
+                page_size = int(value)
+            except ValueError:
+                raise ValidationError({self.page_size_query_param: "Giá trị phải là số nguyên."})
+            if page_size < 1:
+                raise ValidationError({self.page_size_query_param: "Giá trị phải lớn hơn 0."})
+        return min(page_size, max_page_size)
+
+    def decode_cursor(self, request, ordering):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except (ValueError, binascii.Error, UnicodeEncodeError):
+            raise ValidationError({self.cursor_query_param: "Cursor không hợp lệ."})
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise ValidationError({self.cursor_query_param: "Cursor không hợp lệ."})
+        for value in values:
+            # Chỉ giá trị đơn (số trong phạm vi BIGINT, chuỗi, bool) -> cursor bị sửa không tới được DB
+            if not isinstance(value, (int, float, str)) or (isinstance(value, int) and not -2 ** 63 <= value < 2 ** 63):
+                raise ValidationError({self.cursor_query_param: "Cursor không hợp lệ."})
+        return values
+
+    def encode_cursor(self, row, ordering):
+        values = []
+        for field in ordering:
+            # row: model instance, hoặc dict khi view phân trang queryset .values() (tasks/rows.py)
+            value = row[field.lstrip('-')] if isinstance(row, dict) else getattr(row, field.lstrip('-'))
+            if isinstance(value, (datetime.datetime, datetime.date)):
+                value = value.isoformat()  # Giữ nguyên micro giây để so sánh chính xác
+            values.append(value)
+        return base64.urlsafe_b64encode(json.dumps(values).encode('ascii')).decode('ascii')
+
+    def after(self, ordering, values):
+        # (f1, f2, ..., fn) > (v1, v2, ..., vn) theo chiều sắp xếp của từng trường
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        # Điều kiện thừa trên trường đầu giúp DB quét index theo khoảng
+        first = ordering[0]
+        bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": values[0]})
+        return bound & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = self.get_ordering(view)
+        page_size = self.get_page_size(request)
+        values = self.decode_cursor(request, ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            try:
+                queryset = queryset.filter(self.after(ordering, values))
+            except (ValueError, TypeError, DjangoValidationError):
+                # Đúng định dạng nhưng sai kiểu so với trường (vd chữ cho trường số, ngày sai)
+                raise ValidationError({self.cursor_query_param: "Cursor không hợp lệ."})
+        rows = list(queryset[:page_size + 1])  # Lấy dư 1 dòng để biết còn trang sau
+
+        self.request = request
+        self.next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            self.next_cursor = self.encode_cursor(rows[-1], ordering)
+        return rows
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'next_cursor': self.next_cursor,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'next_cursor': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
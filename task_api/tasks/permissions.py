@@ -0,0 +1,52 @@
+from django.db.models import Q, Case, When, Value, CharField, OuterRef, Subquery
+from .models import Workspace, WorkspaceMember
+
+# ===================== PHẠM VI DỮ LIỆU THEO USER ===================== #
+# User chỉ thấy dữ liệu thuộc các workspace mà mình là chủ sở hữu hoặc thành viên.
+# Superuser (Admin hệ thống) thấy toàn bộ.
+
+def member_workspace_ids(user):
+    # Subquery id workspace (dùng trong filter ...__in=, không gây trùng dòng như JOIN)
+    return WorkspaceMember.objects.filter(user=user).values('workspace_id')
+
+def visible_workspaces(user):
+    queryset = Workspace.objects.filter(is_deleted=False)
+    if user.is_superuser:
+        return queryset
+    return queryset.filter(Q(owner=user) | Q(pk__in=member_workspace_ids(user)))
+
+def board_scope(user, prefix=''):
+    # prefix: đường dẫn tới Board, vd 'list__board__' cho Card, 'board__' cho List
+    if user.is_superuser:
+        return Q()
+    return (
+        Q(**{f'{prefix}workspace__in': visible_workspaces(user).values('id')})
+        # Board cũ chưa gắn workspace: chỉ người tạo mới thấy
+        | Q(**{f'{prefix}workspace__isnull': True, f'{prefix}owner': user})
+    )
+
+def with_user_role(queryset, user):
+    # Vai trò của user hiện tại tính luôn trong SQL (tránh N+1 khi serialize danh sách)
+    if user.is_superuser:
+        return queryset.annotate(current_user_role=Value('system_admin', output_field=CharField()))
+    member_role = WorkspaceMember.objects.filter(workspace=OuterRef('pk'), user=user).values('role')[:1]
+    return queryset.annotate(current_user_role=Case(
+        When(owner_id=user.pk, then=Value('owner')),
+        default=Subquery(member_role),
+        output_field=CharField(),
+    ))
+
+def workspace_role(user, workspace):
+    # Vai trò của user trong workspace: 'system_admin' / 'owner' / 'admin' / 'member' / None.
+    # Lấy từ annotation (with_user_role), rồi cache của CachedJWTAuthentication (tasks/auth.py),
+    # cuối cùng mới hỏi DB
+    if user.is_superuser:
+        return 'system_admin'
+    if workspace.owner_id == user.pk:
+        return 'owner'
+    if hasattr(workspace, 'current_user_role'):
+        return workspace.current_user_role
+    roles = getattr(user, 'workspace_roles', None)
+    if roles is not None:
+        return roles.get(workspace.pk)
+    return WorkspaceMember.objects.filter(workspace=workspace, user=user).values_list('role', flat=True).first()
@@ -0,0 +1,184 @@
+import asyncio
+import functools
+import json
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# ===================== ĐẨY THAY ĐỔI THỜI GIAN THỰC (SSE) ===================== #
+# Sau khi transaction commit, tasks/changes.py gọi publish_changes() -> broker phát sự kiện
+# tới các kênh "workspace:<id>", "board:<id>" và "members:<id>" (thành viên / đổi tên workspace).
+# Endpoint GET /api/events/ (views.event_stream) đăng ký kênh và stream về client.
+#
+# Broker thay được qua settings.REALTIME_BROKER:
+#   - InProcessBroker: 1 tiến trình (dev, test, 1 worker ASGI).
+#   - Nhiều node: cài lớp con của Broker (vd Redis pub/sub, PostgreSQL LISTEN/NOTIFY)
+#     chuyển publish() sang các node khác rồi giao cho subscriber cục bộ.
+# Mỗi subscriber chỉ là 1 asyncio.Queue nhỏ + 1 coroutine đang chờ -> hàng nghìn kết nối
+# rảnh mỗi worker không tốn thread nào.
+
+MAX_CHANGES_PER_EVENT = 100  # Nhiều hơn -> chỉ báo "resync", client tự tải lại
+
+
+def sse(event, data, event_id=None):
+    # Định dạng 1 sự kiện Server-Sent Events (đã encode sẵn, dùng chung cho mọi subscriber)
+    lines = [] if event_id is None else [f'id: {event_id}']
+    lines += [f'event: {event}', f"data: {json.dumps(data, separators=(',', ':'))}"]
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    def __init__(self, broker, channels, queue_size):
+        self.broker = broker
+        self.channels = tuple(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+    def deliver(self, message):
+        # Chạy trên event loop của subscriber. Client chậm -> bỏ bớt, gửi "resync" 1 lần
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        # Trả về sự kiện tiếp theo, hoặc None khi hết `timeout` giây (để gửi heartbeat)
+        if self.overflowed:
+            self.overflowed = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return sse('resync', {})
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    # Giao diện fan-out. publish() được gọi từ thread bất kỳ (thường là thread xử lý request).
+    def subscribe(self, channels):
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+
+class InProcessBroker(Broker):
+    def __init__(self, queue_size=None):
+        self.queue_size = queue_size or getattr(settings, 'REALTIME_QUEUE_SIZE', 100)
+        self.lock = threading.Lock()
+        self.channels = defaultdict(set)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels, self.queue_size)
+        with self.lock:
+            for channel in subscription.channels:
+                self.channels[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                subscribers = self.channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.channels[channel]
+
+    def subscriber_count(self, channel=None):
+        with self.lock:
+            if channel is not None:
+                return len(self.channels.get(channel, ()))
+            return len({s for subscribers in self.channels.values() for s in subscribers})
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscribers = list(self.channels.get(channel, ()))
+        # 1 lần call_soon_threadsafe cho mỗi event loop, không phải cho mỗi subscriber
+        by_loop = defaultdict(list)
+        for subscription in subscribers:
+            by_loop[subscription.loop].append(subscription)
+        for loop, group in by_loop.items():
+            try:
+                loop.call_soon_threadsafe(deliver_all, group, message)
+            except RuntimeError:
+                pass  # Event loop đã đóng (worker đang tắt)
+
+
+def deliver_all(subscriptions, message):
+    for subscription in subscriptions:
+        subscription.deliver(message)
+
+
+@functools.lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'REALTIME_BROKER', 'tasks.realtime.InProcessBroker'))()
+
+
+def workspace_channel(workspace_id):
+    return f'workspace:{workspace_id}'
+
+
+def board_channel(board_id):
+    return f'board:{board_id}'
+
+
+def members_channel(workspace_id):
+    return f'members:{workspace_id}'
+
+
+def publish_changes(events):
+    # events: {workspace_id: (version, [(kind, id, op, board_id)])}, gọi sau khi commit
+    broker = get_broker()
+    for workspace_id, (version, items) in events.items():
+        changes = [
+            {'kind': kind, 'id': object_id, 'op': op, 'board': board_id}
+            for kind, object_id, op, board_id in items
+        ]
+        broker.publish(workspace_channel(workspace_id), changes_event(workspace_id, version, changes))
+        by_board = defaultdict(list)
+        meta = []
+        for change in changes:
+            if change['board'] is not None:
+                by_board[change['board']].append(change)
+            else:
+                meta.append(change)
+        for board_id, board_changes in by_board.items():
+            broker.publish(board_channel(board_id), changes_event(workspace_id, version, board_changes))
+        if meta:
+            broker.publish(members_channel(workspace_id), changes_event(workspace_id, version, meta))
+
+
+def changes_event(workspace_id, version, changes):
+    # id = version -> client gọi /api/sync/?since=<version trước> để lấy dữ liệu chi tiết
+    if len(changes) > MAX_CHANGES_PER_EVENT:
+        return sse('changes', {'workspace': workspace_id, 'version': version, 'truncated': True}, version)
+    return sse('changes', {'workspace': workspace_id, 'version': version, 'changes': changes}, version)
+
+
+async def stream_events(channels, ready, heartbeat=None, timeout=None):
+    # Async generator cho StreamingHttpResponse: "ready" -> các sự kiện -> heartbeat định kỳ.
+    # Sau `timeout` giây đóng stream; EventSource tự kết nối lại (kiểm tra lại token và quyền).
+    heartbeat = heartbeat or getattr(settings, 'REALTIME_HEARTBEAT', 15)
+    timeout = timeout or getattr(settings, 'REALTIME_STREAM_TIMEOUT', 300)
+    loop = asyncio.get_running_loop()
+    async with get_broker().subscribe(channels) as subscription:
+        yield f"retry: {getattr(settings, 'REALTIME_RETRY_MS', 3000)}\n" + sse('ready', ready)
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            message = await subscription.get(min(heartbeat, remaining))
+            yield ': ping\n\n' if message is None else message
@@ -0,0 +1,64 @@
+import json
+import logging
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # Phụ thuộc tùy chọn: không cài -> dùng json của thư viện chuẩn như DRF
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# ===================== RENDERER JSON NHANH ===================== #
+# Cùng output (từng byte) với rest_framework.renderers.JSONRenderer ở cấu hình mặc định
+# (COMPACT_JSON, UNICODE_JSON) nhưng encode bằng orjson (nhanh hơn nhiều với danh sách lớn).
+# Kiểu orjson không tự xử lý giống DRF (datetime, Decimal, UUID, lazy string...) -> encoder của DRF.
+# Pretty-print (?indent / Browsable API), cấu hình khác mặc định hoặc orjson lỗi -> về JSONRenderer.
+# Khác biệt duy nhất: số thực dạng mũ (1e-05 / 1e+16 so với 0.00001 / 1e16) -> chỉ dùng cho
+# response không có số thực (danh sách thẻ / List, xem FastReadMixin trong views.py).
+# orjson có trong requirements.txt; thiếu (cài tay, môi trường cũ) -> cảnh báo 1 lần khi khởi động.
+
+LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+def check_orjson():
+    # Gọi từ TasksConfig.ready()
+    if orjson is None:
+        logger.warning("Chưa cài orjson: FastJSONRenderer dùng json của thư viện chuẩn (chậm hơn với danh sách lớn).")
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except (TypeError, ValueError):
+            return super().render(data, accepted_media_type, renderer_context)
+        # Giống DRF: escape U+2028/U+2029 để output vẫn là tập con hợp lệ của JavaScript
+        for raw, escaped in LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+
+# ===================== RENDERER CHO FILE XUẤT (tasks/transfer.py) ===================== #
+# Chỉ để DRF nhận ?format=ndjson|csv và chọn Content-Type; nội dung file do StreamingHttpResponse
+# trả thẳng. render() chỉ dùng cho response lỗi (404, 401...) -> 1 dòng JSON.
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b'' if data is None else json.dumps(data, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+class CSVRenderer(NDJSONRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
@@ -0,0 +1,70 @@
+import logging
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import Workspace, Card, ChangeLog, Notification
+from .changes import collect
+from .activity import rollup_activity
+
+logger = logging.getLogger(__name__)
+
+# ===================== DỌN DẸP THEO HẠN LƯU TRỮ ===================== #
+# Chạy nền (lệnh `manage.py purge_expired`), KHÔNG chạy trong request GET.
+# Xóa theo từng lô nhỏ, mỗi lô 1 transaction riêng -> không khóa bảng lâu.
+
+def archive_deadline(now=None, days=None):
+    # Thẻ trong Kho lưu trữ quá hạn này sẽ bị xóa vĩnh viễn
+    days = settings.ARCHIVE_RETENTION_DAYS if days is None else days
+    return (now or timezone.now()) - timedelta(days=days)
+
+def workspace_trash_deadline(now=None, days=None):
+    days = settings.WORKSPACE_TRASH_RETENTION_DAYS if days is None else days
+    return (now or timezone.now()) - timedelta(days=days)
+
+def sync_log_deadline(now=None, days=None):
+    days = settings.SYNC_LOG_RETENTION_DAYS if days is None else days
+    return (now or timezone.now()) - timedelta(days=days)
+
+def notification_deadline(now=None, days=None):
+    days = settings.NOTIFICATION_RETENTION_DAYS if days is None else days
+    return (now or timezone.now()) - timedelta(days=days)
+
+def purge_in_batches(queryset, batch_size, label, report=None):
+    total = 0
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        started = time.monotonic()
+        with transaction.atomic(), collect():
+            # Chọn lại theo điều kiện gốc: dòng vừa được khôi phục sẽ không bị xóa nhầm
+            _, cascaded = queryset.filter(pk__in=ids).delete()
+        elapsed = time.monotonic() - started
+        purged = cascaded.get(queryset.model._meta.label, 0)
+        total += purged
+        logger.info("purge %s: %d dòng (%s) trong %.3fs", label, purged, cascaded, elapsed)
+        if report:
+            report(label, purged, elapsed)
+        if len(ids) < batch_size:
+            break
+    return total
+
+def purge_expired(now=None, batch_size=None, archive_days=None, trash_days=None, sync_days=None, activity_days=None,
+                  report=None):
+    now = now or timezone.now()
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    expired_cards = Card.objects.filter(is_archived=True, archived_at__lt=archive_deadline(now, archive_days))
+    expired_workspaces = Workspace.objects.filter(is_deleted=True, deleted_at__lt=workspace_trash_deadline(now, trash_days))
+    expired_log = ChangeLog.objects.filter(created_at__lt=sync_log_deadline(now, sync_days))
+    sent_notifications = Notification.objects.filter(sent_at__lt=notification_deadline(now))
+    return {
+        'archived_cards': purge_in_batches(expired_cards, batch_size, 'archived_cards', report),
+        'trashed_workspaces': purge_in_batches(expired_workspaces, batch_size, 'trashed_workspaces', report),
+        # Chạy sau cùng: tombstone của 2 bước trên vẫn được giữ đủ hạn
+        'sync_log': purge_in_batches(expired_log, batch_size, 'sync_log', report),
+        'notifications': purge_in_batches(sent_notifications, batch_size, 'notifications', report),
+        # Nhật ký hoạt động không bị mất hẳn: gộp thành số đếm theo (workspace, ngày, loại) rồi mới xóa
+        'activity': rollup_activity(now, activity_days, batch_size, report),
+    }
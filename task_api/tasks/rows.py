@@ -0,0 +1,116 @@
+import functools
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601
+from rest_framework.fields import DateTimeField
+from rest_framework.relations import RelatedField
+from rest_framework.settings import api_settings
+from .models import Card
+from .labels import CardLabel
+from .serializers import CardSerializer, ListSerializer
+
+# ===================== ĐƯỜNG ĐỌC NHANH CHO DANH SÁCH ===================== #
+# GET /api/cards/ và /api/lists/ trả về hàng trăm dòng mỗi lần: dựng model instance + chạy
+# serializer của DRF cho từng dòng tốn CPU hơn cả truy vấn SQL. Ở đây:
+#   - đọc bằng .values() (dict, không dựng instance),
+#   - quan hệ nhiều (nhãn của thẻ, id thẻ của List) gom bằng 1 truy vấn cho cả trang,
+#   - mỗi trường đi qua đúng to_representation của field trong serializer tương ứng
+#     -> cùng thứ tự khóa, cùng định dạng ngày giờ, output giống từng byte với đường DRF.
+# Thêm trường vào model/serializer không phải sửa ở đây. So sánh 2 đường: `manage.py benchmark_read_path`.
+
+
+def iso_datetime(value, tz):
+    # = DateTimeField.to_representation (ISO 8601) nhưng múi giờ hiện tại đã lấy sẵn 1 lần
+    # cho cả danh sách (mỗi lần gọi get_current_timezone() đi qua asgiref Local, khá chậm)
+    value = value.astimezone(tz).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def is_iso_datetime(field):
+    return (type(field) is DateTimeField and settings.USE_TZ and getattr(field, 'timezone', None) is None
+            and getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601)
+
+
+@functools.lru_cache(maxsize=None)
+def field_plan(serializer_class, computed):
+    # [(tên, cột trong .values(), to_representation, là datetime ISO)]; cột None = người gọi tính (computed)
+    plan = []
+    for name, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+        if name in computed:
+            plan.append((name, None, None, False))
+        elif isinstance(field, RelatedField):
+            plan.append((name, f'{field.source}_id', None, False))  # Khóa ngoại -> id, không JOIN
+        else:
+            plan.append((name, field.source, field.to_representation, is_iso_datetime(field)))
+    return tuple(plan)
+
+
+def value_columns(plan):
+    return [column for _, column, _, _ in plan if column is not None]
+
+
+def build_rows(rows, plan, computed):
+    tz = timezone.get_current_timezone()
+    result = []
+    for row in rows:
+        item = {}
+        for name, column, to_representation, is_datetime in plan:
+            if column is None:
+                item[name] = computed[name](row)
+                continue
+            value = row[column]
+            # Giống Serializer.to_representation: None giữ nguyên, không qua field
+            if value is None or to_representation is None:
+                item[name] = value
+            elif is_datetime:
+                item[name] = iso_datetime(value, tz)
+            else:
+                item[name] = to_representation(value)
+        result.append(item)
+    return result
+
+
+# ===== THẺ ===== #
+CARD_COMPUTED = ('is_overdue', 'labels')
+
+
+def card_values(queryset, extra=()):
+    # queryset đã .with_overdue(); extra: cột cần thêm cho phân trang (vd due_key)
+    plan = field_plan(CardSerializer, CARD_COMPUTED)
+    columns = dict.fromkeys([*value_columns(plan), 'overdue', *extra])
+    return queryset.prefetch_related(None).values(*columns)
+
+
+def card_rows(rows):
+    names = {}
+    card_ids = [row['id'] for row in rows]
+    for start in range(0, len(card_ids), 1000):  # SQL Server: tối đa 2100 tham số
+        pairs = CardLabel.objects.filter(card_id__in=card_ids[start:start + 1000]).values_list('card_id', 'label__name')
+        for card_id, name in pairs:
+            names.setdefault(card_id, []).append(name)
+    return build_rows(rows, field_plan(CardSerializer, CARD_COMPUTED), {
+        'is_overdue': lambda row: bool(row['overdue']),
+        'labels': lambda row: sorted(names.get(row['id'], [])),
+    })
+
+
+# ===== LIST ===== #
+LIST_COMPUTED = ('cards',)
+
+
+def list_rows(queryset):
+    plan = field_plan(ListSerializer, LIST_COMPUTED)
+    rows = list(queryset.values(*value_columns(plan)))
+    # id thẻ đang hoạt động của mọi List trong 1 truy vấn (index card_active_list_order_idx)
+    cards = {row['id']: [] for row in rows}
+    list_ids = list(cards)
+    for start in range(0, len(list_ids), 1000):
+        pairs = (
+            Card.objects.active().filter(list_id__in=list_ids[start:start + 1000])
+            .order_by('list_id', 'order', 'id').values_list('list_id', 'id')
+        )
+        for list_id, card_id in pairs:
+            cards[list_id].append(card_id)
+    return build_rows(rows, plan, {'cards': lambda row: cards[row['id']]})
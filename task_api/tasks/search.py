@@ -0,0 +1,295 @@
+import bisect
+import functools
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from .models import Card, ChangeLog
+
+# ===================== TÌM KIẾM TOÀN VĂN THẺ ===================== #
+# GET /api/cards/search/?q=&workspace= -> thẻ xếp theo độ liên quan (title + description).
+# Backend chọn theo DB (hoặc settings.SEARCH_BACKEND):
+#   - PostgreSQL (Render): index GIN trên biểu thức to_tsvector, DB tự cập nhật, xếp hạng ts_rank.
+#   - SQLite (dev/test): bảng ảo FTS5 tasks_card_fts, xếp hạng bm25.
+#   - Còn lại (SQL Server local): inverted index trong bộ nhớ mỗi tiến trình.
+# Cập nhật tăng dần: tasks/changes.py gọi backend.changed(card_ids) mỗi lần flush.
+# Dựng lại toàn bộ: `manage.py rebuild_search_index`.
+# Mọi từ khóa phải khớp (AND); từ cuối khớp theo tiền tố để gõ tới đâu tìm tới đó.
+
+FTS_TABLE = 'tasks_card_fts'
+# FTS5 bỏ dấu (remove_diacritics) nhưng "đ" là chữ riêng -> tự đổi sang "d" ở cả 2 phía
+FTS_COLUMNS = "replace(replace(title, 'đ', 'd'), 'Đ', 'D'), replace(replace(coalesce(description, ''), 'đ', 'd'), 'Đ', 'D')"
+MAX_TERMS = 10
+PG_DOCUMENT = "to_tsvector('simple', coalesce({table}title, '') || ' ' || coalesce({table}description, ''))"
+
+
+def tokenize(text):
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def query_terms(query):
+    return tokenize(query)[:MAX_TERMS]
+
+
+class SearchBackend:
+    def search(self, cards, query, limit):
+        # cards: queryset trong phạm vi user -> list thẻ (có .rank), tốt nhất trước
+        raise NotImplementedError
+
+    def changed(self, card_ids):
+        # Gọi trong transaction của lần ghi; thẻ không còn tồn tại thì bỏ khỏi index
+        pass
+
+    def rebuild(self, batch_size=2000):
+        # Trả về số thẻ đã index
+        raise NotImplementedError
+
+
+class PostgresSearchBackend(SearchBackend):
+    # Index là biểu thức trên chính bảng tasks_card (migration 0016) -> không cần đồng bộ gì
+    def search(self, cards, query, limit):
+        terms = query_terms(query)
+        # Từ đã lọc bằng \w+ -> ghép thẳng vào cú pháp tsquery an toàn
+        tsquery = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+        document = PG_DOCUMENT.format(table=f'"{Card._meta.db_table}".')
+        return list(
+            cards.filter(RawSQL(f"{document} @@ to_tsquery('simple', %s)", [tsquery], output_field=BooleanField()))
+            .annotate(rank=RawSQL(f"ts_rank({document}, to_tsquery('simple', %s))", [tsquery], output_field=FloatField()))
+            .order_by('-rank', 'id')[:limit]
+        )
+
+    def rebuild(self, batch_size=2000):
+        with connection.cursor() as cursor:
+            cursor.execute('REINDEX INDEX card_search_idx')
+        return Card.objects.count()
+
+
+class SQLiteSearchBackend(SearchBackend):
+    # Bảng FTS5 riêng (rowid = id thẻ), chép title/description khi thẻ thay đổi
+    def search(self, cards, query, limit):
+        terms = query_terms(query)
+        terms = [term.replace('đ', 'd') for term in terms]
+        match = ' '.join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+        card_id = f'"{Card._meta.db_table}"."id"'
+        return list(
+            cards.filter(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]))
+            # bm25: càng nhỏ càng liên quan
+            .annotate(rank=RawSQL(
+                f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {card_id}',
+                [match], output_field=FloatField(),
+            ))
+            .order_by('-rank', 'id')[:limit]
+        )
+
+    def changed(self, card_ids):
+        card_ids = list(card_ids)
+        with connection.cursor() as cursor:
+            for start in range(0, len(card_ids), 500):
+                chunk = card_ids[start:start + 500]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', chunk)
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE} (rowid, title, description) '
+                    f'SELECT id, {FTS_COLUMNS} FROM {Card._meta.db_table} WHERE id IN ({placeholders})',
+                    chunk,
+                )
+
+    def rebuild(self, batch_size=2000):
+        total = 0
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            ids = Card.objects.order_by('pk').values_list('pk', flat=True)
+            batch = []
+            for card_id in ids.iterator(chunk_size=batch_size):
+                batch.append(card_id)
+                if len(batch) == batch_size:
+                    self.changed(batch)
+                    total += len(batch)
+                    batch = []
+            self.changed(batch)
+            total += len(batch)
+        return total
+
+
+class InMemorySearchBackend(SearchBackend):
+    # Inverted index: từ -> {id thẻ: số lần xuất hiện}. Mỗi tiến trình giữ 1 bản, dựng khi cần.
+    # Thay đổi từ tiến trình khác được bắt kịp qua ChangeLog (tasks/changes.py) trước mỗi lần tìm
+    # (thẻ trên Board cá nhân không có ChangeLog -> chỉ cập nhật trong tiến trình đã ghi).
+    # pk ChangeLog cấp lúc INSERT, không theo thứ tự commit: pk nhỏ hơn cursor chưa thấy ("lỗ", transaction
+    # đang chạy hoặc đã rollback) được quét lại ở các lần sau, tới khi tụt quá LOG_WINDOW pk sau cursor.
+    LOG_WINDOW = 1000  # SQL Server: tối đa 2100 tham số cho pk__in
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.ready = False
+        self.postings = defaultdict(dict)
+        self.documents = {}  # id thẻ -> {từ: số lần}
+        self.vocabulary = []  # Các từ đã sắp xếp, để khớp tiền tố bằng bisect
+        self.log_cursor = 0
+        self.log_gaps = set()
+
+    @staticmethod
+    def normalize(term):
+        # Bỏ dấu tiếng Việt: "Thiết kế" khớp "thiet ke"
+        term = unicodedata.normalize('NFKD', term.replace('đ', 'd'))
+        return ''.join(ch for ch in term if not unicodedata.combining(ch))
+
+    def terms(self, *texts):
+        counts = defaultdict(int)
+        for text in texts:
+            for term in tokenize(text):
+                counts[self.normalize(term)] += 1
+        return counts
+
+    def add(self, card_id, title, description):
+        self.remove(card_id)
+        counts = self.terms(title, description)
+        self.documents[card_id] = counts
+        for term, count in counts.items():
+            if term not in self.postings and self.ready:
+                bisect.insort(self.vocabulary, term)  # Khi dựng lại: sắp xếp 1 lần ở cuối
+            self.postings[term][card_id] = count
+
+    def remove(self, card_id):
+        for term in self.documents.pop(card_id, ()):
+            postings = self.postings[term]
+            postings.pop(card_id, None)
+            if not postings:
+                del self.postings[term]
+                index = bisect.bisect_left(self.vocabulary, term)
+                if index < len(self.vocabulary) and self.vocabulary[index] == term:
+                    self.vocabulary.pop(index)
+
+    def load(self, card_ids):
+        card_ids = list(card_ids)
+        for start in range(0, len(card_ids), 1000):  # SQL Server: tối đa 2100 tham số
+            chunk = card_ids[start:start + 1000]
+            rows = {pk: (title, description) for pk, title, description in
+                    Card.objects.filter(pk__in=chunk).values_list('pk', 'title', 'description')}
+            for card_id in chunk:
+                if card_id in rows:
+                    self.add(card_id, *rows[card_id])
+                else:
+                    self.remove(card_id)
+
+    def rebuild(self, batch_size=2000):
+        with self.lock:
+            self.ready = False
+            self.postings.clear()
+            self.documents.clear()
+            self.vocabulary = []
+            # Đọc mốc ChangeLog trước khi quét -> thay đổi xen giữa sẽ được bắt kịp sau
+            top = ChangeLog.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+            self.log_cursor, self.log_gaps = max(top - self.LOG_WINDOW, 0), set()
+            self.advance(ChangeLog.objects.filter(pk__gt=self.log_cursor, pk__lte=top).values_list('pk', flat=True))
+            rows = Card.objects.values_list('pk', 'title', 'description')
+            for card_id, title, description in rows.iterator(chunk_size=batch_size):
+                self.add(card_id, title, description)
+            self.vocabulary = sorted(self.postings)
+            self.ready = True
+            return len(self.documents)
+
+    def catch_up(self):
+        query = Q(pk__gt=self.log_cursor)
+        if self.log_gaps:
+            query |= Q(pk__in=self.log_gaps)
+        rows = list(ChangeLog.objects.filter(query).values_list('pk', 'kind', 'object_id'))
+        self.advance(pk for pk, _, _ in rows)
+        card_ids = {object_id for _, kind, object_id in rows if kind == 'card'}
+        if card_ids:
+            self.load(card_ids)
+
+    def advance(self, pks):
+        # Dời cursor tới pk lớn nhất đã thấy, ghi nhớ các pk bị nhảy qua để quét lại
+        pks = set(pks)
+        top = max(pks, default=self.log_cursor)
+        if top > self.log_cursor:
+            start = max(self.log_cursor + 1, top - self.LOG_WINDOW + 1)
+            self.log_gaps.update(range(start, top))
+            self.log_cursor = top
+        self.log_gaps = {pk for pk in self.log_gaps - pks if pk > self.log_cursor - self.LOG_WINDOW}
+
+    def changed(self, card_ids):
+        card_ids = set(card_ids)
+
+        def apply():
+            with self.lock:
+                if self.ready:
+                    self.load(card_ids)
+        transaction.on_commit(apply, robust=True)
+
+    def matches(self, term, prefix):
+        if not prefix:
+            return self.postings.get(term, {})
+        matched = defaultdict(int)
+        start = bisect.bisect_left(self.vocabulary, term)
+        for candidate in self.vocabulary[start:]:
+            if not candidate.startswith(term):
+                break
+            for card_id, count in self.postings[candidate].items():
+                matched[card_id] += count
+        return matched
+
+    def ranked(self, query):
+        terms = [self.normalize(term) for term in query_terms(query)]
+        total = max(len(self.documents), 1)
+        scores = None
+        for position, term in enumerate(terms):
+            matched = self.matches(term, prefix=position == len(terms) - 1)
+            idf = math.log(1 + total / (1 + len(matched)))
+            term_scores = {card_id: (1 + math.log(count)) * idf for card_id, count in matched.items()}
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {card_id: score + term_scores[card_id] for card_id, score in scores.items() if card_id in term_scores}
+            if not scores:
+                return []
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def search(self, cards, query, limit):
+        with self.lock:
+            if not self.ready:
+                self.rebuild()
+            self.catch_up()
+            ranked = self.ranked(query)
+        # Lọc theo phạm vi user từng đợt, theo thứ tự hạng, tới khi đủ `limit`
+        results = []
+        for start in range(0, len(ranked), 1000):
+            chunk = dict(ranked[start:start + 1000])
+            visible = {card.pk: card for card in cards.filter(pk__in=list(chunk))}
+            for card_id, rank in chunk.items():
+                if card_id in visible:
+                    visible[card_id].rank = rank
+                    results.append(visible[card_id])
+                    if len(results) == limit:
+                        return results
+        return results
+
+
+@functools.lru_cache(maxsize=None)
+def get_search_backend():
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if connection.vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    return InMemorySearchBackend()
+
+
+def search_cards(cards, query, limit):
+    if not query_terms(query):
+        return []
+    return get_search_backend().search(cards, query, limit)
+
+
+def index_cards(card_ids):
+    if card_ids:
+        get_search_backend().changed(card_ids)
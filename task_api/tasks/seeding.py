@@ -0,0 +1,128 @@
+import random
+import uuid
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from .models import Workspace, WorkspaceMember, Board, List, Card, Label
+from .labels import CardLabel
+from .ordering import ORDER_GAP
+from .counters import recount_lists
+from .search import index_cards
+from .bulk import returns_ids
+
+# ===================== DỮ LIỆU GIẢ LẬP (SEED) ===================== #
+# Tạo 1 "tenant" giả lập bằng bulk_create (vài truy vấn mỗi bảng, không phát signal) cho
+# `manage.py seed_data` và `manage.py benchmark_api`. Chạy được trên mọi DB đã cấu hình
+# (SQLite qua DATABASE_URL=sqlite:///..., PostgreSQL, SQL Server). DB không trả id sau bulk_create
+# (SQL Server) -> đọc lại id theo khóa tự nhiên, duy nhất trong 1 lần seed (username, owner, tên, order).
+# Cùng `seed` -> cùng cấu trúc dữ liệu (số thẻ, trạng thái, hạn, nhãn...), chỉ tên user khác nhau.
+
+SIZES = {
+    # Số lượng: workspace, thành viên mỗi workspace, Board mỗi workspace, List mỗi Board, thẻ mỗi List
+    'small': {'workspaces': 1, 'members': 3, 'boards': 2, 'lists': 4, 'cards': 10},
+    'medium': {'workspaces': 2, 'members': 5, 'boards': 3, 'lists': 5, 'cards': 40},
+    'large': {'workspaces': 3, 'members': 10, 'boards': 5, 'lists': 8, 'cards': 100},
+}
+SEED_PASSWORD = 'seed-password'
+WORDS = [
+    'Thiết kế', 'giao diện', 'API', 'báo cáo', 'kiểm thử', 'sửa lỗi', 'đăng nhập', 'thanh toán',
+    'tối ưu', 'truy vấn', 'tài liệu', 'triển khai', 'họp', 'khách hàng', 'dữ liệu', 'bảo mật',
+]
+STATUS_WEIGHTS = (('TODO', 6), ('DONE', 3), ('CANCELLED', 1))
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def with_ids(objs, queryset, *fields):
+    # Gán id cho các dòng vừa bulk_create khi DB không trả về: 1 truy vấn theo (fields) -> pk
+    if returns_ids() or not objs:
+        return objs
+    ids = {tuple(row[:-1]): row[-1] for row in queryset.values_list(*fields, 'pk')}
+    for obj in objs:
+        obj.pk = ids[tuple(getattr(obj, field) for field in fields)]
+    return objs
+
+
+@transaction.atomic
+def seed_tenant(workspaces=1, members=3, boards=2, lists=4, cards=10, labels=8,
+                archived_ratio=0.1, deleted_ratio=0.05, due_ratio=0.7, seed=0, prefix='seed'):
+    rng = random.Random(seed)
+    now = timezone.now()
+    today = timezone.localdate()
+    run = uuid.uuid4().hex[:8]  # Cho phép seed nhiều lần vào cùng DB (username là duy nhất)
+    password = make_password(SEED_PASSWORD)  # Băm 1 lần cho mọi user
+
+    users = User.objects.bulk_create(
+        User(username=f'{prefix}-{run}-{w}-{m}', email=f'{prefix}-{run}-{w}-{m}@example.com', password=password)
+        for w in range(workspaces) for m in range(max(members, 1))
+    )
+    with_ids(users, User.objects.filter(username__startswith=f'{prefix}-{run}-'), 'username')
+    per_workspace = [users[w * max(members, 1):(w + 1) * max(members, 1)] for w in range(workspaces)]
+
+    spaces = Workspace.objects.bulk_create(
+        Workspace(name=f'Workspace {w + 1}', description=sentence(rng, 6), owner=per_workspace[w][0])
+        for w in range(workspaces)
+    )
+    with_ids(spaces, Workspace.objects.filter(owner__in=[group[0] for group in per_workspace]), 'owner_id')
+    WorkspaceMember.objects.bulk_create(
+        WorkspaceMember(workspace=space, user=user, role='admin' if i == 0 or rng.random() < 0.2 else 'member')
+        for space, group in zip(spaces, per_workspace) for i, user in enumerate(group)
+    )
+    space_labels = {
+        space.pk: Label.objects.bulk_create(Label(workspace=space, name=f'Nhãn {i + 1}') for i in range(labels))
+        for space in spaces
+    }
+    with_ids(
+        [label for group in space_labels.values() for label in group],
+        Label.objects.filter(workspace__in=spaces), 'workspace_id', 'name',
+    )
+    board_rows = Board.objects.bulk_create(
+        Board(workspace=space, owner=group[0], name=f'Board {b + 1}')
+        for space, group in zip(spaces, per_workspace) for b in range(boards)
+    )
+    with_ids(board_rows, Board.objects.filter(workspace__in=spaces), 'workspace_id', 'name')
+    list_rows = List.objects.bulk_create(
+        List(board=board, title=f'List {i + 1}', order=(i + 1) * ORDER_GAP)
+        for board in board_rows for i in range(lists)
+    )
+    with_ids(list_rows, List.objects.filter(board__in=board_rows), 'board_id', 'order')
+
+    statuses = [status for status, weight in STATUS_WEIGHTS for _ in range(weight)]
+    members_of = {space.pk: group for space, group in zip(spaces, per_workspace)}
+    workspace_of = {board.pk: board.workspace_id for board in board_rows}
+    new_cards = []
+    for board_list in list_rows:
+        group = members_of[workspace_of[board_list.board_id]]
+        for i in range(cards):
+            archived = rng.random() < archived_ratio
+            deleted = not archived and rng.random() < deleted_ratio
+            due = today + timedelta(days=rng.randint(-30, 60)) if rng.random() < due_ratio else None
+            new_cards.append(Card(
+                list=board_list, title=sentence(rng, rng.randint(2, 5)),
+                description=sentence(rng, rng.randint(5, 20)) if rng.random() < 0.6 else None,
+                due_date=due, order=(i + 1) * ORDER_GAP, status=rng.choice(statuses), created_by=rng.choice(group),
+                is_archived=archived, archived_at=now - timedelta(days=rng.randint(0, 14)) if archived else None,
+                is_deleted=deleted, deleted_at=now - timedelta(days=rng.randint(0, 30)) if deleted else None,
+            ))
+    card_rows = with_ids(Card.objects.bulk_create(new_cards), Card.objects.filter(list__in=list_rows), 'list_id', 'order')
+    CardLabel.objects.bulk_create(
+        CardLabel(card_id=card.pk, label_id=label.pk)
+        for card in card_rows
+        for label in rng.sample(space_labels[workspace_of[card.list.board_id]], min(rng.randint(0, 3), labels))
+    )
+
+    # bulk_create không phát signal -> tự cập nhật bộ đếm List và index tìm kiếm
+    recount_lists([board_list.pk for board_list in list_rows])
+    index_cards([card.pk for card in card_rows])
+    return {
+        'users': users,
+        'workspaces': spaces,
+        'boards': board_rows,
+        'lists': list_rows,
+        'cards': card_rows,
+        'labels': [label for group in space_labels.values() for label in group],
+    }
@@ -1,12 +1,21 @@
 from rest_framework import serializers
-from .models import Workspace, Board, List, Card, WorkspaceMember
+from .models import Workspace, Board, List, Card, WorkspaceMember, Activity
+from .labels import parse_label_names, set_card_labels, relabel_moved
+from .metrics import serializing
 
-class WorkspaceSerializer(serializers.ModelSerializer):
+class TimedRepresentationMixin:
+    # Thời gian to_representation -> phase "serialize" của Server-Timing (tasks/metrics.py)
+    def to_representation(self, instance):
+        with serializing():
+            return super().to_representation(instance)
+
+class WorkspaceSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     user_role = serializers.SerializerMethodField() # Trả về vai trò của user hiện tại
 
     class Meta:
         model = Workspace
         fields = '__all__'
+        read_only_fields = ['version', 'changed_at']
 
     def get_user_role(self, obj):
         user = self.context['request'].user
@@ -15,13 +24,17 @@ class WorkspaceSerializer(serializers.ModelSerializer):
         if user.is_anonymous:
             return None 
 
+        # Đã được tính sẵn trong queryset (xem permissions.with_user_role) -> không tốn thêm truy vấn
+        if hasattr(obj, 'current_user_role'):
+            return obj.current_user_role
+
         # 2. Nếu là Superuser (Admin hệ thống) -> Trả về 'system_admin' (Quyền to nhất)
         if user.is_superuser:
             return 'system_admin'
 
         # 3. QUAN TRỌNG: Nếu là Người tạo ra Workspace này -> Trả về 'owner'
         # (Dòng này giúp Member thấy nút Xóa ở Workspace do chính mình tạo)
-        if obj.owner == user:
+        if obj.owner_id == user.id:
             return 'owner'
 
         # 4. Kiểm tra trong bảng thành viên bình thường (cho các vai trò được mời)
@@ -31,27 +44,144 @@ class WorkspaceSerializer(serializers.ModelSerializer):
         except WorkspaceMember.DoesNotExist:
             return None
 
-class WorkspaceMemberSerializer(serializers.ModelSerializer):
+class WorkspaceMemberSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     username = serializers.CharField(source='user.username', read_only=True)
     email = serializers.EmailField(source='user.email', read_only=True)
     class Meta:
         model = WorkspaceMember
         fields = ['id', 'workspace', 'user', 'username', 'email', 'role', 'joined_at']
 
-class BoardSerializer(serializers.ModelSerializer):
+class ActivitySerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    actor_username = serializers.CharField(source='actor.username', read_only=True, default=None)
+    class Meta:
+        model = Activity
+        fields = ['id', 'verb', 'workspace_id', 'card_id', 'actor', 'actor_username', 'data', 'created_at']
+
+class BoardSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Board
-        fields = ['id', 'name', 'owner', 'workspace', 'created_at']
+        fields = ['id', 'name', 'owner', 'workspace', 'created_at', 'updated_at']
         extra_kwargs = {'owner': {'required': False}, 'workspace': {'required': False}}
 
-class ListSerializer(serializers.ModelSerializer):
-    cards = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+class ListSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    cards = serializers.SerializerMethodField()  # id thẻ đang hoạt động, theo thứ tự hiển thị
     class Meta:
         model = List
         fields = '__all__'
+        read_only_fields = ['todo_count', 'done_count', 'cancelled_count']
+
+    def get_cards(self, obj):
+        # Danh sách List dùng tasks/rows.py (1 truy vấn cho mọi List); đây là đường 1 List
+        return list(obj.cards.active().order_by('order', 'id').values_list('id', flat=True))
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    # Tra trong context['prefetched'][Model] (dict pk -> object) trước khi hỏi DB.
+    # Batch validate nhiều thẻ chỉ tốn 1 truy vấn cho List thay vì 1 truy vấn mỗi thẻ.
+    def to_internal_value(self, data):
+        cache = self.context.get('prefetched', {}).get(self.get_queryset().model)
+        if cache is not None and not isinstance(data, bool):
+            try:
+                obj = cache.get(int(data))
+            except (TypeError, ValueError):
+                obj = None
+            if obj is not None:
+                return obj
+        return super().to_internal_value(data)
+
+class LabelNamesField(serializers.Field):
+    # Nhận ["A", "B"] hoặc chuỗi cũ "A, B"; trả về danh sách tên (nên prefetch 'labels')
+    def to_internal_value(self, data):
+        if not isinstance(data, (str, list)):
+            raise serializers.ValidationError("Nhãn phải là danh sách hoặc chuỗi phân cách bằng dấu phẩy.")
+        try:
+            return parse_label_names(data)
+        except ValueError as exc:
+            raise serializers.ValidationError(str(exc))
 
-class CardSerializer(serializers.ModelSerializer):
+    def to_representation(self, value):
+        return sorted(label.name for label in value.all())
+
+class CardSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
     is_overdue = serializers.BooleanField(read_only=True)
+    labels = LabelNamesField(required=False)
     class Meta:
         model = Card
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+    def create(self, validated_data):
+        names = validated_data.pop('labels', None)
+        card = super().create(validated_data)
+        if names is not None:
+            set_card_labels({card: names})
+        return card
+
+    def update(self, instance, validated_data):
+        names = validated_data.pop('labels', None)
+        old_list_id = instance.list_id
+        card = super().update(instance, validated_data)
+        if names is not None:
+            set_card_labels({card: names})
+        elif card.list_id != old_list_id:
+            relabel_moved([card])
+        return card
+
+# ===== SNAPSHOT: Board -> Lists -> Cards lồng nhau (dữ liệu đã prefetch sẵn) ===== #
+class SnapshotListSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    cards = CardSerializer(many=True, read_only=True, source='active_cards')
+    class Meta:
+        model = List
+        fields = ['id', 'board', 'title', 'order', 'updated_at', 'cards']
+
+class BoardSnapshotSerializer(BoardSerializer):
+    lists = SnapshotListSerializer(many=True, read_only=True, source='ordered_lists')
+    class Meta(BoardSerializer.Meta):
+        fields = BoardSerializer.Meta.fields + ['lists']
+
+class WorkspaceSnapshotSerializer(WorkspaceSerializer):
+    boards = BoardSnapshotSerializer(many=True, read_only=True, source='snapshot_boards')
+
+# ===== ĐỒNG BỘ DELTA (GET /api/sync/): List không kèm danh sách id thẻ ===== #
+class SyncListSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    class Meta:
+        model = List
+        fields = ['id', 'board', 'title', 'order', 'updated_at']
+
+
+# ===== DI CHUYỂN / SẮP XẾP HÀNG LOẠT (POST /cards/move/, /lists/move/) ===== #
+class CardMoveSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    list = serializers.IntegerField()                # List đích
+    index = serializers.IntegerField(min_value=0)    # Vị trí trong List đích (0 = đầu)
+
+class ListMoveSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    board = serializers.IntegerField(required=False)  # Bỏ trống = giữ nguyên Board
+    index = serializers.IntegerField(min_value=0)
+
+class CardMoveBatchSerializer(serializers.Serializer):
+    moves = CardMoveSerializer(many=True, allow_empty=False, max_length=500)
+
+class ListMoveBatchSerializer(serializers.Serializer):
+    moves = ListMoveSerializer(many=True, allow_empty=False, max_length=500)
+
+
+# ===== THAO TÁC THẺ HÀNG LOẠT (POST /cards/batch/) ===== #
+class CardOperationSerializer(serializers.Serializer):
+    OPS = ['create', 'update', 'archive', 'soft_delete', 'restore']
+    op = serializers.ChoiceField(choices=OPS)
+    id = serializers.IntegerField(required=False)   # Bắt buộc với mọi op trừ 'create'
+    data = serializers.DictField(required=False)    # Dữ liệu thẻ cho 'create' / 'update'
+
+    def validate(self, attrs):
+        if attrs['op'] == 'create':
+            if 'data' not in attrs:
+                raise serializers.ValidationError({'data': "Thiếu dữ liệu thẻ."})
+        elif 'id' not in attrs:
+            raise serializers.ValidationError({'id': "Thiếu id thẻ."})
+        elif attrs['op'] == 'update' and 'data' not in attrs:
+            raise serializers.ValidationError({'data': "Thiếu dữ liệu cập nhật."})
+        return attrs
+
+class CardBatchSerializer(serializers.Serializer):
+    operations = CardOperationSerializer(many=True, allow_empty=False, max_length=500)
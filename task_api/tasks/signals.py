@@ -0,0 +1,46 @@
+from django.db.models.signals import post_save, post_delete
+from django.contrib.auth.models import User
+from django.dispatch import receiver
+from .models import Workspace, WorkspaceMember, Board, List, Card
+from .auth import invalidate_users
+from .changes import touch_workspace, touch_members, touch_boards, touch_lists, touch_cards
+
+# Đường ghi đơn lẻ (save()/delete(), kể cả xóa dây chuyền) -> tăng version của workspace.
+# Đường ghi hàng loạt không phát signal nên tự gọi touch_* (xem tasks/changes.py).
+# post_delete -> op='delete' (tombstone cho /api/sync/).
+
+def operation(signal):
+    return 'delete' if signal is post_delete else 'upsert'
+
+@receiver(post_save, sender=Workspace)
+def workspace_saved(sender, instance, **kwargs):
+    touch_workspace(instance.pk)
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, signal, update_fields=None, created=False, **kwargs):
+    # Đổi mật khẩu / khóa tài khoản / sửa thông tin -> token phải nạp lại user (tasks/auth.py).
+    # Chỉ cập nhật last_login thì bỏ qua
+    fields = None if update_fields is None else set(update_fields)
+    if fields == {'last_login'}:
+        return
+    invalidate_users([instance.pk])
+    if signal is post_save and not created and (fields is None or fields & {'username', 'email'}):
+        # Tên / email hiện trong danh sách thành viên -> tăng version các workspace của user
+        # (ETag, cache đọc, /api/sync/ đều thấy thay đổi)
+        touch_members(list(WorkspaceMember.objects.filter(user=instance)))
+
+@receiver([post_save, post_delete], sender=WorkspaceMember)
+def member_changed(sender, instance, signal, **kwargs):
+    touch_members([instance], operation(signal))
+
+@receiver([post_save, post_delete], sender=Board)
+def board_changed(sender, instance, signal, **kwargs):
+    touch_boards([instance], operation(signal))
+
+@receiver([post_save, post_delete], sender=List)
+def list_changed(sender, instance, signal, **kwargs):
+    touch_lists([instance], operation(signal))
+
+@receiver([post_save, post_delete], sender=Card)
+def card_changed(sender, instance, signal, **kwargs):
+    touch_cards([instance], operation(signal))
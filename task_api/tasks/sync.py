@@ -0,0 +1,68 @@
+from .models import Board, List, Card, WorkspaceMember, ChangeLog
+from .serializers import BoardSerializer, SyncListSerializer, CardSerializer, WorkspaceMemberSerializer
+
+# ===================== ĐỒNG BỘ DELTA (GET /api/sync/) ===================== #
+# Cursor = version của workspace (tasks/changes.py). Client gửi lại cursor lần trước
+# -> chỉ nhận các đối tượng có dòng ChangeLog sau version đó:
+#   - upsert: trạng thái hiện tại (kể cả thẻ đã lưu trữ / trong thùng rác),
+#   - deleted: id đã bị xóa hẳn hoặc đã rời khỏi workspace (tombstone).
+# Không có cursor / cursor quá cũ (log đã bị dọn) -> reset=True kèm toàn bộ dữ liệu.
+# Cursor không phải số hoặc lớn hơn version hiện tại -> 400 (views.SyncView).
+# Xóa Board/List -> client tự bỏ các List/thẻ con của nó.
+
+SECTIONS = {
+    'board': 'boards',
+    'list': 'lists',
+    'card': 'cards',
+    'member': 'members',
+}
+
+
+def workspace_rows(workspace_id):
+    # section -> (queryset trong workspace, serializer)
+    return {
+        'boards': (Board.objects.filter(workspace_id=workspace_id).order_by('id'), BoardSerializer),
+        'lists': (List.objects.filter(board__workspace_id=workspace_id).order_by('board_id', 'order', 'id'), SyncListSerializer),
+        'cards': (Card.objects.filter(list__board__workspace_id=workspace_id).order_by('list_id', 'order', 'id').prefetch_related('labels'), CardSerializer),
+        'members': (WorkspaceMember.objects.filter(workspace_id=workspace_id).select_related('user').order_by('id'), WorkspaceMemberSerializer),
+    }
+
+
+def build_sync(workspace, since, context):
+    log = []
+    if since:
+        log = list(
+            ChangeLog.objects.filter(workspace_id=workspace.pk, version__gt=since)
+            .order_by('version', 'id').values_list('version', 'kind', 'object_id', 'op')
+        )
+    # Version mới hơn được commit sau khi đọc workspace vẫn nằm trong log -> lấy max
+    cursor = max([workspace.version] + [row[0] for row in log])
+    # Log liên tục từ since+1 mới tin được; thiếu (đã bị dọn / cursor lạ) -> tải lại toàn bộ
+    reset = not since or since > cursor or (since < cursor and (not log or log[0][0] != since + 1))
+
+    rows = workspace_rows(workspace.pk)
+    data = {'cursor': cursor, 'reset': reset}
+    deleted = {section: [] for section in rows}
+    if reset:
+        for section, (queryset, serializer) in rows.items():
+            data[section] = serializer(queryset, many=True, context=context).data
+    else:
+        latest = {}
+        for _, kind, object_id, op in log:
+            latest[(kind, object_id)] = op  # Thao tác cuối cùng của mỗi đối tượng quyết định
+        for section, (queryset, serializer) in rows.items():
+            upserts = set()
+            for (kind, object_id), op in latest.items():
+                if SECTIONS.get(kind) != section:
+                    continue
+                if op == 'delete':
+                    deleted[section].append(object_id)
+                else:
+                    upserts.add(object_id)
+            objects = list(queryset.filter(pk__in=upserts)) if upserts else []
+            # Ghi rồi xóa/chuyển đi trong cùng khoảng -> không còn trong workspace = tombstone
+            deleted[section].extend(upserts - {obj.pk for obj in objects})
+            deleted[section].sort()
+            data[section] = serializer(objects, many=True, context=context).data
+    data['deleted'] = deleted
+    return data
@@ -1,3 +1,2179 @@
-from django.test import TestCase
+import asyncio
+import base64
+import contextlib
+import io
+import json
+import os
+import re
+import tempfile
+from datetime import date, timedelta
+from unittest import mock, skipUnless
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count
+from django.core import mail
+from django.core.management import call_command
+from django.core.cache import caches
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from tasks.models import Workspace, WorkspaceMember, Board, List, Card, Label, Notification, Activity, ActivityRollup, ChangeLog
+from tasks.permissions import board_scope, member_workspace_ids, with_user_role, workspace_role
+from tasks.labels import CardLabel, label_filter, resolve_labels, set_card_labels
+from tasks.serializers import CardSerializer, ListSerializer
+from tasks.renderers import FastJSONRenderer, check_orjson
+from tasks.rows import card_values, card_rows, list_rows
+from tasks.seeding import seed_tenant
+from tasks.retention import purge_expired
+from tasks.counters import recount_lists
+from tasks.metrics import Registry, RequestStats, registry as metrics_registry
+from tasks.ordering import MAX_ORDER, ORDER_GAP, apply_moves, next_order
+from tasks.transfer import import_lines
+from tasks.notifications import digest_cards, queue_due_digests, send_pending
+from tasks.activity import record, recording, rollup_activity, write_events
+from tasks.auth import CachedJWTAuthentication, _generation_key
+from tasks.search import InMemorySearchBackend, get_search_backend
+from tasks.realtime import MAX_CHANGES_PER_EVENT, InProcessBroker, board_channel, get_broker, publish_changes
+from tasks.benchmark import ROUTES, build_context, count_queries, spec_key, uncovered_routes
+from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from asgiref.sync import sync_to_async
 
-# Create your tests here.
+
+def sql_server_bulk():
+    # Giống mssql-django (DB local mặc định): bulk_create không trả id, không hỗ trợ ignore_conflicts
+    return mock.patch.multiple(type(connection.features), can_return_rows_from_bulk_insert=False, supports_ignore_conflicts=False)
+
+
+# ===================== INDEX: EXPLAIN CÁC TRUY VẤN NÓNG ===================== #
+@skipUnless(connection.vendor in ('sqlite', 'postgresql'), "Chỉ đọc được EXPLAIN của SQLite/PostgreSQL")
+class HotQueryIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        cls.user = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        cls.workspace = Workspace.objects.create(name='WS', owner=cls.user)
+        WorkspaceMember.objects.create(workspace=cls.workspace, user=cls.user, role='admin')
+        cls.board = Board.objects.create(name='Board', workspace=cls.workspace, owner=cls.user)
+        lists = List.objects.bulk_create(List(board=cls.board, title=f'L{i}', order=i) for i in range(10))
+        cls.list = lists[0]
+        Card.objects.bulk_create(
+            Card(
+                list=lists[i % 10], title=f'Card {i}', order=i, due_date=date(2025, 1, 1) + timedelta(days=i % 60),
+                is_archived=(i % 7 == 0), archived_at=now - timedelta(days=i % 14) if i % 7 == 0 else None,
+                is_deleted=(i % 11 == 0), deleted_at=now if i % 11 == 0 else None,
+            )
+            for i in range(500)
+        )
+        labels = Label.objects.bulk_create(Label(workspace=cls.workspace, name=f'Label {i}') for i in range(5))
+        CardLabel.objects.bulk_create(
+            CardLabel(card_id=card_id, label_id=labels[card_id % 5].pk)
+            for card_id in Card.objects.values_list('pk', flat=True)
+        )
+
+    def hot_queries(self):
+        user, now = self.user, timezone.now()
+        active = Card.objects.filter(is_deleted=False, is_archived=False)
+        return {
+            'active_cards_by_list': active.filter(list=self.list).order_by('order', 'id'),
+            'active_cards_by_due_date': active.filter(due_date=date(2025, 1, 15)),
+            'active_cards_by_label': active.filter(label_filter(['Label 1'])),
+            'overdue_cards': Card.objects.overdue(date(2025, 1, 20)).order_by('due_date', 'id')[:50],
+            'calendar_day_counts': (
+                active.filter(due_date__gte=date(2025, 1, 1), due_date__lte=date(2025, 1, 31))
+                .values('due_date').annotate(total=Count('id')).order_by('due_date')
+            ),
+            'scoped_active_cards': active.filter(board_scope(user, 'list__board__')).order_by('order', 'id')[:51],
+            'expired_archive': Card.objects.filter(is_archived=True, archived_at__lt=now).values_list('pk')[:500],
+            'card_trash': Card.objects.filter(is_deleted=True).order_by('-deleted_at', '-id')[:51],
+            'member_role_check': WorkspaceMember.objects.filter(workspace=self.workspace, user=user, role='admin'),
+            'member_workspaces': member_workspace_ids(user),
+            'owner_workspaces': Workspace.objects.filter(is_deleted=False, owner=user),
+            'lists_by_board': List.objects.filter(board=self.board).order_by('order', 'id'),
+            'due_digest': digest_cards(date(2025, 1, 20), 2),
+        }
+
+    def full_scans(self, plan):
+        if connection.vendor == 'postgresql':
+            return re.findall(r'Seq Scan on (\w+)', plan)
+        # SQLite: "SCAN <bảng>" không kèm "USING ... INDEX" là quét toàn bảng
+        return re.findall(r'\bSCAN (\w+)\s*$', plan, re.MULTILINE)
+
+    def test_hot_queries_use_indexes(self):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # Dữ liệu test nhỏ -> buộc planner chỉ ra index nào dùng được
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        for name, queryset in self.hot_queries().items():
+            with self.subTest(query=name):
+                plan = queryset.explain()
+                self.assertEqual(self.full_scans(plan), [], f"{name} quét toàn bảng:\n{plan}")
+
+
+# ===================== ĐƯỜNG ĐỌC NHANH: GIỐNG TỪNG BYTE VỚI DRF ===================== #
+class FastReadPathTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        cls.workspace = Workspace.objects.create(name='WS', owner=cls.user)
+        cls.board = Board.objects.create(name='Board', workspace=cls.workspace, owner=cls.user)
+        lists = List.objects.bulk_create(List(board=cls.board, title=f'Danh sách {i}', order=i) for i in range(3))
+        cards = Card.objects.bulk_create(
+            Card(
+                list=lists[i % 3], title=f'Thẻ "{i}"\u2028', description=None if i % 2 else 'Mô tả', order=i,
+                status=['TODO', 'DONE', 'CANCELLED'][i % 3], due_date=date(2025, 1, 1) if i % 4 else None,
+                created_by=cls.user, is_archived=(i % 5 == 0), archived_at=timezone.now() if i % 5 == 0 else None,
+            )
+            for i in range(20)
+        )
+        set_card_labels({card: ['B', 'A'] if i % 2 else [] for i, card in enumerate(cards)})
+
+    def test_rows_match_drf_serializers(self):
+        cards = Card.objects.active().with_overdue().order_by('order', 'id')
+        lists = List.objects.order_by('order', 'id')
+        self.assertEqual(
+            JSONRenderer().render(CardSerializer(cards.prefetch_related('labels'), many=True).data),
+            FastJSONRenderer().render(card_rows(list(card_values(cards)))),
+        )
+        self.assertEqual(
+            JSONRenderer().render(ListSerializer(lists, many=True).data),
+            FastJSONRenderer().render(list_rows(lists)),
+        )
+
+    def test_fallback_without_orjson_is_logged_and_identical(self):
+        data = card_rows(list(card_values(Card.objects.with_overdue().order_by('order', 'id'))))
+        with mock.patch('tasks.renderers.orjson', None):
+            with self.assertLogs('tasks.renderers', 'WARNING'):
+                check_orjson()
+            self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        with self.assertNoLogs('tasks.renderers', 'WARNING'):
+            check_orjson()
+
+    def test_list_cards_only_active(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        lists = client.get(f'/api/lists/?board={self.board.pk}').json()
+        active = set(Card.objects.active().values_list('pk', flat=True))
+        self.assertEqual({card_id for item in lists for card_id in item['cards']}, active)
+
+
+# ===================== NGÂN SÁCH TRUY VẤN MỖI ROUTE ===================== #
+class QueryBudgetTests(TestCase):
+    # Gọi mọi route trong tasks.benchmark.ROUTES ở 2 kích thước dữ liệu:
+    #   - số truy vấn phải giống nhau (không tăng theo số dòng -> không có N+1),
+    #   - và không vượt ngân sách khai báo dưới đây (đã gồm SAVEPOINT/RELEASE của harness).
+    # Kích thước LARGE giữ dưới 100 thẻ mỗi Board: Django xóa cascade theo lô 100 dòng trên SQLite,
+    # số lô tăng theo dữ liệu nhưng đó không phải N+1. Ngân sách đo trên SQLite.
+    # Tỉ lệ lưu trữ / xóa cao để kho và thùng rác không bao giờ rỗng (trang rỗng bỏ qua prefetch nhãn)
+    SMALL = {'workspaces': 1, 'members': 2, 'boards': 1, 'lists': 2, 'cards': 4, 'archived_ratio': 0.3, 'deleted_ratio': 0.3}
+    LARGE = {'workspaces': 3, 'members': 6, 'boards': 3, 'lists': 4, 'cards': 8, 'archived_ratio': 0.3, 'deleted_ratio': 0.3}
+    BUDGETS = {
+        'api-root GET': 3, 'token_obtain_pair POST': 4, 'token_refresh POST': 4, 'register POST': 5, 'sync GET': 11,
+        'cache_stats GET': 3, 'metrics GET': 3, 'user-list GET': 4, 'user-detail GET': 4, 'workspace-list GET': 5,
+        'workspace-list POST': 11, 'workspace-trash GET': 5, 'workspace-detail GET': 6, 'workspace-detail PATCH': 12,
+        'workspace-detail DELETE': 12, 'workspace-members GET': 7, 'workspace-snapshot GET': 10,
+        'workspace-stats GET': 9, 'workspace-add-member POST': 16, 'workspace-remove-member POST': 12,
+        'workspace-update-member-role POST': 13, 'workspace-restore POST': 11, 'workspace-export GET': 12, 'workspace-activity GET': 6, 'board-list GET': 5,
+        'board-list POST': 11, 'board-detail GET': 6, 'board-detail PATCH': 10, 'board-detail DELETE': 18,
+        'board-snapshot GET': 9, 'list-list GET': 5, 'list-list POST': 14, 'list-detail GET': 5,
+        'list-detail PATCH': 12, 'list-detail DELETE': 17, 'list-move POST': 16, 'card-list GET': 6,
+        'card-list POST': 20, 'card-detail GET': 5, 'card-detail PATCH': 16, 'card-detail DELETE': 16,
+        'card-archived GET': 5, 'card-trash GET': 5, 'card-calendar GET': 7, 'card-label-counts GET': 5,
+        'card-overdue-dashboard GET': 8, 'card-search GET': 6, 'card-move POST': 22, 'card-batch POST': 22,
+        'card-archive POST': 16, 'card-restore POST': 16, 'card-soft-delete POST': 16, 'card-activity GET': 6,
+    }
+
+    def run_routes(self, size):
+        user, context = build_context(size)
+        client = APIClient()
+        client.force_authenticate(user)
+        return {spec_key(spec): count_queries(client, spec, context) for spec in ROUTES}
+
+    def test_every_route_has_a_budget(self):
+        self.assertEqual(uncovered_routes(), [])
+        self.assertEqual(sorted(self.BUDGETS), sorted(spec_key(spec) for spec in ROUTES))
+
+    def test_query_count_does_not_grow_with_rows(self):
+        small, large = self.run_routes(self.SMALL), self.run_routes(self.LARGE)
+        for key, budget in self.BUDGETS.items():
+            with self.subTest(route=key):
+                (small_status, small_queries), (large_status, large_queries) = small[key], large[key]
+                self.assertLess(max(small_status, large_status), 400)
+                self.assertEqual(small_queries, large_queries, f"{key}: số truy vấn tăng theo dữ liệu")
+                self.assertLessEqual(large_queries, budget, f"{key}: {large_queries} > ngân sách {budget}")
+
+
+# ===================== DỮ LIỆU GIẢ LẬP ===================== #
+class SeedTests(TestCase):
+    def shape(self, data):
+        # Cấu trúc (không phụ thuộc id): thẻ -> (board, list, nhãn), đối chiếu với DB
+        cards = Card.objects.filter(pk__in=[card.pk for card in data['cards']]).select_related('list__board')
+        return sorted(
+            (card.list.board.name, card.list.title, card.order, card.status,
+             sorted(CardLabel.objects.filter(card=card).values_list('label__name', flat=True)))
+            for card in cards
+        )
+
+    def test_seed_without_bulk_insert_ids(self):
+        expected = self.shape(seed_tenant(workspaces=2, members=2, boards=2, lists=2, cards=3, seed=5))
+        with sql_server_bulk():
+            data = seed_tenant(workspaces=2, members=2, boards=2, lists=2, cards=3, seed=5)
+        for kind in ('users', 'workspaces', 'boards', 'lists', 'cards'):
+            self.assertTrue(all(obj.pk for obj in data[kind]), kind)
+        self.assertEqual(self.shape(data), expected)
+        for card in data['cards']:
+            self.assertEqual(Card.objects.get(pk=card.pk).list.board_id, card.list.board_id)
+        for space in data['workspaces']:
+            self.assertEqual(space.members.count(), 2)
+
+
+# ===================== XUẤT / NHẬP WORKSPACE ===================== #
+class WorkspaceTransferTests(TestCase):
+    def setUp(self):
+        data = seed_tenant(workspaces=1, members=3, boards=2, lists=3, cards=7)
+        self.workspace = data['workspaces'][0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.workspace.owner)
+
+    def export(self, workspace, fmt='ndjson'):
+        response = self.client.get(f'/api/workspaces/{workspace.pk}/export/?format={fmt}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def assertSameContent(self, copy, exported):
+        # Cùng nội dung, chỉ khác id (đã ánh xạ lại); nhãn thẻ so theo tên
+        def strip(body):
+            records = [json.loads(line) for line in body.splitlines()]
+            names = {record['id']: record['name'] for record in records if record['type'] == 'label'}
+            for record in records:
+                if record['type'] == 'card':
+                    record['labels'] = sorted(names[label_id] for label_id in record['labels'])
+            return [
+                {key: value for key, value in record.items() if key not in ('id', 'board', 'list', 'created_at')}
+                for record in records
+            ]
+        self.assertEqual(strip(self.export(copy)), strip(exported))
+
+    def test_export_then_import_round_trip(self):
+        exported = self.export(self.workspace)
+        importer = import_lines(exported.splitlines(), self.workspace.owner, chunk_size=5)
+        self.assertEqual(importer.counts['card'], 42)
+        copy = importer.workspace
+        self.assertNotEqual(copy.pk, self.workspace.pk)
+        self.assertSameContent(copy, exported)
+        self.assertEqual(
+            sorted(List.objects.filter(board__workspace=copy).values_list('title', 'todo_count', 'done_count')),
+            sorted(List.objects.filter(board__workspace=self.workspace).values_list('title', 'todo_count', 'done_count')),
+        )
+
+    def test_import_without_bulk_insert_ids(self):
+        # SQL Server: bulk_create không trả id, không có ignore_conflicts -> chèn từng dòng, ánh xạ id vẫn đúng
+        exported = self.export(self.workspace)
+        lines = exported.splitlines()
+        member = next(line for line in lines if json.loads(line)['type'] == 'member')
+        lines.insert(lines.index(member), member)  # Thành viên trùng trong file
+        with sql_server_bulk(), self.captureOnCommitCallbacks(execute=True):
+            importer = import_lines(lines, self.workspace.owner, chunk_size=5)
+        copy = importer.workspace
+        self.assertEqual(importer.counts['card'], 42)
+        self.assertEqual(WorkspaceMember.objects.filter(workspace=copy).count(), 3)
+        self.assertSameContent(copy, exported)
+        self.assertFalse(Card.objects.filter(list__board__workspace=copy, list__isnull=True).exists())
+        self.assertEqual(
+            sorted(List.objects.filter(board__workspace=copy).values_list('title', 'todo_count', 'done_count')),
+            sorted(List.objects.filter(board__workspace=self.workspace).values_list('title', 'todo_count', 'done_count')),
+        )
+
+    def test_csv_has_one_row_per_card(self):
+        rows = self.export(self.workspace, 'csv').decode('utf-8-sig').splitlines()
+        self.assertEqual(rows[0].split(',')[:3], ['board_id', 'board', 'list_id'])
+        self.assertEqual(len(rows), 1 + 42)
+
+    def test_failed_import_removes_partial_workspace(self):
+        lines = self.export(self.workspace).splitlines()
+        before = Workspace.objects.count()
+        with self.assertRaises(ValueError):
+            import_lines(lines[:-1] + [b'{"type": "card", "list": 999999, "title": "x"}'], self.workspace.owner)
+        self.assertEqual(Workspace.objects.count(), before)
+
+
+# ===================== THÔNG BÁO EMAIL (OUTBOX) ===================== #
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        self.other = User.objects.create_user('other', 'other@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='WS', owner=self.owner)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.owner, role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_add_member_queues_mail_instead_of_sending(self):
+        response = self.client.post(f'/api/workspaces/{self.workspace.pk}/add_member/', {'email': 'other@example.com'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Notification.objects.get().user, self.other)
+        self.assertEqual(send_pending(), {'sent': 1, 'failed': 0})
+        self.assertEqual(mail.outbox[0].to, ['other@example.com'])
+        self.assertIsNotNone(Notification.objects.get().sent_at)
+        self.assertEqual(send_pending(), {'sent': 0, 'failed': 0})
+
+    def test_batches_reuse_one_connection(self):
+        for i in range(5):
+            Notification.objects.create(user=self.other, kind='member_added', subject=f'S{i}', body='B')
+        with mock.patch('tasks.notifications.get_connection', wraps=mail.get_connection) as get_connection:
+            self.assertEqual(send_pending(batch_size=2), {'sent': 5, 'failed': 0})
+        self.assertEqual(get_connection.call_count, 3)  # 3 lô: 2 + 2 + 1
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_failed_send_is_retried_later(self):
+        Notification.objects.create(user=self.other, kind='member_added', subject='S', body='B')
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            self.assertEqual(send_pending(), {'sent': 0, 'failed': 1})
+        notification = Notification.objects.get()
+        self.assertEqual((notification.attempts, notification.last_error), (1, 'down'))
+        self.assertEqual(send_pending(), {'sent': 1, 'failed': 0})
+
+    def test_smtp_runs_outside_transaction(self):
+        notification = Notification.objects.create(user=self.other, kind='member_added', subject='S', body='B')
+        depth = len(connection.atomic_blocks)  # Các khối của TestCase
+        seen = []
+
+        def send_messages(backend, messages):
+            claimed = Notification.objects.get(pk=notification.pk)
+            seen.append((len(connection.atomic_blocks), claimed.attempts, claimed.claimed_until is not None))
+            return len(messages)
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', autospec=True, side_effect=send_messages):
+            self.assertEqual(send_pending(), {'sent': 1, 'failed': 0})
+        # Lúc gửi: không còn transaction nào của send_pending, lô đã được đánh dấu nhận
+        self.assertEqual(seen, [(depth, 1, True)])
+        notification.refresh_from_db()
+        self.assertIsNotNone(notification.sent_at)
+        self.assertIsNone(notification.claimed_until)
+
+    def test_claimed_rows_wait_for_lease_to_expire(self):
+        notification = Notification.objects.create(
+            user=self.other, kind='member_added', subject='S', body='B',
+            attempts=1, claimed_until=timezone.now() + timedelta(minutes=5),
+        )  # Worker khác đang gửi (hoặc đã chết giữa lô)
+        self.assertEqual(send_pending(), {'sent': 0, 'failed': 0})
+        self.assertEqual(mail.outbox, [])
+        Notification.objects.filter(pk=notification.pk).update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(send_pending(), {'sent': 1, 'failed': 0})
+        notification.refresh_from_db()
+        self.assertEqual((notification.attempts, notification.claimed_until), (2, None))
+
+    def test_failed_rows_are_released_and_give_up_after_max_attempts(self):
+        notification = Notification.objects.create(user=self.other, kind='member_added', subject='S', body='B')
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            for _ in range(3):
+                send_pending(max_attempts=2)
+        notification.refresh_from_db()
+        self.assertEqual((notification.attempts, notification.claimed_until, notification.sent_at), (2, None, None))
+
+    def test_digest_dedupe_without_ignore_conflicts(self):
+        today = date(2025, 1, 20)
+        board = Board.objects.create(name='B', workspace=self.workspace, owner=self.owner)
+        board_list = List.objects.create(board=board, title='L')
+        for creator in (self.owner, self.other):
+            Card.objects.create(list=board_list, title='Late', due_date=today - timedelta(days=1), created_by=creator)
+        Notification.objects.create(user=self.owner, kind='due_digest', subject='Sent', body='B', dedupe_key='due_digest:2025-01-20')
+        real_filter = Notification.objects.filter
+        # Lần lọc trước không thấy dòng của owner (worker khác chèn xen giữa) -> unique chặn, chèn lại từng dòng
+        racing = mock.patch.object(Notification.objects, 'filter', side_effect=[real_filter(pk__in=[])])
+        with sql_server_bulk(), racing:
+            self.assertEqual(queue_due_digests(today=today, days=2), 2)
+        with sql_server_bulk():
+            self.assertEqual(queue_due_digests(today=today, days=2), 2)
+        self.assertEqual(
+            sorted(Notification.objects.filter(kind='due_digest').values_list('user__username', 'subject')),
+            [('other', '1 thẻ cần chú ý (1 quá hạn)'), ('owner', 'Sent')],
+        )
+
+    def test_daily_digest_once_per_user_per_day(self):
+        today = date(2025, 1, 20)
+        board = Board.objects.create(name='B', workspace=self.workspace, owner=self.owner)
+        board_list = List.objects.create(board=board, title='L')
+        for due, status_, creator in (
+            (today - timedelta(days=3), 'TODO', self.owner),   # quá hạn
+            (today + timedelta(days=1), 'TODO', self.owner),   # sắp đến hạn
+            (today + timedelta(days=10), 'TODO', self.owner),  # còn xa
+            (today - timedelta(days=1), 'DONE', self.other),   # đã xong
+        ):
+            Card.objects.create(list=board_list, title=f'{status_} {due}', due_date=due, status=status_, created_by=creator)
+        self.assertEqual(queue_due_digests(today=today, days=2), 1)
+        queue_due_digests(today=today, days=2)
+        digest = Notification.objects.get()
+        self.assertEqual((digest.user, digest.kind), (self.owner, 'due_digest'))
+        self.assertIn('Quá hạn (1)', digest.body)
+        self.assertIn('Sắp đến hạn (1)', digest.body)
+        send_pending()
+        self.assertEqual(len(mail.outbox), 1)
+
+
+# ===================== NHẬT KÝ HOẠT ĐỘNG ===================== #
+class ActivityTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        self.member = User.objects.create_user('member', 'member@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='WS', owner=self.owner)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.owner, role='admin')
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.member, role='member')
+        board = Board.objects.create(name='B', workspace=self.workspace, owner=self.owner)
+        self.todo = List.objects.create(board=board, title='Todo', order=1)
+        self.done = List.objects.create(board=board, title='Done', order=2)
+        self.cards = [Card.objects.create(list=self.todo, title=f'C{i}', order=i + 1) for i in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_events_are_written_once_in_request_transaction(self):
+        first, second, third = self.cards
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/cards/batch/', {'operations': [
+                {'op': 'update', 'id': first.pk, 'data': {'list': self.done.pk}},
+                {'op': 'archive', 'id': second.pk},
+                {'op': 'soft_delete', 'id': third.pk},
+            ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        # Ghi cùng transaction (1 INSERT), không còn việc ghi nào chờ commit
+        inserts = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('INSERT INTO "tasks_activity"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertFalse([callback for callback in callbacks if getattr(callback, 'func', None) is write_events])
+        self.assertEqual(
+            list(Activity.objects.order_by('id').values_list('verb', 'card_id', 'workspace_id', 'actor_id')),
+            [
+                ('card_archived', second.pk, self.workspace.pk, self.owner.pk),
+                ('card_deleted', third.pk, self.workspace.pk, self.owner.pk),
+                ('card_moved', first.pk, self.workspace.pk, self.owner.pk),
+            ],
+        )
+        self.assertEqual(Activity.objects.get(verb='card_moved').data, {'from_list': self.todo.pk, 'to_list': self.done.pk})
+
+    def test_rollback_discards_buffered_events(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                with recording():
+                    record('card_archived', self.owner, card=self.cards[0])
+                transaction.set_rollback(True)
+        self.assertFalse(Activity.objects.exists())
+
+    def test_feeds_are_paginated_newest_first(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/cards/{self.cards[0].pk}/archive/')
+            self.client.post(f'/api/cards/{self.cards[0].pk}/restore/')
+            self.client.post(f'/api/workspaces/{self.workspace.pk}/update_member_role/',
+                             {'user_id': self.member.pk, 'role': 'admin'}, format='json')
+        response = self.client.get(f'/api/workspaces/{self.workspace.pk}/activity/?page_size=2')
+        self.assertEqual([item['verb'] for item in response.data['results']], ['member_role_changed', 'card_restored'])
+        self.assertEqual(response.data['results'][0]['data'], {'user_id': self.member.pk, 'old_role': 'member', 'new_role': 'admin'})
+        self.assertEqual(response.data['results'][0]['actor_username'], 'owner')
+        response = self.client.get(response.data['next'])
+        self.assertEqual([item['verb'] for item in response.data['results']], ['card_archived'])
+        response = self.client.get(f'/api/cards/{self.cards[0].pk}/activity/')
+        self.assertEqual([item['verb'] for item in response.data['results']], ['card_restored', 'card_archived'])
+        outsider = User.objects.create_user('outsider', 'outsider@example.com', 'pass')
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.client.get(f'/api/workspaces/{self.workspace.pk}/activity/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/cards/{self.cards[0].pk}/activity/').status_code, 404)
+
+    def test_old_activity_is_rolled_up_then_deleted(self):
+        now = timezone.now()
+        old = now - timedelta(days=100)
+        Activity.objects.bulk_create(
+            [Activity(verb='card_moved', workspace_id=self.workspace.pk, created_at=old) for _ in range(3)]
+            + [Activity(verb='card_archived', workspace_id=self.workspace.pk, created_at=old),
+               Activity(verb='card_moved', workspace_id=self.workspace.pk, created_at=now)]
+        )
+        self.assertEqual(rollup_activity(now=now, days=90, batch_size=2), 4)
+        self.assertEqual(Activity.objects.count(), 1)
+        day = timezone.localtime(old).date()
+        self.assertEqual(
+            sorted(ActivityRollup.objects.values_list('workspace_id', 'day', 'verb', 'count')),
+            [(self.workspace.pk, day, 'card_archived', 1), (self.workspace.pk, day, 'card_moved', 3)],
+        )
+
+
+# ===================== XÁC THỰC JWT CÓ CACHE ===================== #
+# Cache dùng chung giữa các tiến trình (file) như production cần; locmem -> cache tự tắt
+AUTH_TEST_CACHES = {
+    'default': {'BACKEND': 'tasks.cache.CountingLocMemCache', 'LOCATION': 'task-api-tests'},
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'task-api-auth-cache-tests'),
+    },
+}
+
+
+@override_settings(CACHES=AUTH_TEST_CACHES, AUTH_CACHE_ALIAS='auth')
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        caches['auth'].clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        self.member = User.objects.create_user('member', 'member@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='WS', owner=self.owner)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.owner, role='admin')
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.member, role='member')
+        self.token = str(AccessToken.for_user(self.member))
+
+    def authenticate(self, token=None):
+        request = RequestFactory().get('/api/workspaces/', HTTP_AUTHORIZATION=f'Bearer {token or self.token}')
+        return CachedJWTAuthentication().authenticate(request)[0]
+
+    def test_warm_token_costs_no_queries(self):
+        with self.assertNumQueries(2):  # user + vai trò
+            user = self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+            self.assertEqual(user, self.member)
+            workspace = Workspace(pk=self.workspace.pk, owner_id=self.owner.pk)
+            self.assertEqual(workspace_role(user, workspace), 'member')
+
+    def test_password_change_and_deactivation_invalidate(self):
+        self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member.set_password('new-pass')
+            self.member.save()
+        with self.assertNumQueries(2):
+            self.authenticate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member.is_active = False
+            self.member.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_evicted_generation_cannot_revive_stale_entry(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member.save()  # Đã có thế hệ trước đó
+        self.authenticate()
+        caches['auth'].delete(_generation_key(self.member.pk))  # Bị đẩy ra khỏi cache (LRU)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member.is_active = False
+            self.member.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_evicted_generation_without_change_reloads(self):
+        self.authenticate()
+        caches['auth'].delete(_generation_key(self.member.pk))
+        with self.assertNumQueries(2):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            self.authenticate()
+
+    @override_settings(AUTH_CACHE_ALIAS='default')
+    def test_process_local_cache_is_not_used(self):
+        for _ in range(2):
+            with self.assertNumQueries(1):  # Như JWTAuthentication gốc
+                user = self.authenticate()
+        self.assertFalse(hasattr(user, 'workspace_roles'))
+
+    def test_membership_changes_refresh_cached_roles(self):
+        workspace = Workspace(pk=self.workspace.pk, owner_id=self.owner.pk)
+        self.assertEqual(workspace_role(self.authenticate(), workspace), 'member')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.owner)}')
+        url = f'/api/workspaces/{self.workspace.pk}/'
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(url + 'update_member_role/', {'user_id': self.member.pk, 'role': 'admin'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(workspace_role(self.authenticate(), workspace), 'admin')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(url + 'remove_member/', {'user_id': self.member.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(workspace_role(self.authenticate(), workspace))
+        with self.captureOnCommitCallbacks(execute=True):
+            # Request thất bại (rollback) không làm mất cache
+            response = client.post(url + 'remove_member/', {'user_id': self.owner.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+        with self.assertNumQueries(0):
+            self.authenticate()
+
+
+@override_settings(
+    CACHES={**AUTH_TEST_CACHES, 'auth': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'tasks_auth_cache'}},
+    AUTH_CACHE_ALIAS='auth',
+)
+class DatabaseAuthCacheTests(TestCase):
+    # Cấu hình AUTH_CACHE=db (Render): bảng tasks_auth_cache do migration tạo
+    def test_warm_request_reads_no_user_rows(self):
+        caches['auth'].clear()
+        owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        workspace = Workspace.objects.create(name='WS', owner=owner)
+        WorkspaceMember.objects.create(workspace=workspace, user=owner, role='admin')
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(owner)}')
+        url = f'/api/workspaces/{workspace.pk}/'
+        self.assertEqual(client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(client.get(url).status_code, 200)
+        sql = [query['sql'] for query in queries.captured_queries]
+        self.assertEqual([q for q in sql if '"auth_user"' in q], [])
+        self.assertEqual(len([q for q in sql if 'tasks_auth_cache' in q]), 1)
+
+
+# ===================== ĐỌC CÓ ĐIỀU KIỆN (ETAG) & CACHE ĐỌC ===================== #
+class ConditionalReadTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='WS', owner=self.owner)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.owner, role='admin')
+        self.board = Board.objects.create(name='Board', workspace=self.workspace, owner=self.owner)
+        self.list = List.objects.create(board=self.board, title='Todo', order=0)
+        self.card = Card.objects.create(list=self.list, title='Due today', order=0, due_date=timezone.localdate())
+        self.other_card = Card.objects.create(list=self.list, title='Other', order=1)
+        self.member = User.objects.create_user('member', 'member@example.com', 'pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.cards_url = f'/api/cards/?workspace={self.workspace.pk}'
+        self.members_url = f'/api/workspaces/{self.workspace.pk}/members/'
+
+    def revalidate(self, url, etag):
+        # Sau 1 thao tác ghi: ETag cũ không còn khớp và nội dung không lấy từ cache cũ
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200, url)
+        self.assertNotEqual(response['ETag'], etag)
+        return response
+
+    def card_titles(self, response):
+        return sorted(card['title'] for card in response.json()['results'])
+
+    def test_next_day_revalidation_returns_fresh_overdue_flag(self):
+        response = self.client.get(self.cards_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['results'][0]['is_overdue'])
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.cards_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        tomorrow = timezone.now() + timedelta(days=1)
+        with mock.patch('django.utils.timezone.now', return_value=tomorrow):
+            response = self.client.get(self.cards_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertTrue(response.json()['results'][0]['is_overdue'])
+
+    def test_cached_page_links_follow_request_host(self):
+        for host in ('a.example.com', 'b.example.com'):
+            response = self.client.get(self.cards_url + '&page_size=1', HTTP_HOST=host)
+            self.assertTrue(response.json()['next'].startswith(f'http://{host}/'), response.json()['next'])
+
+    def test_card_write_paths_invalidate(self):
+        response = self.client.get(self.cards_url)
+        card_url = f'/api/cards/{self.other_card.pk}/'
+        steps = [
+            (lambda: self.client.post(card_url + 'archive/'), ['Due today']),
+            (lambda: self.client.post(card_url + 'restore/'), ['Due today', 'Other']),
+            (lambda: self.client.post(card_url + 'soft_delete/'), ['Due today']),
+            (lambda: self.client.post(card_url + 'restore/'), ['Due today', 'Other']),
+            (lambda: self.client.post('/api/cards/batch/', {'operations': [
+                {'op': 'update', 'id': self.other_card.pk, 'data': {'title': 'Batched'}},
+            ]}, format='json'), ['Batched', 'Due today']),
+            (lambda: self.client.post('/api/cards/move/', {'moves': [
+                {'id': self.other_card.pk, 'list': self.list.pk, 'index': 0},
+            ]}, format='json'), ['Batched', 'Due today']),
+        ]
+        for write, titles in steps:
+            self.assertLess(write().status_code, 400)
+            response = self.revalidate(self.cards_url, response['ETag'])
+            self.assertEqual(self.card_titles(response), titles)
+        orders = {card['id']: card['order'] for card in response.json()['results']}
+        self.assertLess(orders[self.other_card.pk], orders[self.card.pk])  # Đã chuyển lên đầu List
+
+    def test_member_and_user_changes_invalidate_members(self):
+        response = self.client.get(self.members_url)
+        url = f'/api/workspaces/{self.workspace.pk}/'
+        usernames = lambda response: sorted(member['username'] for member in response.json())
+        self.client.post(url + 'add_member/', {'email': 'member@example.com'}, format='json')
+        response = self.revalidate(self.members_url, response['ETag'])
+        self.assertEqual(usernames(response), ['member', 'owner'])
+        self.member.username = 'renamed'
+        self.member.save()
+        response = self.revalidate(self.members_url, response['ETag'])
+        self.assertEqual(usernames(response), ['owner', 'renamed'])
+        self.member.set_password('other-pass')
+        self.member.save(update_fields=['password'])  # Không hiển thị -> không đổi version
+        self.assertEqual(self.client.get(self.members_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.client.post(url + 'remove_member/', {'user_id': self.member.pk}, format='json')
+        response = self.revalidate(self.members_url, response['ETag'])
+        self.assertEqual(usernames(response), ['owner'])
+
+
+# ===================== ĐỒNG BỘ DELTA (/api/sync/) ===================== #
+class SyncTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='A', owner=self.owner)
+        self.other_workspace = Workspace.objects.create(name='B', owner=self.owner)
+        board = Board.objects.create(name='Board A', workspace=self.workspace, owner=self.owner)
+        self.list = List.objects.create(board=board, title='Todo', order=0)
+        other_board = Board.objects.create(name='Board B', workspace=self.other_workspace, owner=self.owner)
+        self.other_list = List.objects.create(board=other_board, title='Todo', order=0)
+        self.card = Card.objects.create(list=self.list, title='Card', order=0)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def sync(self, since=None, workspace=None, status=200):
+        params = {'workspace': (workspace or self.workspace).pk}
+        if since is not None:
+            params['since'] = since
+        response = self.client.get('/api/sync/', params)
+        self.assertEqual(response.status_code, status, response.content)
+        return response.json()
+
+    def test_full_sync_then_delta_after_update(self):
+        full = self.sync()
+        self.assertTrue(full['reset'])
+        self.assertEqual([card['id'] for card in full['cards']], [self.card.pk])
+        self.client.patch(f'/api/cards/{self.card.pk}/', {'title': 'Renamed'}, format='json')
+        delta = self.sync(full['cursor'])
+        self.assertFalse(delta['reset'])
+        self.assertGreater(delta['cursor'], full['cursor'])
+        self.assertEqual([(card['id'], card['title']) for card in delta['cards']], [(self.card.pk, 'Renamed')])
+        self.assertEqual(delta['boards'], [])
+        self.assertEqual(delta['lists'], [])
+        self.assertEqual(delta['deleted']['cards'], [])
+        # Không đổi gì -> delta rỗng, cursor giữ nguyên
+        empty = self.sync(delta['cursor'])
+        self.assertEqual((empty['cursor'], empty['cards'], empty['reset']), (delta['cursor'], [], False))
+
+    def test_purged_card_becomes_tombstone(self):
+        self.client.post(f'/api/cards/{self.card.pk}/archive/')
+        cursor = self.sync()['cursor']
+        Card.objects.filter(pk=self.card.pk).update(archived_at=timezone.now() - timedelta(days=30))
+        purge_expired()
+        delta = self.sync(cursor)
+        self.assertFalse(delta['reset'])
+        self.assertEqual(delta['cards'], [])
+        self.assertEqual(delta['deleted']['cards'], [self.card.pk])
+
+    def test_card_moved_to_other_workspace_is_deleted_from_old(self):
+        cursor = self.sync()['cursor']
+        other_cursor = self.sync(workspace=self.other_workspace)['cursor']
+        response = self.client.patch(f'/api/cards/{self.card.pk}/', {'list': self.other_list.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        old = self.sync(cursor)
+        self.assertEqual((old['cards'], old['deleted']['cards']), ([], [self.card.pk]))
+        new = self.sync(other_cursor, workspace=self.other_workspace)
+        self.assertEqual([card['id'] for card in new['cards']], [self.card.pk])
+        self.assertEqual(new['deleted']['cards'], [])
+
+    def test_gap_in_log_forces_reset(self):
+        cursor = self.sync()['cursor']
+        self.client.patch(f'/api/cards/{self.card.pk}/', {'title': 'One'}, format='json')
+        self.client.patch(f'/api/cards/{self.card.pk}/', {'title': 'Two'}, format='json')
+        ChangeLog.objects.filter(workspace_id=self.workspace.pk, version=cursor + 1).delete()  # Đã bị dọn
+        delta = self.sync(cursor)
+        self.assertTrue(delta['reset'])
+        self.assertEqual([(card['id'], card['title']) for card in delta['cards']], [(self.card.pk, 'Two')])
+
+    def test_future_or_malformed_cursor_is_rejected(self):
+        cursor = self.sync()['cursor']
+        self.assertIn('since', self.sync(cursor + 5, status=400))
+        self.assertIn('since', self.sync('abc', status=400))
+        self.assertIn('since', self.sync(-1, status=400))
+
+
+# ===================== SỰ KIỆN THỜI GIAN THỰC (SSE) ===================== #
+def parse_sse(message):
+    fields = dict(line.split(': ', 1) for line in message.strip().splitlines() if not line.startswith('retry:'))
+    return fields['event'], json.loads(fields['data'])
+
+
+class RealtimeBrokerTests(TestCase):
+    async def test_publish_and_unsubscribe(self):
+        broker = InProcessBroker(queue_size=5)
+        async with broker.subscribe(['board:1', 'members:1']) as subscription:
+            self.assertEqual((broker.subscriber_count('board:1'), broker.subscriber_count()), (1, 1))
+            broker.publish('board:2', 'other')
+            broker.publish('board:1', 'first')
+            broker.publish('members:1', 'second')
+            self.assertEqual([await subscription.get(1), await subscription.get(1)], ['first', 'second'])
+            self.assertIsNone(await subscription.get(0.01))
+        self.assertEqual(broker.subscriber_count(), 0)
+        broker.publish('board:1', 'late')  # Không còn ai nghe -> bỏ qua
+
+    async def test_overflow_sends_resync_once(self):
+        broker = InProcessBroker(queue_size=2)
+        async with broker.subscribe(['board:1']) as subscription:
+            for i in range(3):
+                broker.publish('board:1', f'm{i}')
+            await asyncio.sleep(0)  # Cho event loop chạy deliver_all
+            self.assertEqual(parse_sse(await subscription.get(1)), ('resync', {}))
+            self.assertIsNone(await subscription.get(0.01))  # Hàng đợi đã xả
+            broker.publish('board:1', 'next')
+            self.assertEqual(await subscription.get(1), 'next')
+
+    async def test_publish_changes_routes_by_channel(self):
+        broker = InProcessBroker()
+        with mock.patch('tasks.realtime.get_broker', return_value=broker):
+            async with broker.subscribe(['workspace:1']) as workspace, broker.subscribe(['board:10']) as board, \
+                    broker.subscribe(['board:11', 'members:1']) as other_board:
+                publish_changes({1: (7, [('card', 5, 'upsert', 10), ('list', 6, 'delete', 11), ('member', 3, 'upsert', None)])})
+                event, data = parse_sse(await workspace.get(1))
+                self.assertEqual((event, data['version'], len(data['changes'])), ('changes', 7, 3))
+                self.assertEqual(parse_sse(await board.get(1))[1]['changes'], [{'kind': 'card', 'id': 5, 'op': 'upsert', 'board': 10}])
+                self.assertIsNone(await board.get(0.01))
+                received = [parse_sse(await other_board.get(1))[1]['changes'] for _ in range(2)]
+                self.assertCountEqual(received, [
+                    [{'kind': 'list', 'id': 6, 'op': 'delete', 'board': 11}],
+                    [{'kind': 'member', 'id': 3, 'op': 'upsert', 'board': None}],
+                ])
+                publish_changes({1: (8, [('card', i, 'upsert', 10) for i in range(MAX_CHANGES_PER_EVENT + 1)])})
+                self.assertEqual(parse_sse(await board.get(1))[1], {'workspace': 1, 'version': 8, 'truncated': True})
+
+
+class EventStreamTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        self.member = User.objects.create_user('member', 'member@example.com', 'pass')
+        self.outsider = User.objects.create_user('outsider', 'outsider@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='A', owner=self.owner)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.member, role='member')
+        self.board = Board.objects.create(name='Board', workspace=self.workspace, owner=self.owner)
+        self.list = List.objects.create(board=self.board, title='Todo', order=0)
+        self.client = AsyncClient()
+
+    def stream(self, user=None, **params):
+        if user is not None:
+            params['token'] = str(AccessToken.for_user(user))
+        return self.client.get('/api/events/', {'board': self.board.pk, **params})
+
+    def create_card(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/cards/', {'title': 'Card', 'list': self.list.pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    async def test_requires_token_and_membership(self):
+        self.assertEqual((await self.stream()).status_code, 401)
+        self.assertEqual((await self.stream(token='garbage')).status_code, 401)
+        self.assertEqual((await self.stream(self.outsider)).status_code, 403)
+        self.assertEqual((await self.stream(self.outsider, board='', workspace=self.workspace.pk)).status_code, 403)
+
+    @override_settings(REALTIME_STREAM_TIMEOUT=1)
+    async def test_member_receives_ready_then_changes(self):
+        response = await self.stream(self.member)
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'text/event-stream'))
+        chunks = response.streaming_content
+        event, ready = parse_sse((await anext(chunks)).decode())
+        self.assertEqual((event, ready['board'], ready['workspace']), ('ready', self.board.pk, self.workspace.pk))
+        card_id = await sync_to_async(self.create_card)()
+        event, data = parse_sse((await asyncio.wait_for(anext(chunks), 5)).decode())
+        self.assertEqual(event, 'changes')
+        self.assertGreater(data['version'], ready['version'])
+        self.assertIn({'kind': 'card', 'id': card_id, 'op': 'upsert', 'board': self.board.pk}, data['changes'])
+        async for chunk in chunks:  # Hết REALTIME_STREAM_TIMEOUT -> stream đóng, hủy đăng ký
+            self.assertEqual(chunk, b': ping\n\n')
+        self.assertEqual(get_broker().subscriber_count(board_channel(self.board.pk)), 0)
+
+
+# ===================== SNAPSHOT & VAI TRÒ TRONG WORKSPACE ===================== #
+class SnapshotTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        self.member = User.objects.create_user('member', 'member@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='A', owner=self.owner)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.member, role='member')
+        self.board = Board.objects.create(name='Board', workspace=self.workspace, owner=self.owner)
+        self.empty_board = Board.objects.create(name='Empty', workspace=self.workspace, owner=self.owner)
+        self.done = List.objects.create(board=self.board, title='Done', order=2)
+        self.todo = List.objects.create(board=self.board, title='Todo', order=1)
+        self.second = Card.objects.create(list=self.todo, title='Second', order=2)
+        self.first = Card.objects.create(list=self.todo, title='First', order=1)
+        Card.objects.create(list=self.todo, title='Archived', order=3, is_archived=True, archived_at=timezone.now())
+        Card.objects.create(list=self.todo, title='Deleted', order=4, is_deleted=True, deleted_at=timezone.now())
+        self.finished = Card.objects.create(list=self.done, title='Finished', order=1, status='DONE')
+        set_card_labels({self.first: ['Bug']})
+        # Dữ liệu của workspace khác và Board cá nhân không được lẫn vào
+        other = Workspace.objects.create(name='B', owner=self.member)
+        other_list = List.objects.create(board=Board.objects.create(name='Other', workspace=other, owner=self.member), title='X', order=0)
+        Card.objects.create(list=other_list, title='Other', order=0)
+        Board.objects.create(name='Personal', owner=self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.member)
+
+    def tree(self, board):
+        return (board['id'], [
+            (item['id'], item['title'], [(card['id'], card['title'], card['labels']) for card in item['cards']])
+            for item in board['lists']
+        ])
+
+    def expected_board(self):
+        return (self.board.pk, [
+            (self.todo.pk, 'Todo', [(self.first.pk, 'First', ['Bug']), (self.second.pk, 'Second', [])]),
+            (self.done.pk, 'Done', [(self.finished.pk, 'Finished', [])]),
+        ])
+
+    def test_workspace_snapshot_has_exactly_the_visible_tree(self):
+        response = self.client.get(f'/api/workspaces/{self.workspace.pk}/snapshot/')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['id'], data['user_role']), (self.workspace.pk, 'member'))
+        self.assertEqual([self.tree(board) for board in data['boards']], [self.expected_board(), (self.empty_board.pk, [])])
+        card = data['boards'][0]['lists'][0]['cards'][0]
+        self.assertEqual(card, CardSerializer(Card.objects.with_overdue().get(pk=self.first.pk)).data)
+
+    def test_board_snapshot(self):
+        response = self.client.get(f'/api/boards/{self.board.pk}/snapshot/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.tree(response.json()), self.expected_board())
+
+    def test_outsider_gets_no_snapshot(self):
+        self.client.force_authenticate(User.objects.create_user('outsider', 'outsider@example.com', 'pass'))
+        self.assertEqual(self.client.get(f'/api/workspaces/{self.workspace.pk}/snapshot/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/boards/{self.board.pk}/snapshot/').status_code, 404)
+
+
+class UserRoleAnnotationTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        self.admin = User.objects.create_user('admin', 'admin@example.com', 'pass')
+        self.member = User.objects.create_user('member', 'member@example.com', 'pass')
+        self.outsider = User.objects.create_user('outsider', 'outsider@example.com', 'pass')
+        self.superuser = User.objects.create_superuser('root', 'root@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='A', owner=self.owner)
+        # Chủ sở hữu vẫn là 'owner' dù có dòng thành viên khác vai trò
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.owner, role='member')
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.admin, role='admin')
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.member, role='member')
+        self.other = Workspace.objects.create(name='B', owner=self.admin)
+        WorkspaceMember.objects.create(workspace=self.other, user=self.member, role='admin')
+
+    def roles(self, user):
+        queryset = with_user_role(Workspace.objects.order_by('id'), user)
+        return dict(queryset.values_list('id', 'current_user_role'))
+
+    def test_role_per_user(self):
+        a, b = self.workspace.pk, self.other.pk
+        self.assertEqual(self.roles(self.owner), {a: 'owner', b: None})
+        self.assertEqual(self.roles(self.admin), {a: 'admin', b: 'owner'})
+        self.assertEqual(self.roles(self.member), {a: 'member', b: 'admin'})
+        self.assertEqual(self.roles(self.outsider), {a: None, b: None})
+        self.assertEqual(self.roles(self.superuser), {a: 'system_admin', b: 'system_admin'})
+
+    def test_annotation_matches_workspace_role(self):
+        for user in (self.owner, self.admin, self.member, self.outsider, self.superuser):
+            for workspace in with_user_role(Workspace.objects.all(), user):
+                with self.subTest(user=user.username, workspace=workspace.name):
+                    plain = Workspace.objects.get(pk=workspace.pk)
+                    self.assertEqual(workspace.current_user_role, workspace_role(user, plain))
+
+    def test_workspace_list_reports_role_without_extra_queries(self):
+        client = APIClient()
+        client.force_authenticate(self.member)
+        client.get('/api/workspaces/')
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/workspaces/')
+        data = response.json()
+        rows = data['results'] if isinstance(data, dict) else data
+        self.assertEqual({row['id']: row['user_role'] for row in rows}, {self.workspace.pk: 'member', self.other.pk: 'admin'})
+        self.assertFalse([query for query in queries.captured_queries if query['sql'].startswith('SELECT "tasks_workspacemember"')])
+
+
+# ===================== PHẠM VI DỮ LIỆU THEO USER & BỘ LỌC ===================== #
+def result_ids(response):
+    data = response.json()
+    rows = data['results'] if isinstance(data, dict) else data
+    return sorted(row['id'] for row in rows)
+
+
+class TenantScopingTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='A', owner=owner)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=owner, role='admin')
+        self.board = Board.objects.create(name='Board A', workspace=self.workspace, owner=owner)
+        self.list = List.objects.create(board=self.board, title='Todo A', order=0)
+        self.card = Card.objects.create(list=self.list, title='Secret', order=0)
+        self.deleted_card = Card.objects.create(list=self.list, title='Trashed', order=1,
+                                                is_deleted=True, deleted_at=timezone.now())
+        self.outsider = User.objects.create_user('outsider', 'outsider@example.com', 'pass')
+        self.own_workspace = Workspace.objects.create(name='B', owner=self.outsider)
+        WorkspaceMember.objects.create(workspace=self.own_workspace, user=self.outsider, role='admin')
+        own_board = Board.objects.create(name='Board B', workspace=self.own_workspace, owner=self.outsider)
+        self.own_list = List.objects.create(board=own_board, title='Todo B', order=0)
+        self.own_card = Card.objects.create(list=self.own_list, title='Mine', order=0)
+        self.client = APIClient()
+        self.client.force_authenticate(self.outsider)
+
+    def assertUnchanged(self):
+        self.card.refresh_from_db()
+        self.deleted_card.refresh_from_db()
+        self.assertEqual((self.card.list_id, self.card.is_archived, self.card.is_deleted), (self.list.pk, False, False))
+        self.assertTrue(self.deleted_card.is_deleted)
+        self.assertEqual(Board.objects.filter(workspace=self.workspace).count(), 1)
+        self.assertEqual(List.objects.filter(board=self.board).count(), 1)
+        self.assertEqual(Card.objects.filter(list=self.list).count(), 2)
+
+    def test_foreign_details_are_not_found(self):
+        for url in (f'/api/workspaces/{self.workspace.pk}/', f'/api/boards/{self.board.pk}/',
+                    f'/api/lists/{self.list.pk}/', f'/api/cards/{self.card.pk}/',
+                    f'/api/workspaces/{self.workspace.pk}/members/', f'/api/boards/{self.board.pk}/snapshot/'):
+            self.assertEqual(self.client.get(url).status_code, 404, url)
+
+    def test_lists_only_contain_own_rows(self):
+        self.assertEqual(result_ids(self.client.get('/api/workspaces/')), [self.own_workspace.pk])
+        self.assertEqual(result_ids(self.client.get('/api/boards/')), [self.own_list.board_id])
+        self.assertEqual(result_ids(self.client.get('/api/lists/')), [self.own_list.pk])
+        self.assertEqual(result_ids(self.client.get('/api/cards/')), [self.own_card.pk])
+        self.assertEqual(result_ids(self.client.get('/api/cards/trash/')), [])
+        # Lọc thẳng vào workspace / board / list của người khác -> rỗng, không lộ dữ liệu
+        for params in ({'workspace': self.workspace.pk}, {'board': self.board.pk}, {'list': self.list.pk}):
+            response = self.client.get('/api/cards/', params)
+            self.assertEqual((response.status_code, result_ids(response)), (200, []), params)
+
+    def test_create_into_foreign_container_is_forbidden(self):
+        self.assertEqual(self.client.post('/api/boards/', {'name': 'X', 'workspace': self.workspace.pk}, format='json').status_code, 403)
+        self.assertEqual(self.client.post('/api/lists/', {'title': 'X', 'board': self.board.pk}, format='json').status_code, 403)
+        self.assertEqual(self.client.post('/api/cards/', {'title': 'X', 'list': self.list.pk}, format='json').status_code, 403)
+        self.assertEqual(self.client.patch(f'/api/cards/{self.own_card.pk}/', {'list': self.list.pk}, format='json').status_code, 403)
+        self.assertUnchanged()
+        self.own_card.refresh_from_db()
+        self.assertEqual(self.own_card.list_id, self.own_list.pk)
+
+    def test_move_batch_and_restore_foreign_cards_are_rejected(self):
+        move = {'moves': [{'id': self.card.pk, 'list': self.own_list.pk, 'index': 0}]}
+        self.assertEqual(self.client.post('/api/cards/move/', move, format='json').status_code, 404)
+        into_foreign = {'moves': [{'id': self.own_card.pk, 'list': self.list.pk, 'index': 0}]}
+        self.assertEqual(self.client.post('/api/cards/move/', into_foreign, format='json').status_code, 403)
+        lists_move = {'moves': [{'id': self.list.pk, 'board': self.own_list.board_id, 'index': 0}]}
+        self.assertEqual(self.client.post('/api/lists/move/', lists_move, format='json').status_code, 404)
+        # Batch báo lỗi theo từng thao tác (400) và không ghi gì
+        response = self.client.post('/api/cards/batch/', {'operations': [
+            {'op': 'archive', 'id': self.card.pk},
+            {'op': 'update', 'id': self.own_card.pk, 'data': {'list': self.list.pk}},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['index'] for error in response.json()['results']], [0, 1])
+        for url in (f'/api/cards/{self.deleted_card.pk}/restore/', f'/api/cards/{self.card.pk}/archive/',
+                    f'/api/cards/{self.card.pk}/soft_delete/', f'/api/workspaces/{self.workspace.pk}/add_member/'):
+            self.assertEqual(self.client.post(url, {'email': 'outsider@example.com'}, format='json').status_code, 404, url)
+        self.assertEqual(self.client.delete(f'/api/cards/{self.card.pk}/').status_code, 404)
+        self.assertUnchanged()
+
+
+class CardFilterTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        workspace = Workspace.objects.create(name='A', owner=owner)
+        other_workspace = Workspace.objects.create(name='B', owner=owner)
+        board = Board.objects.create(name='Board 1', workspace=workspace, owner=owner)
+        other_board = Board.objects.create(name='Board 2', workspace=workspace, owner=owner)
+        far_board = Board.objects.create(name='Board 3', workspace=other_workspace, owner=owner)
+        todo = List.objects.create(board=board, title='Todo', order=0)
+        done = List.objects.create(board=board, title='Done', order=1)
+        other = List.objects.create(board=other_board, title='Other', order=0)
+        far = List.objects.create(board=far_board, title='Far', order=0)
+        self.cards = {
+            'a': Card.objects.create(list=todo, title='a', order=0, due_date=date(2025, 1, 10)),
+            'b': Card.objects.create(list=done, title='b', order=0, status='DONE', due_date=date(2025, 1, 20)),
+            'c': Card.objects.create(list=other, title='c', order=0),
+            'd': Card.objects.create(list=far, title='d', order=0, due_date=date(2025, 1, 15)),
+        }
+        self.ids = {'workspace': workspace.pk, 'board': board.pk, 'list': done.pk}
+        self.client = APIClient()
+        self.client.force_authenticate(owner)
+
+    def filtered(self, **params):
+        response = self.client.get('/api/cards/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        names = {card.pk: name for name, card in self.cards.items()}
+        return ''.join(sorted(names[card_id] for card_id in result_ids(response)))
+
+    def test_each_filter(self):
+        self.assertEqual(self.filtered(), 'abcd')
+        self.assertEqual(self.filtered(workspace=self.ids['workspace']), 'abc')
+        self.assertEqual(self.filtered(board=self.ids['board']), 'ab')
+        self.assertEqual(self.filtered(list=self.ids['list']), 'b')
+        self.assertEqual(self.filtered(status='DONE'), 'b')
+        self.assertEqual(self.filtered(status='TODO'), 'acd')
+        # So sánh chặt, thẻ không có hạn bị loại
+        self.assertEqual(self.filtered(due_before='2025-01-15'), 'a')
+        self.assertEqual(self.filtered(due_after='2025-01-15'), 'b')
+        self.assertEqual(self.filtered(due_after='2025-01-09', due_before='2025-01-20'), 'ad')
+        self.assertEqual(self.filtered(workspace=self.ids['workspace'], status='TODO', due_after='2025-01-01'), 'a')
+
+    def test_invalid_filter_values_are_400(self):
+        for name, value in (('workspace', 'abc'), ('board', '1.5'), ('list', '99999999999999999999999'),
+                            ('status', 'WIP'), ('due_before', '2025-13-01'), ('due_after', 'yesterday'),
+                            ('date', '2025-02-30'), ('overdue', 'maybe')):
+            response = self.client.get('/api/cards/', {name: value})
+            self.assertEqual(response.status_code, 400, (name, value))
+            self.assertIn(name, response.json())
+
+
+# ===================== THỨ TỰ THƯA (tasks/ordering.py) ===================== #
+class GapOrderingTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        board = Board.objects.create(name='Board', owner=owner)
+        self.todo = List.objects.create(board=board, title='Todo', order=ORDER_GAP)
+        self.done = List.objects.create(board=board, title='Done', order=2 * ORDER_GAP)
+        self.a, self.b, self.c = (
+            Card.objects.create(list=self.todo, title=title, order=(i + 1) * ORDER_GAP) for i, title in enumerate('abc')
+        )
+
+    def move(self, *moves):
+        # moves: (card, list, index) -> giống move_items: khóa, tính, ghi các thẻ đã đổi
+        with transaction.atomic():
+            changed, rebalanced = apply_moves([(card, board_list.pk, index) for card, board_list, index in moves],
+                                              Card.objects.all(), 'list')
+            Card.objects.bulk_update(changed, ['list', 'order'])
+        return {card.title for card in changed}, rebalanced
+
+    def titles(self, board_list):
+        return ''.join(Card.objects.filter(list=board_list).order_by('order', 'id').values_list('title', flat=True))
+
+    def test_next_order_appends_after_last(self):
+        self.assertEqual(next_order(Card.objects.filter(list=self.done)), ORDER_GAP)
+        self.assertEqual(next_order(Card.objects.filter(list=self.todo)), 4 * ORDER_GAP)
+
+    def test_midpoint_insert_writes_only_moved_card(self):
+        self.assertEqual(self.move((self.c, self.todo, 1)), ({'c'}, set()))
+        self.c.refresh_from_db()
+        self.assertEqual(self.c.order, (ORDER_GAP + 2 * ORDER_GAP) // 2)
+        self.assertEqual(self.titles(self.todo), 'acb')
+        self.assertEqual(self.move((self.b, self.todo, 0)), ({'b'}, set()))  # Đầu nhóm: (0 + a) / 2
+        self.assertEqual(self.titles(self.todo), 'bac')
+        self.assertEqual(self.move((self.b, self.todo, 5)), ({'b'}, set()))  # index quá lớn -> cuối nhóm
+        self.assertEqual(self.titles(self.todo), 'acb')
+
+    def test_move_across_lists(self):
+        self.assertEqual(self.move((self.b, self.done, 0)), ({'b'}, set()))
+        self.b.refresh_from_db()
+        self.assertEqual((self.b.list_id, self.b.order), (self.done.pk, ORDER_GAP))
+        self.assertEqual((self.titles(self.todo), self.titles(self.done)), ('ac', 'b'))
+
+    def test_several_moves_into_same_group(self):
+        # Thứ tự client gửi được áp dụng lần lượt, mỗi bước thấy kết quả của bước trước
+        changed, _ = self.move((self.a, self.done, 0), (self.c, self.done, 0), (self.b, self.done, 1))
+        self.assertEqual(changed, {'a', 'b', 'c'})
+        self.assertEqual((self.titles(self.todo), self.titles(self.done)), ('', 'cba'))
+
+    def test_repeated_insert_into_same_gap_rebalances(self):
+        # Luôn chèn ngay sau 'a': khoảng trống chia đôi mỗi lần cho tới khi < 2
+        for step in range(1, 20):
+            card = Card.objects.create(list=self.todo, title=f'n{step}', order=next_order(Card.objects.filter(list=self.todo)))
+            changed, rebalanced = self.move((card, self.todo, 1))
+            if rebalanced:
+                break
+            self.assertEqual(changed, {card.title})
+        else:
+            self.fail("Không bao giờ đánh số lại")
+        self.assertEqual(rebalanced, {self.todo.pk})
+        self.assertEqual(step, 11)  # 10 lần chia đôi 1024 -> khoảng còn 1, lần thứ 11 hết chỗ
+        orders = list(Card.objects.filter(list=self.todo).order_by('order', 'id').values_list('title', 'order'))
+        self.assertEqual([title for title, _ in orders], ['a'] + [f'n{i}' for i in range(step, 0, -1)] + ['b', 'c'])
+        self.assertEqual([order for _, order in orders], [(i + 1) * ORDER_GAP for i in range(len(orders))])
+
+    def test_order_limit_forces_rebalance(self):
+        Card.objects.filter(pk=self.c.pk).update(order=MAX_ORDER - 1)
+        self.c.refresh_from_db()
+        changed, rebalanced = self.move((self.a, self.todo, 3))
+        self.assertEqual((changed, rebalanced), ({'a', 'b', 'c'}, {self.todo.pk}))
+        self.assertEqual(self.titles(self.todo), 'bca')
+        self.assertEqual(max(Card.objects.values_list('order', flat=True)), 3 * ORDER_GAP)
+
+
+# ===================== NHÃN: MIGRATION 0015 & API ===================== #
+class LabelMigrationTests(TransactionTestCase):
+    before = [('tasks', '0014_changelog_updated_at')]
+    after = [('tasks', '0015_label_card_labels')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_split_and_join_labels(self):
+        apps = self.migrate(self.before)
+        User_, Workspace_, Board_, List_, Card_ = (apps.get_model(*name.split('.')) for name in
+                                                   ('auth.User', 'tasks.Workspace', 'tasks.Board', 'tasks.List', 'tasks.Card'))
+        owner = User_.objects.create(username='owner')
+        lists = []
+        for name in ('A', 'B'):
+            workspace = Workspace_.objects.create(name=name, owner_id=owner.pk)
+            board = Board_.objects.create(name=name, workspace_id=workspace.pk, owner_id=owner.pk)
+            lists.append(List_.objects.create(board_id=board.pk, title=name, order=0))
+        long_name = 'x' * 60
+        texts = {
+            'first': ' Urgent , Marketing, ,Urgent',
+            'second': 'Marketing',
+            'other_workspace': 'Urgent',
+            'long': long_name,
+            'empty': '',
+            'none': None,
+        }
+        ids = {
+            key: Card_.objects.create(list_id=(lists[1] if key == 'other_workspace' else lists[0]).pk,
+                                      title=key, order=i, labels=text).pk
+            for i, (key, text) in enumerate(texts.items())
+        }
+
+        apps = self.migrate(self.after)
+        Label_, Card_ = apps.get_model('tasks', 'Label'), apps.get_model('tasks', 'Card')
+        workspace_names = {workspace_id: name for workspace_id, name in apps.get_model('tasks', 'Workspace').objects.values_list('id', 'name')}
+        self.assertEqual(
+            sorted((workspace_names[workspace_id], name) for workspace_id, name in Label_.objects.values_list('workspace_id', 'name')),
+            [('A', 'Marketing'), ('A', 'Urgent'), ('A', 'x' * 50), ('B', 'Urgent')],
+        )
+        labels_of = {
+            key: sorted((workspace_names[label.workspace_id], label.name) for label in Card_.objects.get(pk=card_id).labels.all())
+            for key, card_id in ids.items()
+        }
+        self.assertEqual(labels_of, {
+            'first': [('A', 'Marketing'), ('A', 'Urgent')],
+            'second': [('A', 'Marketing')],
+            'other_workspace': [('B', 'Urgent')],
+            'long': [('A', 'x' * 50)],
+            'empty': [],
+            'none': [],
+        })
+
+        apps = self.migrate(self.before)
+        texts_after = dict(apps.get_model('tasks', 'Card').objects.values_list('id', 'labels'))
+        self.assertEqual({key: texts_after[card_id] for key, card_id in ids.items()}, {
+            'first': 'Marketing, Urgent',
+            'second': 'Marketing',
+            'other_workspace': 'Urgent',
+            'long': 'x' * 50,
+            'empty': None,  # Cột được thêm lại rỗng: thẻ không nhãn -> NULL
+            'none': None,
+        })
+
+
+class LabelApiTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='A', owner=owner)
+        self.other_workspace = Workspace.objects.create(name='B', owner=owner)
+        self.list = List.objects.create(board=Board.objects.create(name='A', workspace=self.workspace, owner=owner), title='L', order=0)
+        self.other_list = List.objects.create(board=Board.objects.create(name='B', workspace=self.other_workspace, owner=owner), title='L', order=0)
+        self.client = APIClient()
+        self.client.force_authenticate(owner)
+
+    def create(self, labels, board_list=None):
+        response = self.client.post('/api/cards/', {'title': 'Card', 'list': (board_list or self.list).pk, 'labels': labels}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def test_write_formats(self):
+        self.assertEqual(self.create([' Urgent', 'Bug', 'Urgent', ''])['labels'], ['Bug', 'Urgent'])
+        card = self.create('Bug, Docs ,')
+        self.assertEqual(card['labels'], ['Bug', 'Docs'])
+        # Cùng tên trong workspace khác -> Label riêng
+        self.create(['Bug'], self.other_list)
+        self.assertEqual(Label.objects.filter(name='Bug').count(), 2)
+        self.assertEqual(Label.objects.filter(workspace=self.workspace).count(), 3)
+        url = f"/api/cards/{card['id']}/"
+        self.assertEqual(self.client.patch(url, {'labels': ['Docs', 'New']}, format='json').json()['labels'], ['Docs', 'New'])
+        self.assertEqual(self.client.patch(url, {'title': 'Renamed'}, format='json').json()['labels'], ['Docs', 'New'])
+        self.assertEqual(self.client.patch(url, {'labels': []}, format='json').json()['labels'], [])
+        self.assertEqual(self.client.get(url).json()['labels'], [])
+
+    def test_invalid_labels_are_400(self):
+        for labels in ('x' * 51, [1], {'name': 'A'}, [['A']]):
+            response = self.client.post('/api/cards/', {'title': 'Card', 'list': self.list.pk, 'labels': labels}, format='json')
+            self.assertEqual(response.status_code, 400, labels)
+            self.assertIn('labels', response.json())
+        self.assertFalse(Card.objects.exists())
+
+    def test_label_counts_and_filter(self):
+        first = self.create(['Bug', 'Urgent'])
+        self.create(['Bug'])
+        self.create(['Docs'])
+        archived = self.create(['Docs', 'Urgent'])
+        self.create(['Bug'], self.other_list)
+        self.client.post(f"/api/cards/{archived['id']}/archive/")
+        response = self.client.get('/api/cards/label_counts/', {'workspace': self.workspace.pk})
+        self.assertEqual(response.json(), [
+            {'name': 'Bug', 'count': 2}, {'name': 'Docs', 'count': 1}, {'name': 'Urgent', 'count': 1},
+        ])
+        self.assertEqual(self.client.get('/api/cards/label_counts/').json()[0], {'name': 'Bug', 'count': 3})
+        response = self.client.get('/api/cards/', {'workspace': self.workspace.pk, 'label': 'Urgent,Missing'})
+        self.assertEqual(result_ids(response), [first['id']])
+        self.assertEqual(self.client.get('/api/cards/', {'label': 'x' * 51}).status_code, 400)
+
+
+    def test_labels_without_ignore_conflicts(self):
+        # SQL Server: bulk_create(ignore_conflicts=True) -> NotSupportedError
+        Label.objects.create(workspace=self.workspace, name='Bug')
+        with sql_server_bulk():
+            card = self.create(['Bug', 'New', 'Other'])
+            self.assertEqual(card['labels'], ['Bug', 'New', 'Other'])
+            self.assertEqual(self.create('New, Fresh')['labels'], ['Fresh', 'New'])
+        self.assertEqual(Label.objects.filter(workspace=self.workspace).count(), 4)
+
+    def test_concurrently_created_label_is_reused(self):
+        # Request khác tạo cùng tên ngay sau lần đọc đầu -> dùng lại nhãn đó, không 500
+        real_filter = Label.objects.filter
+        for features in (sql_server_bulk(), contextlib.nullcontext()):
+            Label.objects.all().delete()
+            calls = []
+
+            def racing_filter(*args, **kwargs):
+                if calls:
+                    return real_filter(*args, **kwargs)
+                calls.append(kwargs)
+                Label.objects.bulk_create([Label(workspace=self.workspace, name='Race')])
+                return real_filter(pk__in=[])
+
+            with features, mock.patch.object(Label.objects, 'filter', racing_filter):
+                labels = resolve_labels(self.workspace.pk, ['Race'])
+            self.assertEqual(labels['Race'].pk, Label.objects.get(workspace=self.workspace, name='Race').pk)
+
+
+# ===================== PHÂN TRANG KEYSET ===================== #
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='A', owner=owner)
+        board = Board.objects.create(name='Board', workspace=self.workspace, owner=owner)
+        self.list = List.objects.create(board=board, title='L', order=0)
+        self.client = APIClient()
+        self.client.force_authenticate(owner)
+
+    def walk(self, url, params, page_size):
+        # Đi hết các trang theo link `next`, trả về id theo đúng thứ tự nhận được
+        ids, pages = [], 0
+        response = self.client.get(url, {**params, 'page_size': page_size})
+        while True:
+            self.assertEqual(response.status_code, 200, response.content)
+            data = response.json()
+            self.assertLessEqual(len(data['results']), page_size)
+            ids += [row['id'] for row in data['results']]
+            pages += 1
+            if not data['next']:
+                return ids, pages
+            response = self.client.get(data['next'])
+
+    def test_round_trip_with_tied_sort_values(self):
+        cards = Card.objects.bulk_create(
+            Card(list=self.list, title=f'C{i}', order=ORDER_GAP if i % 2 else 2 * ORDER_GAP) for i in range(9)
+        )
+        expected = [card.pk for card in sorted(cards, key=lambda card: (card.order, card.pk))]
+        for page_size in (1, 2, 4, 9, 10):
+            ids, pages = self.walk('/api/cards/', {'list': self.list.pk}, page_size)
+            self.assertEqual(ids, expected, page_size)
+            self.assertEqual(pages, max(1, -(-9 // page_size)), page_size)
+        # Khóa giảm dần, mọi dòng cùng deleted_at
+        deleted_at = timezone.now()
+        Card.objects.update(is_deleted=True, deleted_at=deleted_at)
+        ids, _ = self.walk('/api/cards/trash/', {}, 4)
+        self.assertEqual(ids, sorted(expected, reverse=True))
+
+    @override_settings(API_PAGE_SIZE=2, API_MAX_PAGE_SIZE=3)
+    def test_page_size_default_and_cap(self):
+        Card.objects.bulk_create(Card(list=self.list, title=f'C{i}', order=i) for i in range(5))
+        self.assertEqual(len(self.client.get('/api/cards/').json()['results']), 2)
+        self.assertEqual(len(self.client.get('/api/cards/', {'page_size': 100}).json()['results']), 3)
+        for value in ('0', '-1', 'abc'):
+            response = self.client.get('/api/cards/', {'page_size': value})
+            self.assertEqual(response.status_code, 400, value)
+            self.assertIn('page_size', response.json())
+
+    def test_tampered_cursor_is_400(self):
+        Card.objects.create(list=self.list, title='C', order=1)
+        for cursor in ('not base64!!', 'e30', encode_cursor({'order': 1}), encode_cursor([1]),
+                       encode_cursor(['x', 'y']), encode_cursor([{'a': 1}, 1]), encode_cursor([[1], 2]),
+                       encode_cursor([10 ** 30, 1])):
+            response = self.client.get('/api/cards/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertIn('cursor', response.json())
+        response = self.client.get('/api/cards/', {'ordering': 'overdue', 'cursor': encode_cursor([True, 'not-a-date', 1])})
+        self.assertEqual(response.status_code, 400)
+
+    def test_overdue_ordering_key(self):
+        today = timezone.localdate()
+        due = {
+            'old': today - timedelta(days=10), 'old_tie': today - timedelta(days=10), 'recent': today - timedelta(days=2),
+            'done_past': today - timedelta(days=5), 'today': today, 'future': today + timedelta(days=3),
+            'no_due': None, 'no_due_tie': None,
+        }
+        ids = {
+            name: Card.objects.create(list=self.list, title=name, order=i, due_date=due_date,
+                                      status='DONE' if name == 'done_past' else 'TODO').pk
+            for i, (name, due_date) in enumerate(due.items())
+        }
+        names = {card_id: name for name, card_id in ids.items()}
+        expected = ['old', 'old_tie', 'recent', 'done_past', 'today', 'future', 'no_due', 'no_due_tie']
+        for page_size in (1, 3, 8):
+            ordered, _ = self.walk('/api/cards/', {'ordering': 'overdue'}, page_size)
+            self.assertEqual([names[card_id] for card_id in ordered], expected, page_size)
+        self.assertEqual(self.client.get('/api/cards/', {'ordering': 'title'}).status_code, 400)
+
+
+# ===================== HẠN LƯU TRỮ (tasks/retention.py) ===================== #
+class RetentionTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.now = timezone.now()
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='A', owner=self.owner)
+        board = Board.objects.create(name='Board', workspace=self.workspace, owner=self.owner)
+        self.list = List.objects.create(board=board, title='L', order=0)
+        ago = lambda days: self.now - timedelta(days=days)
+        self.expired = Card.objects.bulk_create(
+            Card(list=self.list, title=f'Expired {i}', order=i, status='DONE', is_archived=True, archived_at=ago(8 + i))
+            for i in range(5)
+        )
+        self.kept = Card.objects.bulk_create([
+            Card(list=self.list, title='Recent archive', order=10, status='DONE', is_archived=True, archived_at=ago(6)),
+            Card(list=self.list, title='Old trash', order=11, is_deleted=True, deleted_at=ago(400)),  # Thùng rác thẻ: giữ mãi
+            Card(list=self.list, title='Active', order=12),
+        ])
+        self.old_workspace = Workspace.objects.create(name='Old', owner=self.owner, is_deleted=True, deleted_at=ago(31))
+        self.recent_workspace = Workspace.objects.create(name='Recent', owner=self.owner, is_deleted=True, deleted_at=ago(29))
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_purge_deletes_in_batches_and_keeps_items_in_retention(self):
+        ChangeLog.objects.all().update(created_at=self.now - timedelta(days=31))
+        fresh_log = ChangeLog.objects.create(workspace_id=self.workspace.pk, version=999, kind='card', object_id=1)
+        batches = []
+        totals = purge_expired(now=self.now, batch_size=2, report=lambda label, count, elapsed: batches.append((label, count)))
+        self.assertEqual(totals['archived_cards'], 5)
+        self.assertEqual(totals['trashed_workspaces'], 1)
+        self.assertEqual([count for label, count in batches if label == 'archived_cards'], [2, 2, 1])
+        self.assertEqual(
+            sorted(Card.objects.values_list('title', flat=True)), ['Active', 'Old trash', 'Recent archive'],
+        )
+        self.assertEqual(
+            sorted(Workspace.objects.values_list('name', flat=True)), ['A', 'Recent'],
+        )
+        # Nhật ký đồng bộ cũ bị dọn, nhưng tombstone của lần dọn này (mới ghi) vẫn còn
+        self.assertTrue(ChangeLog.objects.filter(pk=fresh_log.pk).exists())
+        self.assertEqual(
+            set(ChangeLog.objects.filter(workspace_id=self.workspace.pk, kind='card', op='delete').values_list('object_id', flat=True)),
+            {card.pk for card in self.expired},
+        )
+        self.assertFalse(ChangeLog.objects.filter(created_at__lt=self.now - timedelta(days=30)).exists())
+        # Chạy lại: không còn gì để xóa
+        totals = purge_expired(now=self.now, batch_size=2)
+        self.assertEqual((totals['archived_cards'], totals['trashed_workspaces']), (0, 0))
+
+    def test_custom_retention_days(self):
+        totals = purge_expired(now=self.now, archive_days=30, trash_days=60)
+        self.assertEqual((totals['archived_cards'], totals['trashed_workspaces']), (0, 0))
+        totals = purge_expired(now=self.now, archive_days=5)
+        self.assertEqual(totals['archived_cards'], 6)
+
+    def test_command_reports_batches(self):
+        out = io.StringIO()
+        call_command('purge_expired', '--batch-size', '3', stdout=out)
+        output = out.getvalue()
+        self.assertIn('archived_cards: 3 dòng', output)
+        self.assertIn('archived_cards: 2 dòng', output)
+        self.assertIn('archived_cards=5', output)
+        self.assertEqual(Card.objects.count(), 3)
+
+    def test_archive_listing_is_read_only(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/cards/archived/')
+        self.assertEqual(response.status_code, 200)
+        # Thẻ đã quá hạn không hiển thị nữa nhưng cũng không bị xóa trong request
+        self.assertEqual([card['title'] for card in response.json()['results']], ['Recent archive'])
+        self.assertEqual(Card.objects.count(), 8)
+        writes = [query['sql'] for query in queries if query['sql'].split()[0].upper() in ('INSERT', 'UPDATE', 'DELETE')]
+        self.assertEqual(writes, [])
+
+
+# ===================== THAO TÁC THẺ HÀNG LOẠT (tasks/batch.py) ===================== #
+class CardBatchTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='A', owner=owner)
+        board = Board.objects.create(name='Board', workspace=self.workspace, owner=owner)
+        self.todo = List.objects.create(board=board, title='Todo', order=0)
+        self.done = List.objects.create(board=board, title='Done', order=1)
+        self.first, self.second, self.third = (
+            Card.objects.create(list=self.todo, title=title, order=i * ORDER_GAP) for i, title in enumerate(('First', 'Second', 'Third'), 1)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(owner)
+
+    def state(self):
+        self.workspace.refresh_from_db()
+        return (
+            list(Card.objects.order_by('id').values_list('id', 'list_id', 'title', 'status', 'order', 'is_archived', 'is_deleted')),
+            self.workspace.version, ChangeLog.objects.count(), Activity.objects.count(), Label.objects.count(),
+        )
+
+    def post(self, operations):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/cards/batch/', {'operations': operations}, format='json')
+
+    def test_one_invalid_item_fails_whole_batch(self):
+        before = self.state()
+        response = self.post([
+            {'op': 'create', 'data': {'list': self.todo.pk, 'title': 'New', 'labels': ['X']}},
+            {'op': 'update', 'id': self.first.pk, 'data': {'title': 'Changed', 'list': self.done.pk}},
+            {'op': 'archive', 'id': self.second.pk},
+            {'op': 'update', 'id': self.third.pk, 'data': {'status': 'WIP'}},
+            {'op': 'create', 'data': {'list': self.todo.pk}},
+            {'op': 'soft_delete', 'id': 999999},
+            {'op': 'restore', 'id': self.first.pk},
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = {item['index']: item for item in response.json()['results']}
+        self.assertEqual(sorted(errors), [3, 4, 5, 6])
+        self.assertIn('status', errors[3]['errors'])
+        self.assertIn('title', errors[4]['errors'])
+        self.assertEqual((errors[5]['op'], list(errors[5]['errors'])), ('soft_delete', ['id']))
+        self.assertEqual(list(errors[6]['errors']), ['id'])  # Trùng thẻ với mục 1
+        self.assertEqual(self.state(), before)
+
+    def test_failure_while_writing_rolls_back_everything(self):
+        before = self.state()
+        with mock.patch('tasks.batch.set_card_labels', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self.post([
+                    {'op': 'create', 'data': {'list': self.todo.pk, 'title': 'New'}},
+                    {'op': 'update', 'id': self.first.pk, 'data': {'title': 'Changed'}},
+                ])
+        self.assertEqual(self.state(), before)
+
+    def test_valid_batch_reports_each_index(self):
+        response = self.post([
+            {'op': 'update', 'id': self.first.pk, 'data': {'list': self.done.pk}},
+            {'op': 'create', 'data': {'list': self.todo.pk, 'title': 'New', 'labels': 'A, B'}},
+            {'op': 'archive', 'id': self.second.pk},
+            {'op': 'soft_delete', 'id': self.third.pk},
+        ])
+        self.assertEqual(response.status_code, 200, response.content)
+        results = response.json()['results']
+        self.assertEqual([(item['index'], item['op']) for item in results],
+                         [(0, 'update'), (1, 'create'), (2, 'archive'), (3, 'soft_delete')])
+        self.assertEqual(results[1]['card']['labels'], ['A', 'B'])
+        self.assertEqual(results[1]['card']['order'], 4 * ORDER_GAP)  # Cuối List, sau thẻ đang hoạt động cuối cùng
+        self.assertEqual(Card.objects.get(pk=self.first.pk).list_id, self.done.pk)
+        self.assertEqual(Card.objects.filter(is_archived=True).get().pk, self.second.pk)
+        self.assertEqual(Card.objects.filter(is_deleted=True).get().pk, self.third.pk)
+        self.workspace.refresh_from_db()
+        before_version = self.workspace.version
+        self.assertEqual(self.post([{'op': 'restore', 'id': self.third.pk}]).status_code, 200)
+        self.workspace.refresh_from_db()
+        self.assertEqual(self.workspace.version, before_version + 1)  # 1 lần tăng version cho cả batch
+
+
+    def test_without_bulk_insert_ids(self):
+        # SQL Server: bulk_create không trả id -> chèn từng thẻ, id / nhãn / kết quả vẫn đúng
+        with sql_server_bulk():
+            response = self.post([
+                {'op': 'create', 'data': {'list': self.todo.pk, 'title': 'One', 'labels': ['A']}},
+                {'op': 'create', 'data': {'list': self.done.pk, 'title': 'Two', 'labels': ['A', 'B']}},
+                {'op': 'update', 'id': self.first.pk, 'data': {'labels': ['B']}},
+            ])
+        self.assertEqual(response.status_code, 200, response.content)
+        results = response.json()['results']
+        ids = [item['id'] for item in results[:2]]
+        self.assertEqual([item['card']['id'] for item in results[:2]], ids)
+        self.assertEqual(
+            {card.title: sorted(card.labels.values_list('name', flat=True)) for card in Card.objects.filter(pk__in=ids + [self.first.pk])},
+            {'One': ['A'], 'Two': ['A', 'B'], 'First': ['B']},
+        )
+        self.assertEqual(List.objects.get(pk=self.done.pk).todo_count, 1)
+
+    def test_query_count_does_not_grow_with_items(self):
+        Label.objects.create(workspace=self.workspace, name='A')
+        def count(size):
+            operations = [{'op': 'create', 'data': {'list': self.todo.pk, 'title': f'New {i}', 'labels': ['A']}} for i in range(size)]
+            operations.append({'op': 'update', 'id': self.first.pk, 'data': {'list': self.done.pk}})
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.post(operations).status_code, 200)
+            self.client.post('/api/cards/move/', {'moves': [{'id': self.first.pk, 'list': self.todo.pk, 'index': 0}]}, format='json')
+            return len(queries)
+        self.assertEqual(count(2), count(8))
+
+
+# ===================== TÌM KIẾM TOÀN VĂN (tasks/search.py) ===================== #
+class SearchTests(TestCase):
+    # Chạy với backend mặc định của DB test (SQLite: FTS5, PostgreSQL: tsvector)
+    def setUp(self):
+        get_search_backend.cache_clear()
+        caches['default'].clear()
+        self.user = User.objects.create_user('searcher', 'searcher@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='A', owner=self.user)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.user, role='admin')
+        board = Board.objects.create(name='Board', workspace=self.workspace, owner=self.user)
+        self.list = List.objects.create(board=board, title='Todo', order=0)
+        self.best = Card.objects.create(list=self.list, title='Deploy server', description='deploy deploy rồi deploy lại', order=0)
+        self.plain = Card.objects.create(list=self.list, title='Deploy notes', order=1)
+        self.other = Card.objects.create(list=self.list, title='Thiết kế giao diện', description='Đăng nhập', order=2)
+        other_workspace = Workspace.objects.create(name='B', owner=self.user)
+        WorkspaceMember.objects.create(workspace=other_workspace, user=self.user, role='member')
+        other_board = Board.objects.create(name='Other', workspace=other_workspace, owner=self.user)
+        self.other_list = List.objects.create(board=other_board, title='Todo', order=0)
+        self.elsewhere = Card.objects.create(list=self.other_list, title='Deploy elsewhere', order=0)
+        stranger = User.objects.create_user('stranger', 'stranger@example.com', 'pass')
+        foreign = Workspace.objects.create(name='C', owner=stranger)
+        WorkspaceMember.objects.create(workspace=foreign, user=stranger, role='admin')
+        foreign_board = Board.objects.create(name='Foreign', workspace=foreign, owner=stranger)
+        foreign_list = List.objects.create(board=foreign_board, title='Todo', order=0)
+        self.foreign = Card.objects.create(list=foreign_list, title='Deploy deploy secret', order=0)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        get_search_backend.cache_clear()
+
+    def search(self, query, **params):
+        response = self.client.get('/api/cards/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['id'] for row in response.json()['results']]
+
+    def write(self, method, url, data=None):
+        # Backend trong bộ nhớ cập nhật index sau commit
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 300, response.content)
+
+    def test_ranking_terms_and_prefix(self):
+        found = self.search('deploy')
+        self.assertEqual(found[0], self.best.pk)  # Nhiều lần xuất hiện nhất
+        self.assertEqual(sorted(found), sorted([self.best.pk, self.plain.pk, self.elsewhere.pk]))
+        ranks = [row['rank'] for row in self.client.get('/api/cards/search/', {'q': 'deploy'}).json()['results']]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+        self.assertEqual(self.search('deploy serv'), [self.best.pk])  # Mọi từ phải khớp, từ cuối theo tiền tố
+        self.assertEqual(self.search('serv deploy'), [])  # Chỉ từ cuối mới khớp tiền tố
+        self.assertEqual(self.search('thiet ke'), [self.other.pk])  # Bỏ dấu
+        self.assertEqual(self.search('dang nhap'), [self.other.pk])  # "đ" -> "d"
+        self.assertEqual(self.search('deploy', page_size=1), [self.best.pk])
+        self.assertEqual(self.client.get('/api/cards/search/', {'q': ' ,. '}).status_code, 400)
+
+    def test_results_are_scoped_to_callers_workspaces(self):
+        self.assertNotIn(self.foreign.pk, self.search('secret deploy'))
+        self.assertEqual(self.search('deploy', workspace=self.workspace.pk), [self.best.pk, self.plain.pk])
+        self.client.force_authenticate(User.objects.get(username='stranger'))
+        self.assertEqual(self.search('deploy'), [self.foreign.pk])
+        self.assertEqual(self.search('deploy', workspace=self.workspace.pk), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.assertEqual(self.search('notes'), [self.plain.pk])  # Index đã được dựng trước khi sửa
+        self.write('patch', f'/api/cards/{self.plain.pk}/', {'title': 'Release checklist'})
+        self.assertEqual(self.search('notes'), [])
+        self.assertEqual(self.search('checklist'), [self.plain.pk])
+        self.write('post', '/api/cards/', {'list': self.list.pk, 'title': 'Checklist for deploy'})
+        created = Card.objects.get(title='Checklist for deploy').pk
+        self.assertEqual(sorted(self.search('checklist')), sorted([self.plain.pk, created]))
+        self.write('delete', f'/api/cards/{self.plain.pk}/')
+        self.assertEqual(self.search('checklist'), [created])
+        self.assertFalse(Card.objects.filter(pk=self.plain.pk).exists())
+        # Thẻ lưu trữ / trong thùng rác không hiện trong kết quả
+        self.write('post', f'/api/cards/{self.best.pk}/archive/')
+        self.write('post', f'/api/cards/{created}/soft_delete/')
+        self.assertEqual(sorted(self.search('deploy')), [self.elsewhere.pk])
+        self.write('post', f'/api/cards/{created}/restore/')
+        self.assertEqual(self.search('checklist'), [created])
+
+    def test_bulk_moves_are_indexed(self):
+        # Chuyển thẻ sang workspace khác (đường ghi hàng loạt) -> kết quả theo phạm vi mới
+        self.assertEqual(self.search('notes', workspace=self.workspace.pk), [self.plain.pk])
+        self.write('post', '/api/cards/move/', {'moves': [{'id': self.plain.pk, 'list': self.other_list.pk, 'index': 0}]})
+        self.assertEqual(self.search('notes', workspace=self.workspace.pk), [])
+        self.assertEqual(self.search('notes'), [self.plain.pk])
+
+
+@override_settings(SEARCH_BACKEND='tasks.search.InMemorySearchBackend')
+class InMemorySearchTests(SearchTests):
+    # Backend dự phòng cho DB không phải SQLite / PostgreSQL (SQL Server): cùng bộ kiểm thử ở trên, thêm phần
+    # bắt kịp thay đổi từ tiến trình khác qua ChangeLog
+    def test_backend_is_in_memory(self):
+        self.assertIsInstance(get_search_backend(), InMemorySearchBackend)
+
+    def test_catches_up_with_other_processes(self):
+        self.assertEqual(self.search('notes'), [self.plain.pk])
+        # Tiến trình khác ghi: index của tiến trình này không được báo, chỉ có ChangeLog
+        with mock.patch.object(InMemorySearchBackend, 'changed'):
+            self.write('patch', f'/api/cards/{self.plain.pk}/', {'title': 'Release checklist'})
+        self.assertEqual(self.search('checklist'), [self.plain.pk])
+        self.assertEqual(self.search('notes'), [])
+        with mock.patch.object(InMemorySearchBackend, 'changed'):
+            self.write('delete', f'/api/cards/{self.plain.pk}/')
+        self.assertEqual(self.search('checklist'), [])
+        self.assertNotIn(self.plain.pk, get_search_backend().documents)
+
+    def test_late_commit_with_lower_log_pk_is_caught_up(self):
+        self.assertEqual(self.search('notes'), [self.plain.pk])
+        with mock.patch.object(InMemorySearchBackend, 'changed'):
+            self.write('patch', f'/api/cards/{self.plain.pk}/', {'title': 'Release checklist'})
+            self.write('patch', f'/api/cards/{self.other.pk}/', {'title': 'Other renamed'})
+        # Transaction ghi self.plain lấy pk trước nhưng commit sau lần tìm kế tiếp
+        late = ChangeLog.objects.filter(kind='card', object_id=self.plain.pk).latest('pk')
+        ChangeLog.objects.filter(pk=late.pk).delete()
+        self.assertEqual(self.search('renamed'), [self.other.pk])
+        self.assertEqual(self.search('checklist'), [])
+        ChangeLog.objects.bulk_create([late])  # Giữ nguyên pk cũ
+        self.assertEqual(self.search('checklist'), [self.plain.pk])
+        self.assertEqual(get_search_backend().log_gaps, set())
+
+    def test_uncommitted_writes_are_not_indexed(self):
+        self.assertEqual(self.search('notes'), [self.plain.pk])
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.client.patch(f'/api/cards/{self.plain.pk}/', {'title': 'Release checklist'}, format='json')
+        self.assertTrue(callbacks)  # Chưa commit -> chưa áp dụng
+        backend = get_search_backend()
+        self.assertIn('notes', backend.postings)
+        self.assertNotIn('checklist', backend.postings)
+
+
+# ===================== LỊCH THEO NGÀY HẾT HẠN (/api/cards/calendar/) ===================== #
+class CalendarTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.today = timezone.now().date()
+        self.user = User.objects.create_user('planner', 'planner@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='A', owner=self.user)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.user, role='admin')
+        board = Board.objects.create(name='Board', workspace=self.workspace, owner=self.user)
+        self.list = List.objects.create(board=board, title='Todo', order=0)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def card(self, title, days, order=0, **fields):
+        return Card.objects.create(list=self.list, title=title, order=order, due_date=self.today + timedelta(days=days), **fields)
+
+    def calendar(self, start, end, **params):
+        return self.client.get('/api/cards/calendar/', {'from': str(start), 'to': str(end), **params})
+
+    def test_cards_are_grouped_by_due_date(self):
+        late = self.card('Late', -1, order=2)
+        late_done = self.card('Late done', -1, order=1, status='DONE')
+        due_today = self.card('Today', 0)
+        self.card('Cancelled later', 3, status='CANCELLED')
+        last_day = self.card('Last day', 5)
+        self.card('Outside', 6)
+        self.card('Archived', 0, is_archived=True)
+        self.card('Deleted', 0, is_deleted=True, deleted_at=timezone.now())
+        Card.objects.create(list=self.list, title='No due date', order=0)
+
+        response = self.calendar(self.today - timedelta(days=1), self.today + timedelta(days=5))
+        self.assertEqual(response.status_code, 200, response.content)
+        days = {day['date']: day for day in response.json()['days']}
+        # Chỉ những ngày có thẻ, tăng dần, 2 đầu mút đều được tính
+        self.assertEqual(list(days), [str(self.today + timedelta(days=offset)) for offset in (-1, 0, 3, 5)])
+        yesterday = days[str(self.today - timedelta(days=1))]
+        self.assertEqual([card['id'] for card in yesterday['cards']], [late_done.pk, late.pk])  # Theo order trong ngày
+        self.assertEqual(yesterday['counts'], {'total': 2, 'todo': 1, 'done': 1, 'cancelled': 0, 'overdue': 1})
+        self.assertEqual([card['id'] for card in days[str(self.today)]['cards']], [due_today.pk])
+        self.assertEqual(days[str(self.today)]['counts']['overdue'], 0)  # Hạn hôm nay chưa quá hạn
+        self.assertEqual(days[str(self.today + timedelta(days=3))]['counts']['cancelled'], 1)
+        self.assertEqual([card['id'] for card in days[str(self.today + timedelta(days=5))]['cards']], [last_day.pk])
+        for day in days.values():
+            self.assertEqual(day['counts']['total'], len(day['cards']))
+
+    def test_scoped_to_workspace_and_caller(self):
+        mine = self.card('Mine', 1)
+        stranger = User.objects.create_user('stranger', 'stranger@example.com', 'pass')
+        foreign = Workspace.objects.create(name='B', owner=stranger)
+        WorkspaceMember.objects.create(workspace=foreign, user=stranger, role='admin')
+        foreign_board = Board.objects.create(name='Foreign', workspace=foreign, owner=stranger)
+        foreign_list = List.objects.create(board=foreign_board, title='Todo', order=0)
+        Card.objects.create(list=foreign_list, title='Theirs', order=0, due_date=self.today + timedelta(days=1))
+        response = self.calendar(self.today, self.today + timedelta(days=2), workspace=self.workspace.pk)
+        self.assertEqual([card['id'] for day in response.json()['days'] for card in day['cards']], [mine.pk])
+        response = self.calendar(self.today, self.today + timedelta(days=2), workspace=foreign.pk)
+        self.assertEqual((response.status_code, response.json()['days']), (200, []))
+
+    def test_range_limit(self):
+        start = date(2025, 1, 1)
+        self.card('Edge', (start + timedelta(days=61) - self.today).days)
+        # 62 ngày tính cả 2 đầu mút là tối đa
+        response = self.calendar(start, start + timedelta(days=61))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(len(response.json()['days']), 1)
+        self.assertEqual(self.calendar(start, start).status_code, 200)
+        for end in (start + timedelta(days=62), start + timedelta(days=400)):
+            response = self.calendar(start, end)
+            self.assertEqual(response.status_code, 400, end)
+            self.assertIn('to', response.json())
+        response = self.calendar(start, start - timedelta(days=1))  # Ngược chiều
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('to', response.json())
+        for params in ({'from': str(start)}, {'to': str(start)}, {}, {'from': '2025-02-30', 'to': str(start)}, {'from': 'abc', 'to': 'x'}):
+            self.assertEqual(self.client.get('/api/cards/calendar/', params).status_code, 400, params)
+
+    @override_settings(CALENDAR_MAX_DAYS=7)
+    def test_limit_follows_setting(self):
+        start = date(2025, 1, 1)
+        self.assertEqual(self.calendar(start, start + timedelta(days=6)).status_code, 200)
+        self.assertEqual(self.calendar(start, start + timedelta(days=7)).status_code, 400)
+
+
+# ===================== THẺ QUÁ HẠN (?overdue=, /api/cards/overdue/) ===================== #
+class OverdueTests(TestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.today = timezone.now().date()
+        self.user = User.objects.create_user('late', 'late@example.com', 'pass')
+        self.teammate = User.objects.create_user('mate', 'mate@example.com', 'pass')
+        self.first = self.workspace('First')
+        self.second = self.workspace('Second')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        lists = self.first_list, self.second_list
+        # Hạn trùng nhau -> thứ tự theo id; tạo xen kẽ để id không trùng thứ tự due_date
+        self.oldest_b = self.card(lists[1], 'Oldest B', -10)
+        self.recent = self.card(lists[0], 'Recent', -1)
+        self.oldest_a = self.card(lists[0], 'Oldest A', -10, created_by=self.teammate)
+        self.middle = self.card(lists[1], 'Middle', -5, status='CANCELLED')
+        self.overdue_ids = [self.oldest_b.pk, self.oldest_a.pk, self.middle.pk, self.recent.pk]
+        # Không quá hạn
+        self.card(lists[0], 'Due today', 0)
+        self.card(lists[0], 'Tomorrow', 1)
+        self.card(lists[0], 'Done', -3, status='DONE')
+        self.card(lists[0], 'Archived', -3, is_archived=True, archived_at=timezone.now())
+        self.card(lists[1], 'Deleted', -3, is_deleted=True, deleted_at=timezone.now())
+        Card.objects.create(list=lists[1], title='No due date', order=0)
+
+    def workspace(self, name):
+        workspace = Workspace.objects.create(name=name, owner=self.user)
+        WorkspaceMember.objects.create(workspace=workspace, user=self.user, role='admin')
+        WorkspaceMember.objects.create(workspace=workspace, user=self.teammate, role='member')
+        board = Board.objects.create(name=name, workspace=workspace, owner=self.user)
+        setattr(self, f'{name.lower()}_list', List.objects.create(board=board, title='Todo', order=0))
+        return workspace
+
+    def card(self, card_list, title, days, **fields):
+        fields.setdefault('created_by', self.user)
+        return Card.objects.create(list=card_list, title=title, order=0, due_date=self.today + timedelta(days=days), **fields)
+
+    def test_dashboard_counts_and_orders_overdue_cards(self):
+        response = self.client.get('/api/cards/overdue/')
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        self.assertEqual((body['today'], body['total'], body['mine']), (str(self.today), 4, 3))
+        self.assertEqual(body['workspaces'], [
+            {'workspace': self.first.pk, 'name': 'First', 'count': 2},
+            {'workspace': self.second.pk, 'name': 'Second', 'count': 2},
+        ])  # Bằng số thẻ -> theo id workspace
+        # Hạn cũ nhất trước, trùng hạn -> id nhỏ trước
+        self.assertEqual([card['id'] for card in body['cards']], self.overdue_ids)
+        self.assertTrue(all(card['is_overdue'] for card in body['cards']))
+        limited = self.client.get('/api/cards/overdue/', {'page_size': 2}).json()
+        self.assertEqual(([card['id'] for card in limited['cards']], limited['total']), (self.overdue_ids[:2], 4))
+
+    def test_dashboard_respects_filters_and_scope(self):
+        body = self.client.get('/api/cards/overdue/', {'workspace': self.second.pk}).json()
+        self.assertEqual(([card['id'] for card in body['cards']], body['total']), ([self.oldest_b.pk, self.middle.pk], 2))
+        body = self.client.get('/api/cards/overdue/', {'status': 'CANCELLED'}).json()
+        self.assertEqual([card['id'] for card in body['cards']], [self.middle.pk])
+        stranger = User.objects.create_user('stranger', 'stranger@example.com', 'pass')
+        self.client.force_authenticate(stranger)
+        body = self.client.get('/api/cards/overdue/').json()
+        self.assertEqual((body['total'], body['mine'], body['workspaces'], body['cards']), (0, 0, [], []))
+
+    def test_mine_is_per_user(self):
+        self.client.force_authenticate(self.teammate)
+        body = self.client.get('/api/cards/overdue/').json()
+        self.assertEqual((body['total'], body['mine']), (4, 1))
+
+    def test_overdue_filter_on_card_list(self):
+        response = self.client.get('/api/cards/', {'overdue': 'true', 'ordering': 'overdue'})
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([row['id'] for row in response.json()['results']], self.overdue_ids)
+        self.assertEqual(result_ids(self.client.get('/api/cards/', {'overdue': 'true'})), sorted(self.overdue_ids))
+        not_overdue = result_ids(self.client.get('/api/cards/', {'overdue': 'false'}))
+        active = Card.objects.filter(is_deleted=False, is_archived=False).values_list('pk', flat=True)
+        self.assertEqual(not_overdue, sorted(set(active) - set(self.overdue_ids)))
+
+    def test_next_day_today_becomes_overdue(self):
+        due_today = Card.objects.get(title='Due today')
+        tomorrow = timezone.now() + timedelta(days=1)
+        with mock.patch('django.utils.timezone.now', return_value=tomorrow):
+            body = self.client.get('/api/cards/overdue/').json()
+        self.assertEqual(body['total'], 5)
+        self.assertEqual([card['id'] for card in body['cards']][-1], due_today.pk)
+
+
+# ===================== BỘ ĐẾM THẺ THEO LIST (tasks/counters.py) ===================== #
+class ListCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('counter', 'counter@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='A', owner=self.user)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.user, role='admin')
+        board = Board.objects.create(name='Board', workspace=self.workspace, owner=self.user)
+        self.todo = List.objects.create(board=board, title='Todo', order=0)
+        self.done = List.objects.create(board=board, title='Done', order=1)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def counters(self, board_list):
+        board_list.refresh_from_db()
+        return board_list.todo_count, board_list.done_count, board_list.cancelled_count
+
+    def assertCounters(self, todo, done):
+        self.assertEqual((self.counters(self.todo), self.counters(self.done)), (todo, done))
+        # Luôn khớp với việc đếm lại từ bảng thẻ
+        self.assertEqual(recount_lists([self.todo.pk, self.done.pk], dry_run=True), [])
+
+    def call(self, method, url, data=None):
+        response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 300, response.content)
+        return response
+
+    def test_counters_follow_every_write_path(self):
+        first = self.call('post', '/api/cards/', {'list': self.todo.pk, 'title': 'First'}).json()['id']
+        second = self.call('post', '/api/cards/', {'list': self.todo.pk, 'title': 'Second', 'status': 'CANCELLED'}).json()['id']
+        self.assertCounters((1, 0, 1), (0, 0, 0))
+        self.call('patch', f'/api/cards/{first}/', {'status': 'DONE'})
+        self.assertCounters((0, 1, 1), (0, 0, 0))
+        self.call('post', '/api/cards/move/', {'moves': [{'id': first, 'list': self.done.pk, 'index': 0}]})
+        self.assertCounters((0, 0, 1), (0, 1, 0))
+        self.call('patch', f'/api/cards/{second}/', {'list': self.done.pk, 'status': 'TODO'})
+        self.assertCounters((0, 0, 0), (1, 1, 0))
+        self.call('post', f'/api/cards/{second}/soft_delete/')
+        self.assertCounters((0, 0, 0), (0, 1, 0))
+        self.call('post', f'/api/cards/{second}/restore/')
+        self.assertCounters((0, 0, 0), (1, 1, 0))
+        self.call('post', f'/api/cards/{first}/archive/')
+        self.assertCounters((0, 0, 0), (1, 0, 0))
+        self.call('post', f'/api/cards/{first}/restore/')
+        self.assertCounters((0, 0, 0), (1, 1, 0))
+        self.call('delete', f'/api/cards/{second}/')
+        self.assertCounters((0, 0, 0), (0, 1, 0))
+        self.call('post', '/api/cards/batch/', {'operations': [
+            {'op': 'create', 'data': {'list': self.todo.pk, 'title': 'Batch'}},
+            {'op': 'update', 'id': first, 'data': {'list': self.todo.pk, 'status': 'CANCELLED'}},
+        ]})
+        self.assertCounters((1, 0, 1), (0, 0, 0))
+
+    def test_stats_read_counters(self):
+        Card.objects.create(list=self.todo, title='A', order=0)
+        Card.objects.create(list=self.done, title='B', order=0, status='DONE')
+        Card.objects.create(list=self.done, title='C', order=1, status='DONE', is_archived=True)
+        stats = self.call('get', f'/api/workspaces/{self.workspace.pk}/stats/').json()
+        self.assertEqual(stats['cards'], {'todo': 1, 'done': 1, 'cancelled': 0, 'total': 2, 'completion_rate': 0.5})
+        self.assertEqual([(row['id'], row['total']) for row in stats['boards'][0]['lists']], [(self.todo.pk, 1), (self.done.pk, 1)])
+
+    def test_recount_runs_after_workspace_lock(self):
+        # Đếm sau khi UPDATE version đã khóa dòng workspace -> 2 request cùng thêm thẻ vào 1 List chạy nối tiếp
+        with CaptureQueriesContext(connection) as queries:
+            self.call('post', '/api/cards/', {'list': self.todo.pk, 'title': 'First'})
+        sql = [query['sql'] for query in queries.captured_queries]
+        lock = next(i for i, statement in enumerate(sql) if statement.startswith('UPDATE "tasks_workspace"'))
+        count = next(i for i, statement in enumerate(sql) if statement.startswith('UPDATE "tasks_list" SET "todo_count"'))
+        self.assertLess(lock, count)
+        self.assertCounters((1, 0, 0), (0, 0, 0))
+
+    def test_personal_board_lists_are_locked_before_recount(self):
+        personal = List.objects.create(board=Board.objects.create(name='Mine', owner=self.user), title='Mine', order=0)
+        with mock.patch('tasks.changes.recount_lists', wraps=recount_lists) as recount:
+            self.call('post', '/api/cards/', {'list': personal.pk, 'title': 'Solo'})
+        self.assertIn(mock.call({personal.pk}, lock=True), recount.call_args_list)
+        self.assertEqual(self.counters(personal), (1, 0, 0))
+
+    def test_list_save_keeps_counters(self):
+        stale = List.objects.get(pk=self.todo.pk)  # Nạp trước khi có thẻ (vd request PATCH List chạy song song)
+        self.call('post', '/api/cards/', {'list': self.todo.pk, 'title': 'First'})
+        stale.title = 'Renamed'
+        stale.save()
+        self.call('put', f'/api/lists/{self.todo.pk}/', {'board': self.todo.board_id, 'title': 'Again', 'order': 0, 'todo_count': 9})
+        self.assertCounters((1, 0, 0), (0, 0, 0))
+        self.assertEqual(List.objects.get(pk=self.todo.pk).title, 'Again')
+
+    def test_repair_counters_fixes_drift(self):
+        Card.objects.create(list=self.todo, title='A', order=0)
+        Card.objects.create(list=self.todo, title='B', order=1, status='CANCELLED')
+        Card.objects.create(list=self.done, title='C', order=0, status='DONE')
+        # Lệch: ghi thẳng vào DB không qua đường ghi nào
+        List.objects.filter(pk=self.todo.pk).update(todo_count=7, cancelled_count=0)
+        List.objects.filter(pk=self.done.pk).update(done_count=0)
+        untouched = List.objects.create(board=self.todo.board, title='Empty', order=2)
+
+        out = io.StringIO()
+        call_command('repair_counters', '--dry-run', stdout=out)
+        self.assertIn('2 List bị lệch', out.getvalue())
+        self.assertEqual(self.counters(self.todo), (7, 0, 0))  # --dry-run không sửa
+
+        out = io.StringIO()
+        call_command('repair_counters', '--batch-size', '1', stdout=out)
+        self.assertIn('Đã kiểm tra 3 List, 2 List đã sửa', out.getvalue())
+        self.assertCounters((1, 0, 1), (0, 1, 0))
+        self.assertEqual(self.counters(untouched), (0, 0, 0))
+
+        out = io.StringIO()
+        call_command('repair_counters', stdout=out)
+        self.assertIn('0 List đã sửa', out.getvalue())
+
+
+# ===================== ĐO HIỆU NĂNG (tasks/metrics.py) ===================== #
+PROMETHEUS_SAMPLE = re.compile(r'^(?P<name>[a-z_]+)(\{(?P<labels>[^}]*)\})? (?P<value>-?[0-9.e+]+)$')
+
+
+def parse_prometheus(text):
+    # -> ({tên: kiểu}, [(tên, {nhãn: giá trị}, số)]); kiểm tra cú pháp từng dòng
+    types, samples = {}, []
+    for line in text.rstrip('\n').split('\n'):
+        if line.startswith('# HELP '):
+            continue
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            types[name] = kind
+            continue
+        match = PROMETHEUS_SAMPLE.match(line)
+        assert match, line
+        labels = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match['labels'] or ''))
+        samples.append((match['name'], labels, float(match['value'])))
+    return types, samples
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics_registry.reset()
+        self.user = User.objects.create_user('plain', 'plain@example.com', 'pass')
+        self.admin = User.objects.create_user('admin', 'admin@example.com', 'pass', is_staff=True)
+        self.client = APIClient()
+
+    def tearDown(self):
+        metrics_registry.reset()
+
+    def test_server_timing_header(self):
+        self.client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/workspaces/')
+        self.assertEqual(response.status_code, 200)
+        parts = dict(
+            (item.split(';')[0], dict(attr.split('=', 1) for attr in item.split(';')[1:]))
+            for item in response['Server-Timing'].split(', ')
+        )
+        self.assertEqual(list(parts), ['db', 'serialize', 'render', 'app', 'total'])
+        self.assertEqual(parts['db']['desc'], f'"{len(queries)} queries"')
+        durations = {name: float(attrs['dur']) for name, attrs in parts.items()}
+        self.assertGreaterEqual(durations['total'] + 0.2, sum(durations[name] for name in ('db', 'serialize', 'render', 'app')))
+        # Cả response lỗi cũng có header
+        self.assertIn('Server-Timing', self.client.get('/api/workspaces/999999/'))
+
+    def test_serialize_phase(self):
+        workspace = Workspace.objects.create(name='WS', owner=self.user)
+        Board.objects.create(name='Board', workspace=workspace, owner=self.user)
+        self.client.force_authenticate(self.user)
+        with mock.patch.object(RequestStats, 'serializing', autospec=True, side_effect=RequestStats.serializing) as timed:
+            response = self.client.get(f'/api/workspaces/{workspace.pk}/snapshot/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(timed.call_count, 1)  # Workspace -> Board lồng nhau
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+        # Chỉ lớp ngoài cùng được tính, trừ thời gian DB của truy vấn lười bên trong
+        stats = RequestStats(slow_ms=None, budget=None)
+        ticks = iter([0.0, 1.0, 10.0])  # Ngoài bắt đầu, trong bắt đầu, ngoài kết thúc
+        with mock.patch('tasks.metrics.time.perf_counter', side_effect=lambda: next(ticks)):
+            with stats.serializing():
+                with stats.serializing():
+                    stats.db_time += 4.0
+        self.assertEqual(stats.serialize_time, 6.0)
+
+    def test_metrics_endpoint_is_admin_only(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 401)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+
+    def test_prometheus_format(self):
+        self.client.force_authenticate(self.user)
+        for _ in range(3):
+            self.client.get('/api/workspaces/')
+        self.client.get('/api/workspaces/999999/')
+        self.client.force_authenticate(self.admin)
+        types, samples = parse_prometheus(self.client.get('/api/metrics/').content.decode())
+
+        self.assertEqual(types['task_api_request_duration_seconds'], 'histogram')
+        self.assertEqual(types['task_api_request_queries'], 'histogram')
+        self.assertEqual(types['task_api_requests_total'], 'counter')
+        requests = {
+            (labels['route'], labels['method'], labels['status']): value
+            for name, labels, value in samples if name == 'task_api_requests_total'
+        }
+        self.assertEqual(requests[('workspace-list', 'GET', '200')], 3)
+        self.assertEqual(requests[('workspace-detail', 'GET', '404')], 1)
+        for metric in Registry.HISTOGRAMS:
+            name = f'task_api_{metric}'
+            series = [(labels, value) for sample, labels, value in samples
+                      if sample == f'{name}_bucket' and labels['route'] == 'workspace-list']
+            counts = [value for _, value in series]
+            self.assertEqual(counts, sorted(counts), metric)  # Bucket cộng dồn
+            self.assertEqual(series[-1][0]['le'], '+Inf')
+            total = next(value for sample, labels, value in samples
+                         if sample == f'{name}_count' and labels['route'] == 'workspace-list')
+            self.assertEqual((series[-1][1], total), (3, 3))
+
+    def test_registry_escapes_labels_and_counts_budget(self):
+        stats = RequestStats(slow_ms=None, budget=1)
+        stats.queries = 2
+        metrics_registry.record('odd"route\\x', 'GET', 200, stats, 0.003)
+        text = metrics_registry.prometheus()
+        self.assertIn('task_api_requests_total{route="odd\\"route\\\\x",method="GET",status="200"} 1', text)
+        self.assertIn('task_api_query_budget_exceeded_total{route="odd\\"route\\\\x"} 1', text)
+        self.assertIn('task_api_request_queries_bucket{route="odd\\"route\\\\x",method="GET",le="1"} 0', text)
+        self.assertIn('task_api_request_queries_bucket{route="odd\\"route\\\\x",method="GET",le="2"} 1', text)
+        _, samples = parse_prometheus(text)
+        self.assertEqual(samples[0][1]['route'], 'odd\\"route\\\\x')
+
+    @override_settings(PERF_QUERY_BUDGET=0)
+    def test_over_budget_requests_are_logged(self):
+        client = APIClient()  # Middleware đọc settings khi được nạp
+        client.force_authenticate(self.user)
+        with self.assertLogs('tasks.metrics', 'WARNING') as logs:
+            client.get('/api/workspaces/')
+        self.assertIn('vượt ngân sách 0', logs.output[0])
+        self.assertIn('task_api_query_budget_exceeded_total{route="workspace-list"} 1', metrics_registry.prometheus())
+
+    @override_settings(PERF_METRICS_ENABLED=False)
+    def test_disabled_middleware_is_removed(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertNotIn('Server-Timing', client.get('/api/workspaces/'))
+
+
+# ===================== PHÂN QUYỀN THÀNH VIÊN ===================== #
+class MemberRoleTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('owner', 'owner@example.com', 'pass')
+        self.member = User.objects.create_user('member', 'member@example.com', 'pass')
+        self.workspace = Workspace.objects.create(name='WS', owner=self.owner)
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.owner, role='admin')
+        self.membership = WorkspaceMember.objects.create(workspace=self.workspace, user=self.member, role='member')
+        self.url = f'/api/workspaces/{self.workspace.pk}/update_member_role/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_unknown_roles_are_rejected(self):
+        for role in ('owner', 'system_admin', 'Admin', '', None, ['admin'], {'role': 'admin'}, 'x' * 50):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(self.url, {'user_id': self.member.pk, 'role': role}, format='json')
+            self.assertEqual(response.status_code, 400, role)
+            self.assertIn('error', response.json())
+        self.membership.refresh_from_db()
+        self.assertEqual(self.membership.role, 'member')
+        self.assertFalse(Activity.objects.filter(verb='member_role_changed').exists())
+
+    def test_known_roles_are_saved(self):
+        for role in ('admin', 'member'):
+            response = self.client.post(self.url, {'user_id': self.member.pk, 'role': role}, format='json')
+            self.assertEqual(response.status_code, 200, response.content)
+            self.membership.refresh_from_db()
+            self.assertEqual(self.membership.role, role)
@@ -0,0 +1,280 @@
+import csv
+import json
+from itertools import islice
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils.dateparse import parse_date, parse_datetime
+from .models import Workspace, WorkspaceMember, Board, List, Card, Label
+from .labels import CardLabel
+from .counters import recount_lists
+from .search import index_cards
+from .auth import invalidate_users
+from .bulk import create_rows
+from .changes import collect
+
+# ===================== XUẤT / NHẬP WORKSPACE ===================== #
+# Xuất dạng stream: GET /api/workspaces/{id}/export/?format=ndjson|csv hoặc `manage.py export_workspace`.
+# Đọc bằng QuerySet.iterator(chunk_size) + .values() -> bộ nhớ không tăng theo kích thước workspace.
+#   - ndjson: mỗi dòng 1 bản ghi {"type": ...} theo thứ tự cha trước con:
+#     workspace, member, label, board, list, card (card.labels = id nhãn trong file).
+#     Người dùng ghi bằng username (id không có nghĩa ở DB khác).
+#   - csv: mỗi dòng 1 thẻ kèm tên Board / List (mở bằng bảng tính, không nhập lại được).
+# Nhập: `manage.py import_workspace <file>` đọc ndjson từng dòng, ghi theo lô bulk_create, mỗi lô 1 transaction
+# (DB không trả id sau bulk_create như SQL Server -> chèn từng dòng, xem tasks/bulk.py).
+# Luôn tạo workspace MỚI (người nhập là owner); id cũ -> id mới qua bảng ánh xạ Board/List/nhãn
+# (thẻ không được tham chiếu -> không giữ id thẻ trong bộ nhớ).
+
+FORMAT_VERSION = 1
+CHUNK_SIZE = 2000
+CARD_FIELDS = (
+    'id', 'list_id', 'title', 'description', 'due_date', 'order', 'status', 'is_archived', 'archived_at',
+    'is_deleted', 'deleted_at', 'created_at', 'created_by__username',
+)
+CSV_HEADER = (
+    'board_id', 'board', 'list_id', 'list', 'card_id', 'title', 'description', 'status', 'due_date', 'order',
+    'labels', 'is_archived', 'is_deleted', 'created_by', 'created_at',
+)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def card_chunks(workspace, chunk_size=CHUNK_SIZE):
+    # Thẻ theo lô kèm id nhãn: 1 truy vấn nhãn mỗi lô (không N+1, không prefetch toàn bộ)
+    cards = (
+        Card.objects.filter(list__board__workspace=workspace).order_by('id')
+        .values(*CARD_FIELDS).iterator(chunk_size=chunk_size)
+    )
+    for chunk in chunked(cards, chunk_size):
+        labels = {}
+        for card_id, label_id in CardLabel.objects.filter(
+            card_id__in=[card['id'] for card in chunk]
+        ).order_by('card_id', 'label_id').values_list('card_id', 'label_id'):
+            labels.setdefault(card_id, []).append(label_id)
+        for card in chunk:
+            card['labels'] = labels.get(card['id'], [])
+        yield chunk
+
+
+def export_records(workspace, chunk_size=CHUNK_SIZE):
+    yield {
+        'type': 'workspace', 'format': FORMAT_VERSION, 'id': workspace.pk, 'name': workspace.name,
+        'description': workspace.description, 'owner': workspace.owner.username if workspace.owner else None,
+    }
+    members = WorkspaceMember.objects.filter(workspace=workspace).order_by('id')
+    for row in members.values('user__username', 'user__email', 'role').iterator(chunk_size=chunk_size):
+        yield {'type': 'member', 'username': row['user__username'], 'email': row['user__email'], 'role': row['role']}
+    for row in Label.objects.filter(workspace=workspace).order_by('id').values('id', 'name').iterator(chunk_size=chunk_size):
+        yield {'type': 'label', **row}
+    boards = Board.objects.filter(workspace=workspace).order_by('id')
+    for row in boards.values('id', 'name', 'owner__username').iterator(chunk_size=chunk_size):
+        yield {'type': 'board', 'id': row['id'], 'name': row['name'], 'owner': row['owner__username']}
+    lists = List.objects.filter(board__workspace=workspace).order_by('board_id', 'order', 'id')
+    for row in lists.values('id', 'board_id', 'title', 'order').iterator(chunk_size=chunk_size):
+        yield {'type': 'list', 'id': row['id'], 'board': row['board_id'], 'title': row['title'], 'order': row['order']}
+    for chunk in card_chunks(workspace, chunk_size):
+        for card in chunk:
+            yield {
+                'type': 'card', 'id': card['id'], 'list': card['list_id'], 'title': card['title'],
+                'description': card['description'], 'due_date': card['due_date'], 'order': card['order'],
+                'status': card['status'], 'is_archived': card['is_archived'], 'archived_at': card['archived_at'],
+                'is_deleted': card['is_deleted'], 'deleted_at': card['deleted_at'], 'created_at': card['created_at'],
+                'created_by': card['created_by__username'], 'labels': card['labels'],
+            }
+
+
+def ndjson_lines(records):
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for record in records:
+        yield (encoder.encode(record) + '\n').encode('utf-8')
+
+
+class Echo:
+    # csv.writer ghi vào đây -> trả lại dòng vừa ghi (mẫu streaming CSV của Django)
+    def write(self, value):
+        return value
+
+
+def csv_lines(workspace, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(Echo())
+    yield '\ufeff'.encode('utf-8') + writer.writerow(CSV_HEADER).encode('utf-8')  # BOM: Excel đọc đúng UTF-8
+    lists = {
+        row['id']: row for row in
+        List.objects.filter(board__workspace=workspace).values('id', 'title', 'board_id', 'board__name')
+    }
+    labels = dict(Label.objects.filter(workspace=workspace).values_list('id', 'name'))
+    for chunk in card_chunks(workspace, chunk_size):
+        yield ''.join(
+            writer.writerow((
+                lists[card['list_id']]['board_id'], lists[card['list_id']]['board__name'], card['list_id'],
+                lists[card['list_id']]['title'], card['id'], card['title'], card['description'] or '',
+                card['status'], card['due_date'] or '', card['order'],
+                ', '.join(labels[label_id] for label_id in card['labels'] if label_id in labels),
+                card['is_archived'], card['is_deleted'], card['created_by__username'] or '',
+                card['created_at'].isoformat(),
+            ))
+            for card in chunk
+        ).encode('utf-8')
+
+
+# ===================== NHẬP ===================== #
+class WorkspaceImporter:
+    # Nhận bản ghi ndjson theo thứ tự của export_records; gom cùng loại thành lô rồi ghi bằng bulk_create.
+    # Lô được ghi khi đủ chunk_size hoặc khi loại bản ghi đổi (cha phải có id mới trước khi ghi con).
+    ORDER = ('workspace', 'member', 'label', 'board', 'list', 'card')
+
+    def __init__(self, owner, chunk_size=CHUNK_SIZE):
+        self.owner = owner
+        self.chunk_size = chunk_size
+        self.workspace = None
+        self.boards, self.lists, self.labels = {}, {}, {}  # id cũ -> id mới
+        self.users = {}  # username -> id (None: không có ở DB này)
+        self.counts = dict.fromkeys(self.ORDER, 0)
+        self.skipped_members = 0
+        self.kind, self.buffer = None, []
+
+    def feed(self, record, line=None):
+        kind = record.get('type') if isinstance(record, dict) else None
+        if kind not in self.ORDER:
+            raise ValueError(f"Dòng {line}: loại bản ghi không hợp lệ ({kind!r}).")
+        if self.ORDER.index(kind) < self.ORDER.index(self.kind or 'workspace'):
+            raise ValueError(f"Dòng {line}: bản ghi {kind} đứng sau {self.kind} (file phải theo thứ tự của export).")
+        if kind == 'workspace':
+            if self.workspace is not None:
+                raise ValueError(f"Dòng {line}: file chỉ được có 1 workspace.")
+            if record.get('format') != FORMAT_VERSION:
+                raise ValueError(f"Dòng {line}: định dạng {record.get('format')!r} không được hỗ trợ.")
+            self.create_workspace(record)
+            return
+        if self.workspace is None:
+            raise ValueError(f"Dòng {line}: thiếu bản ghi workspace ở đầu file.")
+        if kind != self.kind or len(self.buffer) >= self.chunk_size:
+            self.flush()
+        self.kind = kind
+        self.buffer.append((line, record))
+
+    def finish(self):
+        self.flush()
+        if self.workspace is None:
+            raise ValueError("File rỗng: không có bản ghi workspace.")
+        # bulk_create không phát signal -> tự tính bộ đếm List (thẻ đã index theo từng lô)
+        recount_lists(list(self.lists.values()))
+        return self.workspace
+
+    @transaction.atomic
+    def create_workspace(self, record):
+        self.workspace = Workspace.objects.create(
+            name=record.get('name') or 'Workspace', description=record.get('description'), owner=self.owner,
+        )
+        WorkspaceMember.objects.create(workspace=self.workspace, user=self.owner, role='admin')
+        self.kind = 'workspace'
+        self.counts['workspace'] = 1
+
+    def flush(self):
+        if not self.buffer:
+            return
+        # collect(): đường chèn từng dòng (tasks/bulk.py) phát signal -> gom lại, flush 1 lần mỗi lô
+        with transaction.atomic(), collect():
+            getattr(self, f'import_{self.kind}s')(self.buffer)
+        self.counts[self.kind] += len(self.buffer)
+        self.buffer = []
+
+    def user_ids(self, usernames):
+        missing = {name for name in usernames if name and name not in self.users}
+        if missing:
+            found = dict(User.objects.filter(username__in=missing).values_list('username', 'id'))
+            self.users.update((name, found.get(name)) for name in missing)
+        return self.users
+
+    def parent(self, mapping, old_id, kind, line):
+        try:
+            return mapping[old_id]
+        except (KeyError, TypeError):
+            raise ValueError(f"Dòng {line}: {kind} {old_id!r} không có trong file.")
+
+    def import_members(self, rows):
+        users = self.user_ids(record.get('username') for _, record in rows)
+        members = [
+            WorkspaceMember(workspace=self.workspace, user_id=users[record['username']],
+                            role='admin' if record.get('role') == 'admin' else 'member')
+            for _, record in rows
+            if users.get(record.get('username')) and users[record['username']] != self.owner.pk
+        ]
+        self.skipped_members += sum(1 for _, record in rows if not users.get(record.get('username')))
+        if connection.features.supports_ignore_conflicts:
+            WorkspaceMember.objects.bulk_create(members, ignore_conflicts=True)
+        else:
+            # SQL Server: không có ignore_conflicts -> bỏ trước user đã là thành viên / trùng trong file
+            existing = set(WorkspaceMember.objects.filter(workspace=self.workspace).values_list('user_id', flat=True))
+            fresh = []
+            for member in members:
+                if member.user_id not in existing:
+                    existing.add(member.user_id)
+                    fresh.append(member)
+            members = WorkspaceMember.objects.bulk_create(fresh)
+        invalidate_users(member.user_id for member in members)  # bulk_create không phát signal
+
+    def import_labels(self, rows):
+        labels = create_rows(Label, (Label(workspace=self.workspace, name=record['name']) for _, record in rows))
+        self.labels.update((record['id'], label.pk) for (_, record), label in zip(rows, labels))
+
+    def import_boards(self, rows):
+        users = self.user_ids(record.get('owner') for _, record in rows)
+        boards = create_rows(Board, (
+            Board(workspace=self.workspace, name=record['name'], owner_id=users.get(record.get('owner')) or self.owner.pk)
+            for _, record in rows
+        ))
+        self.boards.update((record['id'], board.pk) for (_, record), board in zip(rows, boards))
+
+    def import_lists(self, rows):
+        lists = create_rows(List, (
+            List(board_id=self.parent(self.boards, record.get('board'), 'Board', line),
+                 title=record['title'], order=record.get('order') or 0)
+            for line, record in rows
+        ))
+        self.lists.update((record['id'], board_list.pk) for (_, record), board_list in zip(rows, lists))
+
+    def import_cards(self, rows):
+        users = self.user_ids(record.get('created_by') for _, record in rows)
+        cards = create_rows(Card, (
+            Card(
+                list_id=self.parent(self.lists, record.get('list'), 'List', line), title=record['title'],
+                description=record.get('description'), due_date=parse_date(record['due_date']) if record.get('due_date') else None,
+                order=record.get('order') or 0, status=record.get('status') or 'TODO',
+                created_by_id=users.get(record.get('created_by')),
+                is_archived=bool(record.get('is_archived')),
+                archived_at=parse_datetime(record['archived_at']) if record.get('archived_at') else None,
+                is_deleted=bool(record.get('is_deleted')),
+                deleted_at=parse_datetime(record['deleted_at']) if record.get('deleted_at') else None,
+            )
+            for line, record in rows
+        ))
+        CardLabel.objects.bulk_create(
+            CardLabel(card_id=card.pk, label_id=self.parent(self.labels, label_id, 'Nhãn', line))
+            for (line, record), card in zip(rows, cards) for label_id in record.get('labels') or ()
+        )
+        index_cards([card.pk for card in cards])
+
+
+def import_lines(lines, owner, chunk_size=CHUNK_SIZE):
+    # lines: iterable các dòng ndjson (bytes hoặc str). Lỗi giữa chừng -> xóa workspace đang nhập dở.
+    importer = WorkspaceImporter(owner, chunk_size)
+    try:
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                raise ValueError(f"Dòng {number}: JSON không hợp lệ.")
+            importer.feed(record, number)
+        importer.finish()
+    except Exception:
+        if importer.workspace is not None:
+            Workspace.objects.filter(pk=importer.workspace.pk).delete()
+        raise
+    return importer
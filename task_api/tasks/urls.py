@@ -11,7 +11,11 @@ from .views import (
     CardViewSet, 
     UserViewSet, 
     RegisterView, 
-    LoginView
+    LoginView,
+    SyncView,
+    CacheStatsView,
+    MetricsView,
+    event_stream,
 )
 
 router = DefaultRouter()
@@ -31,5 +35,10 @@ urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     # path('login/', LoginView.as_view(), name='login'), # Bạn có thể dùng cái này hoặc token/ ở trên
     
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('events/', event_stream, name='events'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache_stats'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,17 +1,223 @@
+import datetime
+import functools
+import hashlib
+from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
-from django.db.models import Q 
-from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Q, Prefetch, Count, Value
+from django.db.models.functions import Coalesce
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.conf import settings
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_date
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
 from rest_framework import viewsets, permissions, generics, status
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
 from rest_framework.serializers import ModelSerializer
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
-from .models import Workspace, Board, List, Card, WorkspaceMember
-from .serializers import WorkspaceSerializer, BoardSerializer, ListSerializer, CardSerializer, WorkspaceMemberSerializer
+from rest_framework.exceptions import ValidationError, PermissionDenied, AuthenticationFailed, NotFound
+from rest_framework_simplejwt.exceptions import InvalidToken
+from .models import Workspace, Board, List, Card, WorkspaceMember, Activity, overdue_condition
+from .serializers import (
+    WorkspaceSerializer, BoardSerializer, ListSerializer, CardSerializer, WorkspaceMemberSerializer,
+    BoardSnapshotSerializer, WorkspaceSnapshotSerializer, CardMoveBatchSerializer, ListMoveBatchSerializer,
+    CardBatchSerializer, ActivitySerializer,
+)
+from .permissions import visible_workspaces, board_scope, with_user_role, workspace_role
+from .pagination import KeysetPagination
+from .retention import archive_deadline
+from .ordering import apply_moves, next_order
+from .batch import run_card_batch
+from .changes import collect, touch_boards, touch_lists, touch_cards
+from .sync import build_sync
+from .realtime import stream_events, workspace_channel, board_channel, members_channel
+from .labels import parse_label_names, label_filter, count_by_label, relabel_moved
+from .search import search_cards, query_terms
+from .counters import workspace_stats
+from .cache import response_key, get_response_data, set_response_data, cache_stats
+from .rows import card_values, card_rows, list_rows
+from .renderers import FastJSONRenderer, NDJSONRenderer, CSVRenderer
+from .transfer import export_records, ndjson_lines, csv_lines
+from .metrics import registry as metrics_registry, serializing
+from .notifications import notify_member_added
+from .activity import recording, record
+from .auth import CachedJWTAuthentication
+
+def prefetch_snapshot(boards):
+    # Snapshot = 3 truy vấn cố định (boards, lists, cards) dù board có bao nhiêu list/thẻ
+    active_cards = Card.objects.active().with_overdue().order_by('order', 'id').prefetch_related('labels')
+    lists = List.objects.order_by('order', 'id').prefetch_related(
+        Prefetch('cards', queryset=active_cards, to_attr='active_cards')
+    )
+    return boards.prefetch_related(Prefetch('lists', queryset=lists, to_attr='ordered_lists'))
+
+# ===================== QUERY PARAMS ===================== #
+def int_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValidationError({name: "Giá trị phải là số nguyên."})
+    if not -2 ** 63 <= number < 2 ** 63:
+        # Vượt BIGINT -> DB báo lỗi (500) thay vì "không có kết quả"
+        raise ValidationError({name: "Giá trị nằm ngoài phạm vi cho phép."})
+    return number
+
+def date_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: "Ngày không hợp lệ (định dạng YYYY-MM-DD)."})
+    return parsed
+
+def bool_param(request, name):
+    value = request.query_params.get(name)
+    if not value:
+        return None
+    if value.lower() in ('true', '1'):
+        return True
+    if value.lower() in ('false', '0'):
+        return False
+    raise ValidationError({name: "Giá trị phải là true hoặc false."})
+
+def ensure_visible(queryset, obj, message):
+    # Không cho tạo/chuyển dữ liệu vào workspace mà user không thuộc về
+    if obj is not None and not queryset.filter(pk=obj.pk).exists():
+        raise PermissionDenied(message)
+
+def move_items(moves, items, parents, siblings, parent_field, actor=None):
+    # moves: [{'id', parent_field, 'index'}] đã validate; items/parents: queryset trong phạm vi user
+    model = siblings.model
+    with transaction.atomic():
+        item_ids = set(items.filter(pk__in={m['id'] for m in moves}).values_list('pk', flat=True))
+        missing = {m['id'] for m in moves} - item_ids
+        if missing:
+            # Ngoài phạm vi của user = không tồn tại (không để lộ id của workspace khác)
+            raise NotFound({'moves': f"Không tìm thấy: {sorted(missing)}"})
+        locked = model.objects.select_for_update().in_bulk(item_ids)
+
+        wanted = {m.get(parent_field) or getattr(locked[m['id']], f'{parent_field}_id') for m in moves}
+        allowed = set(parents.filter(pk__in=wanted).values_list('pk', flat=True))
+        if wanted - allowed:
+            raise PermissionDenied(f"Không có quyền với {parent_field}: {sorted(wanted - allowed)}")
+
+        plan = [
+            (locked[m['id']], m.get(parent_field) or getattr(locked[m['id']], f'{parent_field}_id'), m['index'])
+            for m in moves
+        ]
+        old_parents = {obj.pk: getattr(obj, f'{parent_field}_id') for obj in locked.values()}
+        changed, rebalanced = apply_moves(plan, siblings, parent_field)
+        now = timezone.now()
+        for obj in changed:
+            obj.updated_at = now  # bulk_update bỏ qua auto_now
+        model.objects.bulk_update(changed, [parent_field, 'order', 'updated_at'])
+        # bulk_update không phát signal -> tự báo thay đổi (kèm cha cũ của đối tượng bị chuyển đi)
+        if model is Card:
+            touch_cards(changed, old_lists=old_parents)
+            for obj, _, _ in plan:  # Chỉ thẻ được kéo thả, không tính thẻ bị đánh số lại
+                record('card_moved', actor, card=obj, from_list=old_parents[obj.pk], to_list=obj.list_id)
+            relabel_moved([obj for obj in changed if obj.list_id != old_parents.get(obj.pk, obj.list_id)])
+        else:
+            touch_lists(changed, old_boards=old_parents)
+    return Response({
+        'moved': [{'id': obj.pk, parent_field: getattr(obj, f'{parent_field}_id'), 'order': obj.order} for obj in changed],
+        'rebalanced': sorted(rebalanced),
+    })
+
+# ===================== GHI / ĐỌC CÓ ĐIỀU KIỆN ===================== #
+class ChangeTrackingMixin:
+    # Mỗi request ghi chạy trong 1 transaction; version của các workspace bị ảnh hưởng
+    # chỉ tăng 1 lần ở cuối request (xem tasks/changes.py). Lỗi 4xx/5xx -> rollback.
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in permissions.SAFE_METHODS:
+            return super().dispatch(request, *args, **kwargs)
+        with transaction.atomic():
+            # Nhật ký hoạt động của request được ghi 1 lần khi commit (tasks/activity.py)
+            with collect(), recording():
+                response = super().dispatch(request, *args, **kwargs)
+            if response.status_code >= 400:
+                transaction.set_rollback(True)
+        return response
+
+class FastReadMixin:
+    # Danh sách (list) dựng bằng tasks/rows.py và render bằng orjson (tasks/renderers.py)
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.action != 'list':
+            return renderers
+        return [FastJSONRenderer() if type(renderer) is JSONRenderer else renderer for renderer in renderers]
+
+def conditional_response(request, workspace_id, render, per_user=False):
+    # ETag/Last-Modified theo version của workspace: dữ liệu không đổi -> 304, không serialize gì.
+    # Đổi version -> đổi cả khóa cache đọc (tasks/cache.py)
+    state = None
+    if workspace_id:
+        state = (
+            with_user_role(visible_workspaces(request.user).filter(pk=workspace_id), request.user)
+            .values_list('version', 'changed_at', 'current_user_role').first()
+        )
+    if state is None:
+        return render()
+    version, changed_at, role = state
+    # ETag riêng cho từng URL (kể cả query string), từng user và từng ngày: is_overdue, lịch,
+    # bảng quá hạn đổi theo ngày dù workspace không đổi -> sang ngày mới client phải tải lại
+    today = timezone.localdate()
+    url_hash = hashlib.md5(request.get_full_path().encode()).hexdigest()[:8]
+    etag = quote_etag(f"w{workspace_id}-v{version}-u{request.user.pk}-d{today:%Y%m%d}-{url_hash}")
+    start_of_day = timezone.make_aware(datetime.datetime.combine(today, datetime.time.min))
+    last_modified = int(max(changed_at, start_of_day).timestamp())
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    response = not_modified or cached_render(request, workspace_id, version, changed_at,
+                                             f'u{request.user.pk}' if per_user else f'r{role}', render, today)
+    if response.status_code in (200, 304):
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'  # Trình duyệt luôn hỏi lại bằng If-None-Match
+    return response
+
+def cached_render(request, workspace_id, version, changed_at, scope, render, today):
+    # Response giống nhau cho mọi user cùng vai trò trong workspace -> dùng chung 1 mục cache
+    # URL tuyệt đối (kèm host): response.data chứa link `next` tuyệt đối
+    key = response_key(workspace_id, version, changed_at, scope, request.build_absolute_uri(), today)
+    data = get_response_data(key)
+    if data is not None:
+        return Response(data)
+    response = render()
+    if response.status_code == 200 and isinstance(response, Response):
+        set_response_data(key, response.data)
+    return response
+
+def conditional_on_workspace(get_workspace_id, per_user=False):
+    # get_workspace_id(view, request, kwargs) -> id workspace quyết định nội dung response.
+    # per_user=True: nội dung phụ thuộc chính user (không chỉ vai trò) -> cache riêng từng user
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            workspace_id = get_workspace_id(self, request, kwargs)
+            return conditional_response(request, workspace_id, lambda: method(self, request, *args, **kwargs), per_user)
+        return wrapper
+    return decorator
+
+def pk_from_url(view, request, kwargs):
+    try:
+        return int(kwargs.get('pk'))
+    except (TypeError, ValueError):
+        return None
+
+def workspace_from_query(view, request, kwargs):
+    return int_param(request, 'workspace')
 
 # ===================== USER AUTH ===================== #
 class RegisterSerializer(ModelSerializer):
@@ -43,12 +249,21 @@ class LoginView(generics.GenericAPIView):
         return Response({"error": "Sai tên đăng nhập hoặc mật khẩu!"}, status=status.HTTP_400_BAD_REQUEST)
 
 # ===================== WORKSPACE ===================== #
-class WorkspaceViewSet(viewsets.ModelViewSet):
+class WorkspaceViewSet(ChangeTrackingMixin, viewsets.ModelViewSet):
     serializer_class = WorkspaceSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_keyset_ordering(self):
+        if self.action == 'trash':
+            return ('-deleted_at', '-id')
+        if self.action == 'activity':
+            return ('-id',)
+        return ('id',)
 
     def get_queryset(self):
-        return Workspace.objects.filter(is_deleted=False)
+        user = self.request.user
+        return with_user_role(visible_workspaces(user), user).prefetch_related('members')
 
     def perform_create(self, serializer):
         user = self.request.user
@@ -58,32 +273,38 @@ class WorkspaceViewSet(viewsets.ModelViewSet):
     def destroy(self, request, *args, **kwargs):
         workspace = self.get_object()
         user = request.user
-        if user.is_superuser or workspace.owner == user:
+        if user.is_superuser or workspace.owner_id == user.pk:
             workspace.is_deleted = True
             workspace.deleted_at = timezone.now()
             workspace.save()
+            record('workspace_deleted', user, workspace_id=workspace.pk, name=workspace.name)
             return Response({"message": "Đã chuyển vào thùng rác"}, status=204)
         else:
             return Response({"error": "Chỉ người tạo mới được xóa Workspace này!"}, status=403)
 
+    @conditional_on_workspace(pk_from_url)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(detail=True, methods=['get'])
+    @conditional_on_workspace(pk_from_url)
     def members(self, request, pk=None):
         workspace = self.get_object()
-        members = WorkspaceMember.objects.filter(workspace=workspace)
+        members = WorkspaceMember.objects.filter(workspace=workspace).select_related('user')  # username/email
         serializer = WorkspaceMemberSerializer(members, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    @conditional_on_workspace(pk_from_url)
+    def stats(self, request, pk=None):
+        # Số thẻ theo trạng thái mỗi List, tỉ lệ hoàn thành mỗi Board, thành viên theo vai trò
+        return Response(workspace_stats(self.get_object()))
+
     @action(detail=True, methods=['post'])
     def add_member(self, request, pk=None):
         workspace = self.get_object()
         user = request.user
-        is_authorized = False
-        if user.is_superuser or workspace.owner == user:
-            is_authorized = True
-        elif WorkspaceMember.objects.filter(workspace=workspace, user=user, role='admin').exists():
-            is_authorized = True
-
-        if not is_authorized:
+        if workspace_role(user, workspace) not in ('system_admin', 'owner', 'admin'):
             return Response({"error": "Bạn không có quyền thêm thành viên"}, status=403)
 
         email = request.data.get('email')
@@ -91,7 +312,10 @@ class WorkspaceViewSet(viewsets.ModelViewSet):
             user_to_add = User.objects.get(email=email)
             if WorkspaceMember.objects.filter(workspace=workspace, user=user_to_add).exists():
                 return Response({"error": "Người này đã là thành viên!"}, status=400)
-            WorkspaceMember.objects.create(workspace=workspace, user=user_to_add, role='member')
+            # Email gửi sau bởi `manage.py send_notifications`; hàng đợi ghi cùng transaction
+            with transaction.atomic():
+                WorkspaceMember.objects.create(workspace=workspace, user=user_to_add, role='member')
+                notify_member_added(user_to_add, workspace, user)
             return Response({"message": "Đã thêm thành viên!"})
         except User.DoesNotExist:
             return Response({"error": "Email không tồn tại!"}, status=404)
@@ -100,17 +324,11 @@ class WorkspaceViewSet(viewsets.ModelViewSet):
     def remove_member(self, request, pk=None):
         workspace = self.get_object()
         user = request.user
-        is_authorized = False
-        if user.is_superuser or workspace.owner == user:
-            is_authorized = True
-        elif WorkspaceMember.objects.filter(workspace=workspace, user=user, role='admin').exists():
-            is_authorized = True
-
-        if not is_authorized:
+        if workspace_role(user, workspace) not in ('system_admin', 'owner', 'admin'):
             return Response({"error": "Bạn không có quyền xóa thành viên"}, status=403)
 
         target_user_id = request.data.get('user_id')
-        if workspace.owner and target_user_id == workspace.owner.id:
+        if workspace.owner_id and target_user_id == workspace.owner_id:
              return Response({"error": "Không thể xóa chủ sở hữu!"}, status=400)
 
         WorkspaceMember.objects.filter(workspace=workspace, user_id=target_user_id).delete()
@@ -120,18 +338,23 @@ class WorkspaceViewSet(viewsets.ModelViewSet):
     def update_member_role(self, request, pk=None):
         workspace = self.get_object()
         user = request.user
-        if not (user.is_superuser or workspace.owner == user):
+        if workspace_role(user, workspace) not in ('system_admin', 'owner'):
             return Response({"error": "Chỉ chủ sở hữu mới được phân quyền!"}, status=403)
 
         target_user_id = request.data.get('user_id')
         new_role = request.data.get('role')
         if target_user_id == user.id:
              return Response({"error": "Không thể tự đổi quyền của chính mình!"}, status=400)
+        roles = dict(WorkspaceMember.ROLE_CHOICES)
+        if not isinstance(new_role, str) or new_role not in roles:
+            return Response({"error": f"Vai trò không hợp lệ! Chỉ chấp nhận: {', '.join(roles)}."}, status=400)
 
         try:
             member = WorkspaceMember.objects.get(workspace=workspace, user_id=target_user_id)
+            old_role = member.role
             member.role = new_role
             member.save()
+            record('member_role_changed', user, workspace_id=workspace.pk, user_id=member.user_id, old_role=old_role, new_role=new_role)
             return Response({"message": f"Đã cập nhật quyền thành {new_role}!"})
         except WorkspaceMember.DoesNotExist:
             return Response({"error": "Thành viên không tồn tại"}, status=404)
@@ -139,53 +362,350 @@ class WorkspaceViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def trash(self, request):
         user = request.user
-        deleted = Workspace.objects.filter(
-            Q(owner=user) | Q(memberships__user=user, memberships__role='admin'),
-            is_deleted=True
-        ).distinct()
-        serializer = self.get_serializer(deleted, many=True)
-        return Response(serializer.data)
+        admin_of = WorkspaceMember.objects.filter(user=user, role='admin').values('workspace_id')
+        deleted = Workspace.objects.filter(Q(owner=user) | Q(pk__in=admin_of), is_deleted=True)
+        deleted = with_user_role(deleted, user).prefetch_related('members')
+        page = self.paginate_queryset(deleted)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post'])
     def restore(self, request, pk=None):
         try:
             ws = Workspace.objects.get(pk=pk, is_deleted=True)
-            if ws.owner != request.user and not request.user.is_superuser:
+            if ws.owner_id != request.user.pk and not request.user.is_superuser:
                  return Response({"error": "Không có quyền"}, status=403)
             ws.is_deleted = False
             ws.deleted_at = None
             ws.save()
+            record('workspace_restored', request.user, workspace_id=ws.pk, name=ws.name)
             return Response({"message": "Đã khôi phục"})
         except Workspace.DoesNotExist: return Response({"error": "Không tìm thấy"}, status=404)
 
+    # Nhật ký hoạt động của workspace, mới nhất trước (không cache: nhật ký ghi sau commit)
+    @action(detail=True, methods=['get'])
+    def activity(self, request, pk=None):
+        workspace = self.get_object()
+        feed = Activity.objects.filter(workspace_id=workspace.pk).select_related('actor')
+        page = self.paginate_queryset(feed)
+        return self.get_paginated_response(ActivitySerializer(page, many=True).data)
+
+    # Xuất toàn bộ workspace dạng stream (tasks/transfer.py): ?format=ndjson (mặc định, nhập lại được) | csv
+    @action(detail=True, methods=['get'], renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request, pk=None):
+        workspace = self.get_object()
+        renderer = request.accepted_renderer
+        if renderer.format == 'csv':
+            lines = csv_lines(workspace)
+        else:
+            lines = ndjson_lines(export_records(workspace))
+        response = StreamingHttpResponse(lines, content_type=f'{renderer.media_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="workspace-{workspace.pk}.{renderer.format}"'
+        return response
+
+    # Toàn bộ Workspace (boards -> lists -> cards) trong 1 request
+    @action(detail=True, methods=['get'])
+    @conditional_on_workspace(pk_from_url)
+    def snapshot(self, request, pk=None):
+        workspace = self.get_object()
+        workspace.snapshot_boards = list(prefetch_snapshot(workspace.boards.order_by('id')))
+        serializer = WorkspaceSnapshotSerializer(workspace, context=self.get_serializer_context())
+        return Response(serializer.data)
+
 
 # ===================== BOARD & LIST ===================== #
-class BoardViewSet(viewsets.ModelViewSet):
+class BoardViewSet(ChangeTrackingMixin, viewsets.ModelViewSet):
     queryset = Board.objects.all()
     serializer_class = BoardSerializer
     permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = Board.objects.filter(board_scope(self.request.user))
+        workspace_id = int_param(self.request, 'workspace')
+        if workspace_id: queryset = queryset.filter(workspace_id=workspace_id)
+        if self.action == 'snapshot':
+            queryset = prefetch_snapshot(queryset)
+        return queryset
+
     def perform_create(self, serializer):
+        ensure_visible(visible_workspaces(self.request.user), serializer.validated_data.get('workspace'),
+                       "Bạn không thuộc Workspace này!")
         serializer.save(owner=self.request.user)
 
-class ListViewSet(viewsets.ModelViewSet):
+    def perform_update(self, serializer):
+        ensure_visible(visible_workspaces(self.request.user), serializer.validated_data.get('workspace'),
+                       "Bạn không thuộc Workspace này!")
+        old_workspace_id = serializer.instance.workspace_id
+        board = serializer.save()
+        if board.workspace_id != old_workspace_id:
+            # Workspace cũ nhận tombstone của Board; workspace mới nhận cả List/thẻ bên trong
+            touch_boards([board], old_workspaces={board.pk: old_workspace_id})
+            touch_lists(board.lists.all())
+            touch_cards(Card.objects.filter(list__board=board))
+
+    def board_workspace_id(self, request, kwargs):
+        board_id = pk_from_url(self, request, kwargs)
+        if board_id is None:
+            return None
+        return Board.objects.filter(board_scope(request.user), pk=board_id).values_list('workspace_id', flat=True).first()
+
+    @conditional_on_workspace(workspace_from_query)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_on_workspace(board_workspace_id)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    # Board kèm lists (theo thứ tự) và các thẻ đang hoạt động
+    @action(detail=True, methods=['get'])
+    @conditional_on_workspace(board_workspace_id)
+    def snapshot(self, request, pk=None):
+        board = self.get_object()
+        return Response(BoardSnapshotSerializer(board, context=self.get_serializer_context()).data)
+
+class ListViewSet(FastReadMixin, ChangeTrackingMixin, viewsets.ModelViewSet):
     queryset = List.objects.all()
     serializer_class = ListSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        queryset = List.objects.filter(board_scope(self.request.user, 'board__'))
+        board_id = int_param(self.request, 'board')
+        if board_id: queryset = queryset.filter(board_id=board_id)
+        workspace_id = int_param(self.request, 'workspace')
+        if workspace_id: queryset = queryset.filter(board__workspace_id=workspace_id)
+        return queryset.order_by('order', 'id')
+
+    def visible_boards(self):
+        return Board.objects.filter(board_scope(self.request.user))
+
+    def perform_create(self, serializer):
+        board = serializer.validated_data.get('board')
+        ensure_visible(self.visible_boards(), board, "Bạn không có quyền với Board này!")
+        if 'order' not in serializer.validated_data:
+            # Thêm vào cuối Board, chừa khoảng trống để sắp xếp lại không phải ghi cả nhóm
+            serializer.save(order=next_order(List.objects.filter(board=board)))
+        else:
+            serializer.save()
+
+    def perform_update(self, serializer):
+        ensure_visible(self.visible_boards(), serializer.validated_data.get('board'), "Bạn không có quyền với Board này!")
+        old_board_id = serializer.instance.board_id
+        board_list = serializer.save()
+        if board_list.board_id != old_board_id:
+            touch_lists([board_list], old_boards={board_list.pk: old_board_id})
+            touch_cards(board_list.cards.all())
+
+    @conditional_on_workspace(workspace_from_query)
+    def list(self, request, *args, **kwargs):
+        with serializing():  # Truy vấn bên trong đã tính vào "db"
+            return Response(list_rows(self.filter_queryset(self.get_queryset())))
+
+    # Sắp xếp / chuyển nhiều List trong 1 transaction
+    @action(detail=False, methods=['post'])
+    def move(self, request):
+        batch = ListMoveBatchSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        return move_items(batch.validated_data['moves'], self.get_queryset(), self.visible_boards(),
+                          List.objects.all(), 'board')
+
 # ===================== CARD (LOGIC CHUẨN) ===================== #
-class CardViewSet(viewsets.ModelViewSet):
+class CardViewSet(FastReadMixin, ChangeTrackingMixin, viewsets.ModelViewSet):
     serializer_class = CardSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+
+    def get_keyset_ordering(self):
+        if self.action == 'trash':
+            return ('-deleted_at', '-id')
+        if self.action == 'activity':
+            return ('-id',)
+        if self.action == 'archived':
+            return ('-archived_at', '-id')
+        if self.ordering_param() == 'overdue':
+            # Quá hạn lên đầu, hạn cũ nhất trước; thẻ không có hạn xếp cuối (due_key không NULL)
+            return ('-overdue', 'due_key', 'id')
+        return ('order', 'id')
+
+    def ordering_param(self):
+        ordering = self.request.query_params.get('ordering')
+        if ordering not in (None, '', 'order', 'overdue'):
+            raise ValidationError({'ordering': "Chỉ hỗ trợ order hoặc overdue."})
+        return ordering
+
+    def scoped(self, queryset):
+        # Chỉ thẻ thuộc workspace mà user là thành viên (kèm nhãn: 1 truy vấn cho cả trang)
+        return queryset.filter(board_scope(self.request.user, 'list__board__')).prefetch_related('labels')
 
     def get_queryset(self):
         # Lấy thẻ đang hoạt động (Chưa xóa và Chưa cất kho)
-        queryset = Card.objects.filter(is_deleted=False, is_archived=False)
-        date_str = self.request.query_params.get('date')
-        if date_str: queryset = queryset.filter(due_date=date_str)
+        queryset = self.scoped(Card.objects.active().with_overdue())
+        if self.ordering_param() == 'overdue':
+            queryset = queryset.annotate(due_key=Coalesce('due_date', Value(datetime.date.max)))
+        return self.filter_params(queryset)
+
+    def filter_params(self, queryset):
+        request = self.request
+        list_id = int_param(request, 'list')
+        if list_id: queryset = queryset.filter(list_id=list_id)
+        board_id = int_param(request, 'board')
+        if board_id: queryset = queryset.filter(list__board_id=board_id)
+        workspace_id = int_param(request, 'workspace')
+        if workspace_id: queryset = queryset.filter(list__board__workspace_id=workspace_id)
+
+        status_value = request.query_params.get('status')
+        if status_value:
+            if status_value not in dict(Card.STATUS_CHOICES):
+                raise ValidationError({'status': "Trạng thái không hợp lệ."})
+            queryset = queryset.filter(status=status_value)
+        # ?label=A hoặc ?label=A,B: thẻ có ít nhất 1 nhãn trong danh sách (so khớp đúng tên)
+        try:
+            labels = parse_label_names(request.query_params.get('label'))
+        except ValueError as exc:
+            raise ValidationError({'label': str(exc)})
+        if labels: queryset = queryset.filter(label_filter(labels))
+
+        overdue = bool_param(request, 'overdue')
+        if overdue is True: queryset = queryset.filter(overdue_condition())
+        if overdue is False: queryset = queryset.exclude(overdue_condition())
+
+        due_date = date_param(request, 'date')
+        if due_date: queryset = queryset.filter(due_date=due_date)
+        # due_before / due_after: so sánh chặt (không bao gồm ngày truyền vào)
+        due_before = date_param(request, 'due_before')
+        if due_before: queryset = queryset.filter(due_date__lt=due_before)
+        due_after = date_param(request, 'due_after')
+        if due_after: queryset = queryset.filter(due_date__gt=due_after)
         return queryset
 
+    def visible_lists(self):
+        return List.objects.filter(board_scope(self.request.user, 'board__'))
+
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+        card_list = serializer.validated_data.get('list')
+        ensure_visible(self.visible_lists(), card_list, "Bạn không có quyền với List này!")
+        if 'order' not in serializer.validated_data:
+            active = Card.objects.filter(list=card_list, is_deleted=False, is_archived=False)
+            serializer.save(created_by=self.request.user, order=next_order(active))
+        else:
+            serializer.save(created_by=self.request.user)
+
+    def perform_update(self, serializer):
+        ensure_visible(self.visible_lists(), serializer.validated_data.get('list'), "Bạn không có quyền với List này!")
+        old_list_id = serializer.instance.list_id
+        card = serializer.save()
+        if card.list_id != old_list_id:
+            touch_cards([card], old_lists={card.pk: old_list_id})
+            record('card_moved', self.request.user, card=card, from_list=old_list_id, to_list=card.list_id)
+
+    @conditional_on_workspace(workspace_from_query)
+    def list(self, request, *args, **kwargs):
+        ordering = [field.lstrip('-') for field in self.get_keyset_ordering()]
+        page = self.paginate_queryset(card_values(self.filter_queryset(self.get_queryset()), ordering))
+        with serializing():
+            rows = card_rows(page)
+        return self.get_paginated_response(rows)
+
+    # Số thẻ đang hoạt động theo từng nhãn (cùng bộ lọc với danh sách thẻ)
+    @action(detail=False, methods=['get'])
+    @conditional_on_workspace(workspace_from_query)
+    def label_counts(self, request):
+        counts = count_by_label(self.get_queryset())
+        return Response([{'name': row['label__name'], 'count': row['count']} for row in counts])
+
+    # Lịch: thẻ theo ngày hết hạn trong [from, to] + số thẻ theo trạng thái mỗi ngày.
+    # Đếm bằng 1 truy vấn GROUP BY due_date (index card_active_due_idx), không nạp thẻ để đếm.
+    @action(detail=False, methods=['get'])
+    @conditional_on_workspace(workspace_from_query)
+    def calendar(self, request):
+        start, end = date_param(request, 'from'), date_param(request, 'to')
+        if start is None or end is None:
+            raise ValidationError({'from': "Cần cả ?from= và ?to=."})
+        if end < start:
+            raise ValidationError({'to': "Ngày kết thúc phải sau ngày bắt đầu."})
+        if (end - start).days >= settings.CALENDAR_MAX_DAYS:
+            raise ValidationError({'to': f"Tối đa {settings.CALENDAR_MAX_DAYS} ngày mỗi lần."})
+
+        cards = self.get_queryset().filter(due_date__gte=start, due_date__lte=end)
+        today = timezone.now().date()
+        counts = (
+            cards.order_by().values('due_date').annotate(
+                total=Count('id'),
+                todo=Count('id', filter=Q(status='TODO')),
+                done=Count('id', filter=Q(status='DONE')),
+                cancelled=Count('id', filter=Q(status='CANCELLED')),
+                overdue=Count('id', filter=overdue_condition(today)),
+            ).order_by('due_date')
+        )
+        days = {
+            row['due_date']: {'date': row.pop('due_date'), 'counts': row, 'cards': []}
+            for row in counts
+        }
+        rows = list(cards.order_by('due_date', 'order', 'id'))
+        for card, data in zip(rows, self.get_serializer(rows, many=True).data):
+            day = days.get(card.due_date)
+            if day is not None:  # Thẻ vừa tạo xen giữa 2 truy vấn: lần tải sau sẽ có
+                day['cards'].append(data)
+        return Response({'from': start, 'to': end, 'days': list(days.values())})
+
+    # Bảng quá hạn: tổng số, số thẻ do user tạo, theo từng workspace và các thẻ quá hạn lâu nhất.
+    # Chỉ quét khoảng due_date < hôm nay của card_active_due_status_idx -> không phụ thuộc tổng số thẻ
+    @action(detail=False, methods=['get'], url_path='overdue')
+    @conditional_on_workspace(workspace_from_query, per_user=True)
+    def overdue_dashboard(self, request):
+        today = timezone.now().date()
+        cards = self.filter_params(self.scoped(Card.objects.overdue(today)))
+        totals = cards.aggregate(total=Count('id'), mine=Count('id', filter=Q(created_by=request.user)))
+        by_workspace = (
+            cards.order_by().values('list__board__workspace_id', 'list__board__workspace__name')
+            .annotate(count=Count('id')).order_by('-count', 'list__board__workspace_id')
+        )
+        oldest = list(cards.with_overdue(today).order_by('due_date', 'id')[:self.paginator.get_page_size(request)])
+        return Response({
+            'today': today,
+            **totals,
+            'workspaces': [
+                {'workspace': row['list__board__workspace_id'], 'name': row['list__board__workspace__name'], 'count': row['count']}
+                for row in by_workspace
+            ],
+            'cards': self.get_serializer(oldest, many=True).data,
+        })
+
+    # Tìm kiếm toàn văn (title + description) trong các thẻ đang hoạt động, xếp theo độ liên quan
+    @action(detail=False, methods=['get'])
+    @conditional_on_workspace(workspace_from_query)
+    def search(self, request):
+        query = request.query_params.get('q', '')
+        if not query_terms(query):
+            raise ValidationError({'q': "Cần nhập từ khóa tìm kiếm."})
+        limit = self.paginator.get_page_size(request)
+        cards = search_cards(self.get_queryset(), query, limit)
+        results = self.get_serializer(cards, many=True).data
+        for card, data in zip(cards, results):
+            data['rank'] = card.rank
+        return Response({'query': query, 'results': results})
+
+    # Kéo thả: chuyển / sắp xếp nhiều thẻ trong 1 transaction (thường chỉ ghi 1 dòng mỗi thẻ)
+    @action(detail=False, methods=['post'])
+    def move(self, request):
+        batch = CardMoveBatchSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        active = Card.objects.filter(is_deleted=False, is_archived=False)
+        return move_items(
+            batch.validated_data['moves'], self.scoped(active), self.visible_lists(), active, 'list', request.user,
+        )
+
+    # Tạo / sửa / lưu trữ / xóa / khôi phục nhiều thẻ trong 1 request và 1 transaction
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        batch = CardBatchSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        ok, results = run_card_batch(
+            batch.validated_data['operations'], self.scoped(Card.objects.all()),
+            self.visible_lists(), self.get_serializer_context(),
+        )
+        return Response({'results': results}, status=200 if ok else 400)
 
     # 1. XÓA MỀM -> VÀO THÙNG RÁC (Lưu vĩnh viễn)
     @action(detail=True, methods=['post'])
@@ -195,26 +715,29 @@ class CardViewSet(viewsets.ModelViewSet):
         card.is_archived = False # Đảm bảo không nằm trong kho
         card.deleted_at = timezone.now()
         card.save()
+        record('card_deleted', request.user, card=card)
         return Response({"message": "Đã vào thùng rác (Lưu vĩnh viễn)"})
 
     # 2. XEM THÙNG RÁC (Chỉ hiện thẻ đã xóa)
     @action(detail=False, methods=['get'])
     def trash(self, request):
         # Không có logic xóa tự động ở đây
-        trash_cards = Card.objects.filter(is_deleted=True)
-        serializer = self.get_serializer(trash_cards, many=True)
-        return Response(serializer.data)
+        trash_cards = self.filter_params(self.scoped(Card.objects.filter(is_deleted=True)))
+        page = self.paginate_queryset(trash_cards)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     # 3. KHÔI PHỤC (Dùng chung cho cả Thùng rác và Kho)
     @action(detail=True, methods=['post'])
     def restore(self, request, pk=None):
         try:
-            c = Card.objects.get(pk=pk)
+            c = self.scoped(Card.objects.all()).get(pk=pk)
             c.is_deleted = False
             c.deleted_at = None
             c.is_archived = False
             c.archived_at = None
             c.save()
+            record('card_restored', request.user, card=c)
             return Response({"message": "Khôi phục thành công"})
         except Card.DoesNotExist: return Response({"error": "Không tìm thấy"}, status=404)
 
@@ -227,18 +750,121 @@ class CardViewSet(viewsets.ModelViewSet):
         c.archived_at = timezone.now()
         c.status = 'DONE'
         c.save()
+        record('card_archived', request.user, card=c)
         return Response({"message": "Đã lưu trữ (Tự xóa sau 7 ngày)"})
 
+    # Nhật ký hoạt động của 1 thẻ (kể cả thẻ đã lưu trữ / trong thùng rác)
+    @action(detail=True, methods=['get'])
+    def activity(self, request, pk=None):
+        try:
+            card = self.scoped(Card.objects.all()).get(pk=pk)
+        except Card.DoesNotExist:
+            return Response({"error": "Không tìm thấy"}, status=404)
+        feed = Activity.objects.filter(card_id=card.pk).select_related('actor')
+        page = self.paginate_queryset(feed)
+        return self.get_paginated_response(ActivitySerializer(page, many=True).data)
+
     # 5. XEM KHO LƯU TRỮ (Tự xóa sau 7 ngày)
     @action(detail=False, methods=['get'])
     def archived(self, request):
-        # Logic xóa tự động cho Kho lưu trữ
-        deadline = timezone.now() - timedelta(days=7)
-        Card.objects.filter(is_archived=True, archived_at__lt=deadline).delete()
+        # Chỉ đọc: việc xóa thẻ quá hạn do lệnh nền `purge_expired` đảm nhận.
+        # Thẻ đã quá hạn nhưng chưa bị dọn thì cũng không hiển thị nữa.
+        archived_cards = self.filter_params(self.scoped(Card.objects.filter(
+            is_archived=True, archived_at__gte=archive_deadline()
+        )))
+        page = self.paginate_queryset(archived_cards)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+# ===================== ĐỒNG BỘ DELTA ===================== #
+class SyncView(generics.GenericAPIView):
+    # GET /api/sync/?workspace=<id>&since=<cursor>: chỉ trả những gì đổi sau cursor (xem tasks/sync.py)
+    permission_classes = [permissions.IsAuthenticated]
 
-        archived_cards = Card.objects.filter(is_archived=True)
-        serializer = self.get_serializer(archived_cards, many=True)
-        return Response(serializer.data)
+    @conditional_on_workspace(workspace_from_query)
+    def get(self, request):
+        workspace_id = int_param(request, 'workspace')
+        if not workspace_id:
+            raise ValidationError({'workspace': "Thiếu tham số workspace."})
+        since = int_param(request, 'since') or 0
+        if since < 0:
+            raise ValidationError({'since': "Cursor không hợp lệ."})
+        workspace = with_user_role(visible_workspaces(request.user), request.user).filter(pk=workspace_id).first()
+        if workspace is None:
+            return Response({"error": "Không tìm thấy"}, status=404)
+        if since > workspace.version:
+            # Cursor chưa từng được server cấp (client lỗi / sửa tay) -> báo lỗi thay vì đoán
+            raise ValidationError({'since': "Cursor lớn hơn version hiện tại của workspace."})
+        context = self.get_serializer_context()
+        data = build_sync(workspace, since, context)
+        return Response({'workspace': WorkspaceSerializer(workspace, context=context).data, **data})
+
+# ===================== SỰ KIỆN THỜI GIAN THỰC (SSE) ===================== #
+def stream_subscription(request):
+    # EventSource không gửi được header -> nhận JWT access qua ?token= (hoặc header như API thường)
+    auth = CachedJWTAuthentication()
+    raw_token = request.GET.get('token')
+    if not raw_token:
+        header = auth.get_header(request)
+        raw_token = header and auth.get_raw_token(header)
+    if not raw_token:
+        raise AuthenticationFailed("Thiếu token.")
+    user = auth.get_user(auth.get_validated_token(raw_token))
+
+    def param(name):
+        try:
+            return int(request.GET.get(name) or 0)
+        except ValueError:
+            raise ValidationError({name: "Giá trị phải là số nguyên."})
+
+    workspace_id, board_id = param('workspace'), param('board')
+    if board_id:
+        workspace_id = Board.objects.filter(board_scope(user), pk=board_id).values_list('workspace_id', flat=True).first()
+        if not workspace_id:
+            raise PermissionDenied("Bạn không có quyền với Board này!")
+        channels = [board_channel(board_id), members_channel(workspace_id)]
+    elif workspace_id:
+        channels = [workspace_channel(workspace_id)]
+    else:
+        raise ValidationError({'workspace': "Cần ?workspace= hoặc ?board=."})
+    version = visible_workspaces(user).filter(pk=workspace_id).values_list('version', flat=True).first()
+    if version is None:
+        raise PermissionDenied("Bạn không thuộc Workspace này!")
+    return channels, {'workspace': workspace_id, 'board': board_id or None, 'version': version}
+
+async def event_stream(request):
+    # GET /api/events/?workspace=<id> | ?board=<id> (&token=<JWT>): stream Server-Sent Events.
+    # Chỉ chạy qua ASGI (task_api/asgi.py): mỗi kết nối rảnh chỉ là 1 coroutine, không giữ thread.
+    if request.method != 'GET':
+        return JsonResponse({"error": "Chỉ hỗ trợ GET"}, status=405)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"error": "Cần chạy server ASGI để nhận sự kiện"}, status=501)
+    try:
+        channels, ready = await sync_to_async(stream_subscription)(request)
+    except (AuthenticationFailed, InvalidToken) as exc:
+        return JsonResponse({"error": str(exc.detail)}, status=401)
+    except (ValidationError, PermissionDenied) as exc:
+        return JsonResponse({"error": exc.detail}, status=exc.status_code)
+    response = StreamingHttpResponse(stream_events(channels, ready), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Proxy (nginx, Render) không được gom buffer
+    return response
+
+# ===================== CACHE ĐỌC ===================== #
+class CacheStatsView(generics.GenericAPIView):
+    # Hit/miss/evict của cache đọc trong tiến trình đang trả lời (mỗi worker 1 bộ đếm)
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats())
+
+# ===================== ĐO HIỆU NĂNG ===================== #
+class MetricsView(generics.GenericAPIView):
+    # Histogram theo route của tiến trình hiện tại (tasks/metrics.py), định dạng text của Prometheus
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metrics_registry.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.all()